@@ -0,0 +1,39 @@
+"""
+Time to retrieve the complete IPv4 table from GoBGP depending on the number of partitions
+
+    python benchmarks/get_rib_partitions.py 10.0.255.2 --partitions 1 4 16 64
+"""
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+
+from pygobgp import PyGoBGP
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("address", help="GoBGP address")
+    parser.add_argument("--port", type=int, default=50051, help="GoBGP gRPC port")
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--workers", type=int, default=None, help="partitions fetched concurrently")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per partition count, best one is reported")
+    args = parser.parse_args()
+
+    # Unlimited receive size, a single partition is the whole table
+    gobgp = PyGoBGP(address=args.address, port=args.port, coalesce=False, max_receive_message_length=-1)
+
+    print("{:>10} {:>10} {:>10} {:>12}".format("partitions", "routes", "seconds", "routes/s"))
+    for partitions in args.partitions:
+        best = None
+        for _ in range(args.repeat):
+            start = time.time()
+            routes = gobgp.get_rib(partitions=partitions, max_workers=args.workers)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print("{:>10} {:>10} {:>10.3f} {:>12.0f}".format(partitions, len(routes), best, len(routes) / best))
+
+
+if __name__ == "__main__":
+    main()
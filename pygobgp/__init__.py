@@ -2,4 +2,24 @@ from pygobgp import gobgp_pb2
 from pygobgp import gobgp_pb2_grpc
 from pygobgp.pygobgp import PyGoBGP
 from pygobgp.pygobgp import Neighbor
+from pygobgp.pygobgp import FAMILIES
+from pygobgp.pygobgp import IPV4_UNICAST
+from pygobgp.pygobgp import IPV6_UNICAST
+from pygobgp.pygobgp import LOOKUP_EXACT
+from pygobgp.pygobgp import LOOKUP_LONGER
+from pygobgp.pygobgp import LOOKUP_SHORTER
+from pygobgp.policy import PrefixSetManager
+from pygobgp.policy import compact_prefixes
+from pygobgp.simulator import PolicySimulator
+from pygobgp.aspath import AsPathMatcher
+from pygobgp.rib import RibSnapshot
+from pygobgp.rpki import RoaTable
+from pygobgp.rpki import RpkiMonitor
+from pygobgp.mrt import MrtReader
+from pygobgp.bmp import BmpCollector
+from pygobgp.journal import RibJournal
+from pygobgp.ribfile import MappedRib
+from pygobgp.shm import SharedRib
+from pygobgp.monitor import RibConsumer
 from pygobgp.errors import PeerNotFound
+from pygobgp.errors import InvalidNeighborConfig
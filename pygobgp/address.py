@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+    Address families and prefix helpers shared by the pygobgp modules
+"""
+import ipaddress
+import socket
+
+# Address families as encoded by GoBGP: AFI << 16 | SAFI
+IPV4_UNICAST = 65537
+IPV6_UNICAST = 131073
+
+
+def parse_prefix(prefix):
+    """
+        (IP version, network as integer, prefix length) of "10.0.0.0/8", host bits cleared
+
+    An address without length is a host prefix. Raises ValueError if prefix is not valid.
+    """
+    address, _, length = prefix.partition("/")
+    if ":" in address:
+        version, bits, family = 6, 128, socket.AF_INET6
+    else:
+        version, bits, family = 4, 32, socket.AF_INET
+    try:
+        network = int.from_bytes(socket.inet_pton(family, address), "big")
+    except OSError:
+        raise ValueError("Invalid prefix {!r}".format(prefix))
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError("Invalid prefix {!r}".format(prefix))
+    return version, network >> (bits - length) << (bits - length), length
+
+
+def format_prefix(version, network, length):
+    """Reverse of parse_prefix"""
+    address = ipaddress.IPv4Address(network) if version == 4 else ipaddress.IPv6Address(network)
+    return "{}/{}".format(address, length)
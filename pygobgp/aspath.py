@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import re
+
+# GoBGP AS path regular expressions: "_" matches an AS boundary (start or end of the path or a separator)
+_BOUNDARY = "(^|[,{}() ]|$)"
+
+
+def as_path_regex(expression):
+    """
+        Python regular expression of a GoBGP AS path expression (e.g. "^65001_", "_65002$", "_65003_")
+
+    AS paths are matched as their ASNs joined by spaces, e.g. "65001 65002".
+    """
+    return expression.replace("_", _BOUNDARY)
+
+
+class AsPathMatcher:
+    """
+        Compiled AS path regular expressions with a verdict cache
+
+    A full table has far fewer distinct AS paths than prefixes, so each distinct path is turned
+    into a string and matched once, the verdict is reused for every route sharing the path.
+
+    matcher = AsPathMatcher("^65001_")
+    matcher([65001, 65002])             # True
+    routes = matcher.filter(gobgp.get_rib())
+    """
+
+    def __init__(self, expressions, match_all=False, max_cache=1000000):
+        """
+        expressions: GoBGP AS path expression or list of expressions
+        match_all: With several expressions, an AS path matches if all of them match, any of them by default
+        max_cache: Maximum number of cached verdicts, the cache is cleared when full
+        """
+        if isinstance(expressions, str):
+            expressions = [expressions]
+        self.expressions = list(expressions)
+        self.match_all = match_all
+        self.max_cache = max_cache
+        self._regexes = [re.compile(as_path_regex(expression)) for expression in self.expressions]
+        self._cache = {}
+
+    def match(self, as_path):
+        """True if as_path (list or tuple of ASNs, None for an empty path) matches"""
+        key = tuple(as_path) if as_path else ()
+        verdict = self._cache.get(key)
+        if verdict is None:
+            if len(self._cache) >= self.max_cache:
+                self._cache.clear()
+            path = " ".join(str(asn) for asn in key)
+            if self.match_all:
+                verdict = all(regex.search(path) for regex in self._regexes)
+            else:
+                verdict = any(regex.search(path) for regex in self._regexes)
+            self._cache[key] = verdict
+        return verdict
+
+    __call__ = match
+
+    def filter(self, routes):
+        """List of the routes (PyGoBGP route dicts) whose AS path matches"""
+        match = self.match
+        return [route for route in routes if match(route.get("as_path"))]
+
+    @property
+    def cached(self):
+        """Number of distinct AS paths evaluated"""
+        return len(self._cache)
+
+    def __repr__(self):
+        return "<AsPathMatcher {!r} match_all={} cached={}>".format(self.expressions, self.match_all, self.cached)
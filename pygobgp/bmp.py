@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+    BMP (RFC 7854) collector
+
+GoBGP streams BMP to collectors registered with AddBmp. BmpCollector is an asyncio TCP server
+decoding Route Monitoring, Statistics Report, Peer Up and Peer Down messages, exposed as an async
+iterator and optionally mirrored into one RibSnapshot per monitored peer.
+
+async def main(gobgp):
+    collector = BmpCollector(mirror=True)
+    await collector.start("0.0.0.0", 11019)
+    collector.register(gobgp, "10.0.255.1")
+    async for message in collector:
+        print(message)
+"""
+import asyncio
+import collections
+import socket
+import struct
+
+import pygobgp.gobgp_pb2 as gobgp
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import route_from_record
+from pygobgp.decoder import route_record
+from pygobgp.mrt import BGP_HEADER_SIZE
+from pygobgp.mrt import BGP_UPDATE
+from pygobgp.mrt import parse_update
+from pygobgp.rib import INDEXES
+from pygobgp.rib import RibSnapshot
+
+BMP_VERSION = 3
+DEFAULT_PORT = 11019
+
+# Message types
+ROUTE_MONITORING = 0
+STATISTICS_REPORT = 1
+PEER_DOWN = 2
+PEER_UP = 3
+INITIATION = 4
+TERMINATION = 5
+ROUTE_MIRRORING = 6
+
+# Version (1), message length (4), message type (1)
+COMMON_HEADER = struct.Struct(">BLB")
+# Peer type, flags, distinguisher, address, AS, BGP ID, timestamp seconds, microseconds
+PER_PEER_HEADER = struct.Struct(">BB8s16sL4sLL")
+
+_PEER_IPV6 = 0x80
+_PEER_POST_POLICY = 0x40
+_PEER_AS2 = 0x20
+
+# Monitoring policies of AddBmp
+PRE_POLICY = gobgp.AddBmpRequest.PRE
+POST_POLICY = gobgp.AddBmpRequest.POST
+BOTH = gobgp.AddBmpRequest.BOTH
+LOCAL_RIB = gobgp.AddBmpRequest.LOCAL
+ALL = gobgp.AddBmpRequest.ALL
+
+PeerHeader = collections.namedtuple(
+    "PeerHeader", "peer_type distinguisher address asn bgp_id timestamp ipv6 post_policy as4")
+
+
+class BmpError(ValueError):
+    """Invalid BMP message"""
+    pass
+
+
+class BmpMessage:
+    """
+        Decoded BMP message
+
+    type: ROUTE_MONITORING, STATISTICS_REPORT, PEER_DOWN, PEER_UP, INITIATION, TERMINATION...
+    peer: PeerHeader of per peer messages, None otherwise
+    announced, withdrawn: Route Monitoring prefixes, as returned by pygobgp.mrt.parse_update
+    stats: Statistics Report counters, stat type -> value ((stat type, family) for per AFI/SAFI ones)
+    reason: Peer Down reason code
+    local_address, local_port, remote_port: Peer Up session
+    information: Initiation / Termination / Peer Up information TLVs, list of (type, bytes)
+    """
+
+    __slots__ = ("type", "peer", "announced", "withdrawn", "stats", "reason",
+                 "local_address", "local_port", "remote_port", "information")
+
+    def __init__(self, message_type, peer=None):
+        self.type = message_type
+        self.peer = peer
+        self.announced = ()
+        self.withdrawn = ()
+        self.stats = None
+        self.reason = None
+        self.local_address = None
+        self.local_port = None
+        self.remote_port = None
+        self.information = ()
+
+    def __repr__(self):
+        peer = "{} AS{}".format(self.peer.address, self.peer.asn) if self.peer else "-"
+        if self.type == ROUTE_MONITORING:
+            detail = "announced={} withdrawn={}".format(len(self.announced), len(self.withdrawn))
+        elif self.type == STATISTICS_REPORT:
+            detail = "stats={}".format(self.stats)
+        elif self.type == PEER_DOWN:
+            detail = "reason={}".format(self.reason)
+        else:
+            detail = ""
+        return "<BmpMessage type={} peer={}{}>".format(self.type, peer, " " + detail if detail else "")
+
+
+def _address(raw, ipv6):
+    if ipv6:
+        return socket.inet_ntop(socket.AF_INET6, bytes(raw))
+    return socket.inet_ntoa(bytes(raw[12:]))
+
+
+def parse_peer_header(view, pos):
+    """PeerHeader of the per peer header at view[pos:pos + 42]"""
+    peer_type, flags, distinguisher, address, asn, bgp_id, seconds, microseconds = \
+        PER_PEER_HEADER.unpack_from(view, pos)
+    ipv6 = bool(flags & _PEER_IPV6)
+    return PeerHeader(peer_type, distinguisher, _address(address, ipv6), asn, socket.inet_ntoa(bgp_id),
+                      seconds + microseconds / 1000000.0, ipv6, bool(flags & _PEER_POST_POLICY),
+                      not flags & _PEER_AS2)
+
+
+def _parse_tlvs(view, pos, end):
+    tlvs = []
+    while pos + 4 <= end:
+        tlv_type, length = struct.unpack_from(">HH", view, pos)
+        tlvs.append((tlv_type, bytes(view[pos + 4:pos + 4 + length])))
+        pos += 4 + length
+    return tlvs
+
+
+def _parse_stats(view, pos, end):
+    count, = struct.unpack_from(">L", view, pos)
+    pos += 4
+    stats = {}
+    for _ in range(count):
+        if pos + 4 > end:
+            break
+        stat_type, length = struct.unpack_from(">HH", view, pos)
+        pos += 4
+        if length == 4:
+            stats[stat_type], = struct.unpack_from(">L", view, pos)
+        elif length == 8:
+            stats[stat_type], = struct.unpack_from(">Q", view, pos)
+        elif length == 11:
+            # Per AFI/SAFI gauge
+            afi, safi, value = struct.unpack_from(">HBQ", view, pos)
+            stats[(stat_type, afi << 16 | safi)] = value
+        pos += length
+    return stats
+
+
+def parse_message(view, pos, end):
+    """
+        BmpMessage of the BMP message in view[pos:end] (common header included)
+
+    view: memoryview over the receive buffer, nothing is kept referencing it
+    """
+    version, _, message_type = COMMON_HEADER.unpack_from(view, pos)
+    if version != BMP_VERSION:
+        raise BmpError("Unsupported BMP version {}".format(version))
+    pos += COMMON_HEADER.size
+
+    if message_type in (INITIATION, TERMINATION):
+        message = BmpMessage(message_type)
+        message.information = _parse_tlvs(view, pos, end)
+        return message
+
+    peer = parse_peer_header(view, pos)
+    pos += PER_PEER_HEADER.size
+    message = BmpMessage(message_type, peer)
+
+    if message_type == ROUTE_MONITORING:
+        if end - pos >= BGP_HEADER_SIZE and view[pos + 18] == BGP_UPDATE:
+            message.announced, message.withdrawn = parse_update(view[pos + BGP_HEADER_SIZE:end], as4=peer.as4)
+    elif message_type == STATISTICS_REPORT:
+        message.stats = _parse_stats(view, pos, end)
+    elif message_type == PEER_DOWN:
+        message.reason = view[pos]
+    elif message_type == PEER_UP:
+        message.local_address = _address(view[pos:pos + 16], peer.ipv6)
+        message.local_port, message.remote_port = struct.unpack_from(">HH", view, pos + 16)
+        pos += 20
+        # Sent and received OPEN messages, then information TLVs
+        for _ in range(2):
+            if pos + BGP_HEADER_SIZE > end:
+                break
+            length, = struct.unpack_from(">H", view, pos + 16)
+            pos += length
+        message.information = _parse_tlvs(view, pos, end)
+    return message
+
+
+class RibMirror:
+    """
+        One RibSnapshot per monitored peer, kept up to date from BMP messages
+
+    Peers are keyed by (address, distinguisher, post_policy) as GoBGP may send both pre and
+    post policy routes of a peer. Snapshots are dropped on Peer Down.
+    """
+
+    def __init__(self, indexes=INDEXES):
+        """indexes: inverted indexes of the snapshots, see RibSnapshot"""
+        self.indexes = indexes
+        self.ribs = {}
+
+    @staticmethod
+    def key(peer):
+        return peer.address, peer.distinguisher, peer.post_policy
+
+    def get(self, address, post_policy=False, distinguisher=b"\x00" * 8):
+        """RibSnapshot of a peer, None if unknown"""
+        return self.ribs.get((address, distinguisher, post_policy))
+
+    def apply(self, message):
+        if message.peer is None:
+            return
+        key = self.key(message.peer)
+        if message.type == PEER_DOWN:
+            self.ribs.pop(key, None)
+            return
+        if message.type != ROUTE_MONITORING:
+            return
+
+        rib = self.ribs.get(key)
+        if rib is None:
+            rib = self.ribs[key] = RibSnapshot(indexes=self.indexes)
+        for family, nlri in message.withdrawn:
+            rib.remove(decode_nlri(nlri, ipv6=family == IPV6_UNICAST))
+        for family, nlri, pattrs in message.announced:
+            prefix = decode_nlri(nlri, ipv6=family == IPV6_UNICAST)
+            route = route_from_record(route_record(prefix, pattrs))
+            route["neighbor"] = message.peer.address
+            rib.add(route)
+
+    def __repr__(self):
+        return "<RibMirror peers={} routes={}>".format(len(self.ribs), sum(len(rib) for rib in self.ribs.values()))
+
+
+class BmpProtocol(asyncio.Protocol):
+    """
+        One BMP session
+
+    Received bytes are appended to a single buffer, complete messages are decoded in place through a
+    memoryview and the consumed bytes dropped once per read, not once per message.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        self.transport = None
+        self.buffer = bytearray()
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.collector.sessions.add(self)
+
+    def connection_lost(self, exc):
+        self.collector.sessions.discard(self)
+
+    def data_received(self, data):
+        self.buffer.extend(data)
+        view = memoryview(self.buffer)
+        pos = 0
+        try:
+            while len(view) - pos >= COMMON_HEADER.size:
+                _, length, _ = COMMON_HEADER.unpack_from(view, pos)
+                if length < COMMON_HEADER.size:
+                    raise BmpError("Invalid BMP message length {}".format(length))
+                if len(view) - pos < length:
+                    break
+                self.collector.deliver(parse_message(view, pos, pos + length), self)
+                pos += length
+        except (BmpError, struct.error, IndexError, ValueError) as e:
+            # The session cannot be resynchronized, the traceback may still reference the buffer
+            self.collector.errors += 1
+            self.collector.last_error = e
+            self.buffer = bytearray()
+            self.transport.close()
+            return
+        finally:
+            # Whatever deliver raised, the buffer must not stay exported or it can not be resized
+            view.release()
+        if pos:
+            del self.buffer[:pos]
+
+    def pause(self):
+        if not self.paused:
+            self.paused = True
+            self.transport.pause_reading()
+
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            self.transport.resume_reading()
+
+
+class BmpCollector:
+    """
+        asyncio BMP server, iterate over it (async for) to receive BmpMessage objects
+
+    When more than max_queue messages wait to be consumed, sessions stop reading from their socket
+    until the queue is half empty, so a slow consumer slows GoBGP down instead of growing memory.
+    """
+
+    def __init__(self, mirror=False, indexes=INDEXES, max_queue=100000):
+        """
+        mirror: Maintain a RibMirror (self.mirror) of the routes of every monitored peer
+        indexes: inverted indexes of the mirrored snapshots, see RibSnapshot
+        max_queue: Messages waiting to be consumed before sessions are paused, 0 for no queue:
+            messages are only mirrored
+        """
+        self.mirror = RibMirror(indexes) if mirror else None
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue() if max_queue else None
+        self.sessions = set()
+        self.server = None
+        self.received = 0
+        self.errors = 0
+        self.last_error = None
+
+    async def start(self, host="0.0.0.0", port=DEFAULT_PORT):
+        """Start listening, port 0 picks a free port (see self.port)"""
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: BmpProtocol(self), host, port)
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1] if self.server else None
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        for session in list(self.sessions):
+            session.transport.close()
+        if self.queue is not None:
+            # Ends iterations once queued messages are consumed
+            self.queue.put_nowait(None)
+
+    def deliver(self, message, session):
+        self.received += 1
+        if self.mirror is not None:
+            self.mirror.apply(message)
+        if self.queue is not None:
+            self.queue.put_nowait(message)
+            if self.queue.qsize() >= self.max_queue:
+                session.pause()
+
+    def register(self, client, address, port=None, policy=PRE_POLICY):
+        """
+            Ask GoBGP to stream BMP to this collector
+
+        client: PyGoBGP instance
+        address: address of this collector as seen from GoBGP
+        port: listening port, the one of the server by default
+        policy: PRE_POLICY, POST_POLICY, BOTH, LOCAL_RIB or ALL
+        """
+        client.add_bmp(address, port or self.port, policy)
+
+    def unregister(self, client, address, port=None):
+        client.delete_bmp(address, port or self.port)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.queue is None:
+            raise StopAsyncIteration
+        message = await self.queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        if self.queue.qsize() <= self.max_queue // 2:
+            for session in self.sessions:
+                session.resume()
+        return message
+
+    def __repr__(self):
+        return "<BmpCollector port={} sessions={} received={} errors={}>".format(
+            self.port, len(self.sessions), self.received, self.errors)
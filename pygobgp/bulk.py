@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+class BulkResult:
+    """
+        Outcome of a bulk operation
+
+    succeeded: keys (e.g. neighbor addresses) whose request succeeded, in completion order
+    errors: dict of key -> exception raised by its request
+    elapsed: wall clock seconds spent on the whole operation
+    """
+
+    def __init__(self):
+        self.succeeded = []
+        self.errors = {}
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        return len(self.succeeded) + len(self.errors)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def rate(self):
+        """Completed requests per second"""
+        if not self.elapsed:
+            return 0.0
+        return self.total / self.elapsed
+
+    def __repr__(self):
+        return "<BulkResult succeeded={} failed={} elapsed={:.3f}s rate={:.1f}/s>".format(
+            len(self.succeeded), len(self.errors), self.elapsed, self.rate)
+
+
+def pipeline(rpc, requests, max_in_flight=64, timeout=None, result=None):
+    """
+        Send unary requests over a single channel keeping up to max_in_flight of them outstanding
+
+    rpc: unary-unary multi-callable of a stub, e.g. stub.AddNeighbor
+    requests: iterable of (key, request) tuples, key is used to report per request results and
+        must be unique: a duplicate raises ValueError, outstanding requests being cancelled
+    max_in_flight: upper bound of concurrently outstanding requests
+    timeout: per request deadline in seconds
+    result: BulkResult to add to, a new one is created if None
+
+    Requests are issued asynchronously (gRPC futures), so no thread is spent per request and
+    HTTP/2 multiplexes all of them over the same connection.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    result = result if result is not None else BulkResult()
+    slots = threading.BoundedSemaphore(max_in_flight)
+    lock = threading.Lock()
+    in_flight = set()
+
+    def done(key, future):
+        with lock:
+            in_flight.discard(future)
+        try:
+            future.result()
+        except Exception as e:
+            with lock:
+                result.errors[key] = e
+        else:
+            with lock:
+                result.succeeded.append(key)
+        finally:
+            slots.release()
+
+    start = time.time()
+    keys = set()
+    try:
+        for key, request in requests:
+            if key in keys:
+                raise ValueError("Duplicate key {!r}".format(key))
+            keys.add(key)
+            slots.acquire()
+            # The slot is given back by the done callback once registered, here otherwise
+            issued = False
+            try:
+                future = rpc.future(request, timeout=timeout)
+                with lock:
+                    in_flight.add(future)
+                future.add_done_callback(lambda f, key=key: done(key, f))
+                issued = True
+            except Exception as e:
+                with lock:
+                    result.errors[key] = e
+            finally:
+                if not issued:
+                    slots.release()
+    except BaseException:
+        # requests raised (or interrupted): cancel what is still outstanding, cancelled
+        # requests are reported in result.errors by their callback
+        with lock:
+            outstanding = list(in_flight)
+        for future in outstanding:
+            future.cancel()
+        raise
+    finally:
+        # Wait for the outstanding requests by taking back every slot
+        for _ in range(max_in_flight):
+            slots.acquire()
+        for _ in range(max_in_flight):
+            slots.release()
+        result.elapsed += time.time() - start
+    return result
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import socket
+import struct
+
+from pygobgp import wire
+
+# BGP path attribute type codes
+AS_PATH = 2
+NEXT_HOP = 3
+MULTI_EXIT_DISC = 4
+COMMUNITIES = 8
+MP_REACH_NLRI = 14
+
+_EXTENDED_LENGTH = 0x10
+
+
+def iter_attributes(pattrs):
+    """
+        Yield (type code, value) of each BGP path attribute
+
+    pattrs: GoBGP Path.pattrs, one serialized attribute (flags, type, length, value) per item.
+        Items may be bytes or memoryviews, values are slices of them.
+    """
+    for attr in pattrs:
+        offset = 4 if attr[0] & _EXTENDED_LENGTH else 3
+        yield attr[1], attr[offset:]
+
+
+def decode_pattrs(pattrs):
+    """
+        Decode AS path, next hop, communities and MED from BGP path attributes
+
+    Returns (as_path, next_hop, community, med) as used in PyGoBGP routes, missing attributes are None:
+        as_path: list of ASNs (GoBGP always sends 4 byte ASNs), every segment flattened in order
+        next_hop: next hop address, from NEXT_HOP or else from MP_REACH_NLRI
+        community: list of "ASN:value" standard communities
+        med: MED as integer
+    """
+    as_path = next_hop = community = med = None
+    for code, value in iter_attributes(pattrs):
+        if code == AS_PATH:
+            as_path = []
+            pos = 0
+            while pos + 2 <= len(value):
+                count = value[pos + 1]
+                as_path.extend(struct.unpack_from(">{}L".format(count), value, pos + 2))
+                pos += 2 + 4 * count
+        elif code == NEXT_HOP:
+            next_hop = socket.inet_ntoa(bytes(value[:4]))
+        elif code == COMMUNITIES:
+            words = struct.unpack_from(">{}H".format(len(value) // 2), value)
+            community = ["{}:{}".format(words[i], words[i + 1]) for i in range(0, len(words) - 1, 2)]
+        elif code == MULTI_EXIT_DISC:
+            med = struct.unpack_from(">L", value)[0]
+        elif code == MP_REACH_NLRI and next_hop is None:
+            next_hop = _mp_reach_next_hop(value)
+    return as_path, next_hop, community, med
+
+
+def _mp_reach_next_hop(value):
+    """Next hop of MP_REACH_NLRI: AFI (2), SAFI (1), next hop length (1), next hop"""
+    length = value[3]
+    address = bytes(value[4:4 + length])
+    if length == 4:
+        return socket.inet_ntoa(address)
+    if length in (16, 32):
+        # Global address, followed by the link local one if the length is 32
+        return socket.inet_ntop(socket.AF_INET6, address[:16])
+    return None
+
+
+def decode_nlri(nlri, ipv6=False):
+    """
+        Decode prefix of a unicast NLRI, serialized as in BGP UPDATE messages:
+        prefix length (1 byte) followed by the significant bytes of the prefix
+    """
+    length = nlri[0]
+    size = 16 if ipv6 else 4
+    address = bytes(nlri[1:1 + (length + 7) // 8]).ljust(size, b"\x00")
+    if size == 4:
+        return "{}/{}".format(socket.inet_ntoa(address), length)
+    return "{}/{}".format(socket.inet_ntop(socket.AF_INET6, address), length)
+
+
+def encode_nlri(prefix):
+    """Unicast NLRI of a prefix ("10.0.0.0/8"), the inverse of decode_nlri"""
+    address, length = prefix.split("/")
+    length = int(length)
+    if ":" in address:
+        packed = socket.inet_pton(socket.AF_INET6, address)
+    else:
+        packed = socket.inet_aton(address)
+    return struct.pack(">B", length) + packed[:(length + 7) // 8]
+
+
+def route_record(prefix, pattrs):
+    """Compact, cheap to pickle route: (prefix, as_path, next_hop, community, med) tuple"""
+    as_path, next_hop, community, med = decode_pattrs(pattrs)
+    return prefix, as_path, next_hop, community, med
+
+
+def route_from_record(record):
+    """PyGoBGP route dict from a route_record"""
+    prefix, as_path, next_hop, community, med = record
+    return {
+        "prefix": prefix,
+        "as_path": as_path,
+        "next_hop": next_hop,
+        "community": community,
+        "med": med,
+    }
+
+
+def decode_destinations(buf, start=0, end=None):
+    """
+        Route records of the Destinations serialized in buf[start:end], straight from the wire format:
+        no protobuf object is built, attributes are decoded from memoryviews over buf
+    """
+    return [route_record(prefix, paths[0][0])
+            for prefix, paths in wire.iter_destinations(buf, start, end) if paths]
+
+
+def decode_rib_response(buf):
+    """Route records of a serialized GetRibResponse"""
+    span = wire.table_span(buf)
+    if span is None:
+        return []
+    return decode_destinations(buf, span[0], span[1])
+
+
+def decode_table_range(source, start, end):
+    """
+        Decode the Destinations serialized in source[start:end] into route records
+
+    Process pool entry point. source is either the serialized GetRibResponse (bytes) or the
+    name of a multiprocessing.shared_memory segment holding it, start/end delimit whole
+    Destination fields of its Table (see pygobgp.wire.split_destinations).
+    """
+    if not isinstance(source, str):
+        return decode_destinations(source, start, end)
+
+    from multiprocessing import shared_memory
+    segment = shared_memory.SharedMemory(name=source)
+    try:
+        buf = segment.buf
+        records = decode_destinations(buf, start, end)
+        # No view on the segment must survive before closing it
+        del buf
+        return records
+    finally:
+        segment.close()
@@ -19,3 +19,10 @@ class PeerNotFound(PyGoBGPBaseError):
         BGP Peer not found
     """
     pass
+
+
+class InvalidNeighborConfig(PyGoBGPBaseError):
+    """
+        BGP Neighbor parameters are invalid
+    """
+    pass
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+    Append-only journal of RIB changes
+
+MonitorRib deltas are appended to segment files as they arrive: timestamp, family, NLRI and the
+serialized path attributes, nothing is decoded. When a segment is full, or checkpoint_interval
+seconds after the previous checkpoint, a new segment is started and the whole table is written
+to a checkpoint file next to it. The table at any time is rebuilt from the nearest checkpoint
+before it plus the records which follow, both read through mmap; only the routes of the result
+are decoded.
+
+journal = RibJournal("/var/lib/pygobgp/journal")
+journal.follow(gobgp)                      # blocks, journal.stop() from another thread
+
+snapshot = RibJournal("/var/lib/pygobgp/journal").snapshot_at(time.mktime(incident))
+snapshot.by_origin(13335)
+
+Files of the directory:
+    <sequence>.seg     segment: SEGMENT_MAGIC, then records
+    <sequence>.ckpt    checkpoint: CHECKPOINT_MAGIC, timestamp, route count, then records (the
+                       table when segment <sequence> was started)
+A record is RECORD (timestamp, family, flags, NLRI length, attributes length), the NLRI and the
+path attributes, concatenated as in a BGP UPDATE message.
+"""
+import mmap
+import os
+import struct
+import time
+
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import encode_nlri
+from pygobgp.decoder import route_from_record
+from pygobgp.decoder import route_record
+from pygobgp.mrt import split_attributes
+from pygobgp.rib import INDEXES
+from pygobgp.rib import RibSnapshot
+
+SEGMENT_MAGIC = b"PGBJRNL1"
+CHECKPOINT_MAGIC = b"PGBCKPT1"
+# Magic, timestamp of the last record before the checkpoint, route count
+CHECKPOINT_HEADER = struct.Struct(">8sdQ")
+# Timestamp, family, flags, NLRI length, path attributes length
+RECORD = struct.Struct(">dLBBL")
+
+WITHDRAW = 0x01
+
+SEGMENT = ".seg"
+CHECKPOINT = ".ckpt"
+
+
+class JournalError(ValueError):
+    """Corrupted or missing journal files"""
+    pass
+
+
+def _file_name(sequence, suffix):
+    return "{:012d}{}".format(sequence, suffix)
+
+
+def _map(path):
+    """Read-only mmap of a file, None if it is empty"""
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+
+def iter_journal_records(buf, start, end=None):
+    """
+        Yield (timestamp, family, withdraw, nlri offset, nlri length, pattrs offset, pattrs length)
+
+    A truncated record at the end (writer interrupted) ends the iteration.
+    """
+    if end is None:
+        end = len(buf)
+    pos = start
+    size = RECORD.size
+    while pos + size <= end:
+        timestamp, family, flags, nlri_length, pattrs_length = RECORD.unpack_from(buf, pos)
+        nlri_start = pos + size
+        pattrs_start = nlri_start + nlri_length
+        pos = pattrs_start + pattrs_length
+        if pos > end:
+            return
+        yield timestamp, family, flags & WITHDRAW, nlri_start, nlri_length, pattrs_start, pattrs_length
+
+
+class JournalRecord:
+    """One RIB change, pattrs is an empty list for withdrawals"""
+
+    __slots__ = ("timestamp", "family", "prefix", "withdraw", "pattrs")
+
+    def __init__(self, timestamp, family, prefix, withdraw, pattrs):
+        self.timestamp = timestamp
+        self.family = family
+        self.prefix = prefix
+        self.withdraw = withdraw
+        self.pattrs = pattrs
+
+    def route(self):
+        """PyGoBGP route dict, None for withdrawals"""
+        if self.withdraw:
+            return None
+        return route_from_record(route_record(self.prefix, self.pattrs))
+
+    def __repr__(self):
+        return "<JournalRecord {:.6f} {} {}>".format(
+            self.timestamp, "withdraw" if self.withdraw else "announce", self.prefix)
+
+
+class RibJournal:
+    """
+        RIB change journal stored in a directory
+
+    Writing (record, follow) and reading (snapshot_at, changes) can be done by different
+    processes, readers only see complete records.
+    """
+
+    def __init__(self, directory, segment_size=64 << 20, checkpoint_interval=3600, max_age=None, fsync=False):
+        """
+        directory: Journal directory, created if missing
+        segment_size: Bytes after which a new segment (and checkpoint) is started
+        checkpoint_interval: Seconds after which a new segment (and checkpoint) is started
+        max_age: Compact segments older than this many seconds when a new segment is started,
+            None to keep everything
+        fsync: fsync segments on flush() and checkpoints when written
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.checkpoint_interval = checkpoint_interval
+        self.max_age = max_age
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        # (family, nlri) -> serialized path attributes, the table as of the last record written
+        self._table = None
+        self._file = None
+        self._sequence = None
+        self._segment_bytes = 0
+        self._checkpoint_time = None
+        self._last_timestamp = 0.0
+        self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def _path(self, sequence, suffix):
+        return os.path.join(self.directory, _file_name(sequence, suffix))
+
+    def _sequences(self, suffix):
+        sequences = []
+        for name in os.listdir(self.directory):
+            if name.endswith(suffix) and name[:-len(suffix)].isdigit():
+                sequences.append(int(name[:-len(suffix)]))
+        return sorted(sequences)
+
+    def segments(self):
+        """Sequence numbers of the segments"""
+        return self._sequences(SEGMENT)
+
+    def checkpoints(self):
+        """(sequence, timestamp) of the checkpoints"""
+        checkpoints = []
+        for sequence in self._sequences(CHECKPOINT):
+            with open(self._path(sequence, CHECKPOINT), "rb") as f:
+                header = f.read(CHECKPOINT_HEADER.size)
+            magic, timestamp, _ = CHECKPOINT_HEADER.unpack(header)
+            if magic != CHECKPOINT_MAGIC:
+                raise JournalError("Invalid checkpoint {}".format(sequence))
+            checkpoints.append((sequence, timestamp))
+        return checkpoints
+
+    # Writing
+
+    def record(self, destination, timestamp=None):
+        """
+            Append a MonitorRib delta (gobgp.Destination)
+
+        As in RibSnapshot.apply, the first path which is not a withdrawal replaces the route,
+        the route is withdrawn if every path is. timestamp: Unix time, now by default.
+        """
+        if not destination.paths:
+            return
+        family = destination.paths[0].family or IPV4_UNICAST
+        nlri = next((bytes(path.nlri) for path in destination.paths if path.nlri), None)
+        if nlri is None:
+            if not destination.prefix:
+                # Nothing tells which prefix changed, skipped as by RibSnapshot.apply
+                return
+            nlri = encode_nlri(destination.prefix)
+        for path in destination.paths:
+            if not path.is_withdraw:
+                self.append(family, nlri, b"".join(path.pattrs), timestamp=timestamp)
+                return
+        self.append(family, nlri, None, timestamp=timestamp)
+
+    def append(self, family, nlri, pattrs, timestamp=None):
+        """
+            Append a change
+
+        nlri: unicast NLRI of the prefix
+        pattrs: serialized path attributes (concatenated), None for a withdrawal
+        """
+        if self._file is None:
+            self._open()
+        if timestamp is None:
+            timestamp = time.time()
+        # Records are kept in time order, replay stops at the first later one
+        timestamp = max(timestamp, self._last_timestamp)
+        if self._checkpoint_time is None:
+            self._checkpoint_time = timestamp
+        if (self._segment_bytes >= self.segment_size or
+                timestamp - self._checkpoint_time >= self.checkpoint_interval):
+            self._rotate(timestamp)
+
+        key = (family, nlri)
+        if pattrs is None:
+            if self._table.pop(key, None) is None:
+                # Unknown prefix, nothing changes
+                return
+            data = RECORD.pack(timestamp, family, WITHDRAW, len(nlri), 0) + nlri
+        else:
+            self._table[key] = pattrs
+            data = RECORD.pack(timestamp, family, 0, len(nlri), len(pattrs)) + nlri + pattrs
+        self._file.write(data)
+        self._segment_bytes += len(data)
+        self._last_timestamp = timestamp
+
+    def follow(self, client, family=IPV4_UNICAST, current=True, flush_interval=1.0, **kwargs):
+        """
+            Record the MonitorRib stream of client (PyGoBGP) until stop() is called or the stream ends
+
+        current: Start with the current content of the table, changes only if False (when
+            resuming a journal the table may have changed meanwhile, see snapshot_at)
+        flush_interval: Seconds between flushes of the segment to disk
+        kwargs: resource and name, see PyGoBGP.monitor_rib
+        """
+        self._stream = client.monitor_rib(family=family, current=current, **kwargs)
+        flushed = time.monotonic()
+        try:
+            for destination in self._stream:
+                self.record(destination)
+                if time.monotonic() - flushed >= flush_interval:
+                    self.flush()
+                    flushed = time.monotonic()
+        except Exception:
+            # Cancelled by stop()
+            if self._stream is not None:
+                raise
+        finally:
+            self._stream = None
+            self.flush()
+
+    def stop(self):
+        """Stop follow()"""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.cancel()
+
+    def _open(self):
+        """Restore the table from the files and start a new segment"""
+        sequences = self.segments()
+        self._table = {}
+        if sequences:
+            table, last_timestamp = self._replay(float("inf"))
+            self._table = {key: buf[start:start + length] for key, (buf, start, length) in table.items()}
+            self._last_timestamp = last_timestamp
+            checkpoints = self.checkpoints()
+            if checkpoints:
+                self._checkpoint_time = checkpoints[-1][1]
+        self._start_segment(sequences[-1] + 1 if sequences else 0, checkpoint=not sequences)
+
+    def _rotate(self, timestamp):
+        self._file.close()
+        self._start_segment(self._sequence + 1, checkpoint=True)
+        self._checkpoint_time = timestamp
+        if self.max_age is not None:
+            self.compact(timestamp - self.max_age)
+
+    def _start_segment(self, sequence, checkpoint):
+        if checkpoint:
+            self._write_checkpoint(sequence)
+        self._sequence = sequence
+        self._file = open(self._path(sequence, SEGMENT), "ab")
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_bytes = 0
+
+    def _write_checkpoint(self, sequence):
+        path = self._path(sequence, CHECKPOINT)
+        with open(path + ".tmp", "wb") as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, self._last_timestamp, len(self._table)))
+            pack = RECORD.pack
+            write = f.write
+            timestamp = self._last_timestamp
+            for (family, nlri), pattrs in self._table.items():
+                write(pack(timestamp, family, 0, len(nlri), len(pattrs)))
+                write(nlri)
+                write(pattrs)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def compact(self, before):
+        """
+            Drop the segments and checkpoints not needed to rebuild the table at any time since before
+
+        The table stays available from the newest checkpoint taken at or before that time.
+        Only whole files older than that checkpoint are removed, segments are never rewritten:
+        records before that time which share a segment with later ones are kept. Returns the
+        number of files removed.
+        """
+        self.flush()
+        base = None
+        for sequence, timestamp in self.checkpoints():
+            if timestamp <= before:
+                base = sequence
+        if base is None:
+            return 0
+        removed = 0
+        for suffix in (SEGMENT, CHECKPOINT):
+            for sequence in self._sequences(suffix):
+                if sequence < base:
+                    os.remove(self._path(sequence, suffix))
+                    removed += 1
+        return removed
+
+    # Reading
+
+    def _replay(self, until):
+        """
+            Table at time until: ((family, nlri) -> (buffer, offset, length) of the attributes, timestamp
+            of the last record applied)
+
+        Buffers are mmaps of the checkpoint and segments, kept open by the references.
+        """
+        self.flush()
+        base = None
+        base_timestamp = 0.0
+        for sequence, timestamp in self.checkpoints():
+            if timestamp <= until:
+                base, base_timestamp = sequence, timestamp
+        if base is None:
+            raise JournalError("No checkpoint at or before {}".format(until))
+
+        table = {}
+        last_timestamp = base_timestamp
+        buf = _map(self._path(base, CHECKPOINT))
+        for _, family, _, nlri_start, nlri_length, start, length in iter_journal_records(buf, CHECKPOINT_HEADER.size):
+            table[(family, buf[nlri_start:nlri_start + nlri_length])] = (buf, start, length)
+
+        for sequence in self.segments():
+            if sequence < base:
+                continue
+            buf = _map(self._path(sequence, SEGMENT))
+            if buf is None:
+                continue
+            for timestamp, family, withdraw, nlri_start, nlri_length, start, length in \
+                    iter_journal_records(buf, len(SEGMENT_MAGIC)):
+                if timestamp > until:
+                    return table, last_timestamp
+                key = (family, buf[nlri_start:nlri_start + nlri_length])
+                if withdraw:
+                    table.pop(key, None)
+                else:
+                    table[key] = (buf, start, length)
+                last_timestamp = timestamp
+        return table, last_timestamp
+
+    def snapshot_at(self, timestamp=None, indexes=INDEXES):
+        """
+            RibSnapshot of the table at a Unix time, the latest one if None
+
+        Raises JournalError when the journal does not go back that far.
+        """
+        table, _ = self._replay(float("inf") if timestamp is None else timestamp)
+        snapshot = RibSnapshot(indexes=indexes)
+        for (family, nlri), (buf, start, length) in table.items():
+            prefix = decode_nlri(nlri, ipv6=family == IPV6_UNICAST)
+            snapshot.add(route_from_record(route_record(prefix, split_attributes(buf[start:start + length]))))
+        return snapshot
+
+    def changes(self, start, end=None):
+        """Yield the JournalRecord of every change between start and end (Unix times, inclusive)"""
+        self.flush()
+        for sequence in self.segments():
+            buf = _map(self._path(sequence, SEGMENT))
+            if buf is None:
+                continue
+            for timestamp, family, withdraw, nlri_start, nlri_length, attrs_start, length in \
+                    iter_journal_records(buf, len(SEGMENT_MAGIC)):
+                if timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    return
+                prefix = decode_nlri(buf[nlri_start:nlri_start + nlri_length], ipv6=family == IPV6_UNICAST)
+                pattrs = split_attributes(buf[attrs_start:attrs_start + length])
+                yield JournalRecord(timestamp, family, prefix, bool(withdraw), pattrs)
+
+    def __repr__(self):
+        return "<RibJournal {} segments={} routes={}>".format(
+            self.directory, len(self.segments()), "-" if self._table is None else len(self._table))
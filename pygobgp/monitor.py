@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+    Bounded, coalescing consumption of MonitorRib
+
+A route storm can deliver changes faster than they are processed. RibConsumer reads the stream in
+a thread into a buffer holding at most one pending change per prefix: a newer change of a prefix
+replaces the pending one in place, so memory is bounded by the number of prefixes changing at the
+same time and consumers get the current state of each prefix rather than its history.
+
+consumer = RibConsumer(gobgp, max_pending=100000)
+consumer.start()
+while True:
+    for destination in consumer.get_batch(max_items=1000, timeout=1.0):
+        snapshot.apply(destination)
+"""
+import collections
+import threading
+
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import decode_nlri
+
+BLOCK = "block"
+DROP = "drop"
+OVERFLOW = (BLOCK, DROP)
+
+
+class CoalescingQueue:
+    """
+        Bounded queue keeping only the latest item of each key
+
+    A replaced item keeps the position of the first pending one, so keys changing all the time
+    are not delayed forever. An item of a pending key always replaces it, even when the queue is
+    full. When max_size keys are pending, put() of a new key waits for room (BLOCK) or drops the
+    item (DROP), unless forced: forced items are queued beyond max_size.
+
+    received: items put
+    coalesced: items replaced by a newer one of the same key before being consumed
+    dropped: items dropped because the queue was full (DROP)
+    delivered: items returned by get_batch
+    max_depth: highest number of pending keys
+    """
+
+    def __init__(self, max_size=100000, overflow=BLOCK):
+        if overflow not in OVERFLOW:
+            raise ValueError("Unknown overflow {}, expected one of {}".format(overflow, OVERFLOW))
+        if max_size < 1:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self.overflow = overflow
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.closed = False
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, key, item, timeout=None, force=False):
+        """
+            Queue item, replacing the pending item of key if any
+
+        force: Queue the item even if the queue is full, for items which must not be lost
+        Returns False if the item was dropped: queue full in DROP mode, or still full after
+        timeout seconds in BLOCK mode, or queue closed.
+        """
+        with self._lock:
+            self.received += 1
+            if key in self._items:
+                self._items[key] = item
+                self.coalesced += 1
+                return True
+            if len(self._items) >= self.max_size and not self.closed and not force:
+                if self.overflow == DROP or not self._not_full.wait_for(
+                        lambda: len(self._items) < self.max_size or self.closed, timeout):
+                    self.dropped += 1
+                    return False
+            if self.closed:
+                self.dropped += 1
+                return False
+            self._items[key] = item
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._not_empty.notify()
+            return True
+
+    def get_batch(self, max_items=1000, timeout=None):
+        """
+            Pending items, oldest first, at most max_items
+
+        Waits up to timeout seconds (forever if None) for at least one item. Returns an empty
+        list on timeout, or once the queue is closed and empty.
+        """
+        with self._lock:
+            if not self._not_empty.wait_for(lambda: self._items or self.closed, timeout):
+                return []
+            count = min(max_items, len(self._items))
+            batch = [self._items.popitem(last=False)[1] for _ in range(count)]
+            self.delivered += count
+            if count:
+                self._not_full.notify_all()
+            return batch
+
+    def close(self):
+        """Wake up waiting producers and consumers, pending items can still be consumed"""
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def __repr__(self):
+        return "<CoalescingQueue pending={} received={} coalesced={} dropped={} delivered={} max_depth={}>".format(
+            len(self._items), self.received, self.coalesced, self.dropped, self.delivered, self.max_depth)
+
+
+class RibConsumer:
+    """
+        Read MonitorRib into a CoalescingQueue keyed by prefix
+
+    With overflow BLOCK (default) the reading thread stops reading when max_pending prefixes are
+    pending, and gRPC flow control slows GoBGP down; nothing is lost. With DROP the stream is always
+    drained: a change of a pending prefix replaces it as usual, withdrawals are always queued (even
+    beyond max_pending), and announcements of other prefixes are dropped and counted. Consumers
+    then miss the routes of new prefixes, and keep the previous version of routes which changed,
+    until the next change of these prefixes.
+    """
+
+    def __init__(self, client, family=IPV4_UNICAST, current=True, max_pending=100000, overflow=BLOCK, **kwargs):
+        """
+        client: PyGoBGP instance
+        family, current, kwargs (resource, name): see PyGoBGP.monitor_rib
+        max_pending: Maximum number of prefixes pending
+        overflow: BLOCK or DROP, what to do when max_pending prefixes are pending
+        """
+        self.client = client
+        self.family = family
+        self.current = current
+        self.table_kwargs = kwargs
+        self.queue = CoalescingQueue(max_pending, overflow)
+        self.error = None
+        self._stream = None
+        self._thread = None
+
+    def start(self):
+        """Start reading the stream in a background thread"""
+        self._stream = self.client.monitor_rib(family=self.family, current=self.current, **self.table_kwargs)
+        self._thread = threading.Thread(target=self._read, args=(self._stream,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _read(self, stream):
+        ipv6 = self.family == IPV6_UNICAST
+        put = self.queue.put
+        try:
+            for destination in stream:
+                prefix = destination.prefix
+                if not prefix and destination.paths:
+                    prefix = decode_nlri(destination.paths[0].nlri, ipv6=ipv6)
+                # A dropped withdrawal would leave consumers with a route gone for good
+                put(prefix, destination, force=all(path.is_withdraw for path in destination.paths))
+        except Exception as e:
+            # Cancelled by stop()
+            if self._stream is not None:
+                self.error = e
+        finally:
+            self.queue.close()
+
+    def get_batch(self, max_items=1000, timeout=None):
+        """
+            Pending gobgp.Destination objects, at most one per prefix and the latest of each
+
+        See CoalescingQueue.get_batch. An empty list with closed set means the stream ended,
+        error holds the exception if it failed.
+        """
+        return self.queue.get_batch(max_items, timeout)
+
+    def __iter__(self):
+        """Yield batches until the stream ends"""
+        while True:
+            batch = self.get_batch()
+            if not batch:
+                return
+            yield batch
+
+    @property
+    def closed(self):
+        return self.queue.closed and not len(self.queue)
+
+    def stop(self):
+        """Cancel the stream, pending changes can still be consumed"""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.cancel()
+        self.queue.close()
+
+    def __repr__(self):
+        return "<RibConsumer family={} {!r}>".format(self.family, self.queue)
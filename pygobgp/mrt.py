@@ -0,0 +1,830 @@
+# -*- coding: utf-8 -*-
+"""
+    MRT (RFC 6396) TABLE_DUMP_V2 reader and writer, BGP4MP update reader
+
+RouteViews / RIPE RIS style RIB dumps are read record by record, plain files are memory-mapped
+and compressed ones (.gz, .bz2) decompressed as a stream, so the file is never loaded at once.
+RIB entries are turned into GoBGP Path messages with their path attributes passed through as
+they are in the dump, ready for PyGoBGP.inject_mrt.
+
+with MrtReader("rib.20181001.0000.bz2") as reader:
+    gobgp.inject_mrt(reader.paths(serialized=True))
+
+MrtWriter does the opposite for PyGoBGP.dump_mrt: GetPath results are written as RIB records with
+their path attributes copied verbatim.
+
+Large archives can be parsed by several processes with parse_parallel, which yields columnar
+RouteBatch objects in file order.
+
+BGP4MP update captures are read with iter_updates, see pygobgp.replay to replay them.
+"""
+import bz2
+import collections
+import gzip
+import mmap
+import multiprocessing
+import socket
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pygobgp.gobgp_pb2 as gobgp
+from pygobgp import wire
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import decode_pattrs
+from pygobgp.wire import encode_field
+from pygobgp.wire import encode_varint_field
+
+# MRT types
+TABLE_DUMP_V2 = 13
+
+# TABLE_DUMP_V2 subtypes
+PEER_INDEX_TABLE = 1
+RIB_IPV4_UNICAST = 2
+RIB_IPV6_UNICAST = 4
+RIB_IPV4_UNICAST_ADDPATH = 8
+RIB_IPV6_UNICAST_ADDPATH = 10
+
+# subtype -> (IPv6, entries carry a path identifier)
+RIB_SUBTYPES = {
+    RIB_IPV4_UNICAST: (False, False),
+    RIB_IPV6_UNICAST: (True, False),
+    RIB_IPV4_UNICAST_ADDPATH: (False, True),
+    RIB_IPV6_UNICAST_ADDPATH: (True, True),
+}
+
+# Timestamp, type, subtype, length
+HEADER = struct.Struct(">LHHL")
+
+# BGP path attributes
+MP_REACH_NLRI = 14
+_OPTIONAL = 0x80
+_EXTENDED_LENGTH = 0x10
+
+# gobgp.Path field numbers, see encode_path
+_PATH_NLRI = 1
+_PATH_PATTRS = 2
+_PATH_AGE = 3
+_PATH_FAMILY = 9
+_PATH_SOURCE_ASN = 10
+_PATH_SOURCE_ID = 11
+_PATH_NEIGHBOR_IP = 15
+_PATH_IDENTIFIER = 18
+
+Peer = collections.namedtuple("Peer", "bgp_id address asn")
+
+
+class MrtError(ValueError):
+    """File is not valid MRT"""
+    pass
+
+
+def iter_records(buf, start=0, end=None):
+    """Yield (timestamp, type, subtype, body) of the records in buf[start:end], bodies are slices of buf"""
+    pos = start
+    end = len(buf) if end is None else end
+    while pos < end:
+        if pos + HEADER.size > end:
+            raise MrtError("Truncated MRT header at {}".format(pos))
+        timestamp, mrt_type, subtype, length = HEADER.unpack_from(buf, pos)
+        pos += HEADER.size
+        if pos + length > end:
+            raise MrtError("Truncated MRT record at {}".format(pos))
+        yield timestamp, mrt_type, subtype, buf[pos:pos + length]
+        pos += length
+
+
+def split_attributes(attrs):
+    """
+        Split a BGP path attributes blob into one item per attribute (flags, type, length, value),
+        as GoBGP Path.pattrs. Items are slices of attrs.
+    """
+    pattrs = []
+    pos = 0
+    end = len(attrs)
+    while pos < end:
+        if pos + 3 > end:
+            raise MrtError("Truncated path attribute at {}".format(pos))
+        if attrs[pos] & _EXTENDED_LENGTH:
+            length = 4 + (attrs[pos + 2] << 8 | attrs[pos + 3])
+        else:
+            length = 3 + attrs[pos + 2]
+        if pos + length > end:
+            raise MrtError("Path attribute overruns attributes ({} > {})".format(pos + length, end))
+        pattrs.append(attrs[pos:pos + length])
+        pos += length
+    return pattrs
+
+
+def encode_attribute(flags, code, value):
+    """Serialize a BGP path attribute, the extended length flag is set if needed"""
+    if len(value) > 0xff:
+        return struct.pack(">BBH", flags | _EXTENDED_LENGTH, code, len(value)) + value
+    return struct.pack(">BBB", flags & ~_EXTENDED_LENGTH, code, len(value)) + value
+
+
+def full_mp_reach(attr, nlri):
+    """
+        MP_REACH_NLRI of an IPv6 unicast route from the abbreviated one of TABLE_DUMP_V2
+
+    RFC 6396 4.3.4: RIB entries only keep the next hop length and next hop of MP_REACH_NLRI.
+    GoBGP expects the complete attribute: AFI, SAFI, next hop, reserved byte and the NLRI.
+    """
+    offset = 4 if attr[0] & _EXTENDED_LENGTH else 3
+    value = bytes(attr[offset:])
+    next_hop = value[:1 + value[0]]
+    return encode_attribute(attr[0], MP_REACH_NLRI, b"\x00\x02\x01" + next_hop + b"\x00" + nlri)
+
+
+def parse_peer_index_table(body):
+    """Peers of a PEER_INDEX_TABLE record, list of Peer (bgp_id, address, asn) in index order"""
+    # Collector BGP ID (4), view name length (2), view name
+    name_length, = struct.unpack_from(">H", body, 4)
+    pos = 6 + name_length
+    count, = struct.unpack_from(">H", body, pos)
+    pos += 2
+    peers = []
+    for _ in range(count):
+        peer_type = body[pos]
+        bgp_id = socket.inet_ntoa(bytes(body[pos + 1:pos + 5]))
+        pos += 5
+        if peer_type & 0x01:
+            address = socket.inet_ntop(socket.AF_INET6, bytes(body[pos:pos + 16]))
+            pos += 16
+        else:
+            address = socket.inet_ntoa(bytes(body[pos:pos + 4]))
+            pos += 4
+        if peer_type & 0x02:
+            asn, = struct.unpack_from(">L", body, pos)
+            pos += 4
+        else:
+            asn, = struct.unpack_from(">H", body, pos)
+            pos += 2
+        peers.append(Peer(bgp_id, address, asn))
+    return peers
+
+
+def parse_rib(body, add_path=False):
+    """
+        (nlri, entries) of a RIB_IPV4_UNICAST / RIB_IPV6_UNICAST record
+
+    nlri: prefix length followed by the significant prefix bytes, as in BGP UPDATE messages
+    entries: list of (peer index, originated time, path identifier, attributes) tuples,
+        attributes is a slice of body, path identifier is 0 without ADD-PATH
+    """
+    length = body[4]
+    pos = 5 + (length + 7) // 8
+    nlri = bytes(body[4:pos])
+    count, = struct.unpack_from(">H", body, pos)
+    pos += 2
+    entries = []
+    for _ in range(count):
+        if add_path:
+            peer_index, originated, identifier, attrs_length = struct.unpack_from(">HLLH", body, pos)
+            pos += 12
+        else:
+            peer_index, originated, attrs_length = struct.unpack_from(">HLH", body, pos)
+            identifier = 0
+            pos += 8
+        entries.append((peer_index, originated, identifier, body[pos:pos + attrs_length]))
+        pos += attrs_length
+    return nlri, entries
+
+
+def encode_path(nlri, pattrs, family, age=0, source_asn=0, source_id="", neighbor_ip="", identifier=0):
+    """Serialized gobgp.Path, built directly in the protobuf wire format"""
+    parts = [encode_field(_PATH_NLRI, nlri)]
+    parts.extend(encode_field(_PATH_PATTRS, bytes(attr)) for attr in pattrs)
+    if age:
+        parts.append(encode_varint_field(_PATH_AGE, age))
+    parts.append(encode_varint_field(_PATH_FAMILY, family))
+    if source_asn:
+        parts.append(encode_varint_field(_PATH_SOURCE_ASN, source_asn))
+    if source_id:
+        parts.append(encode_field(_PATH_SOURCE_ID, source_id.encode()))
+    if neighbor_ip:
+        parts.append(encode_field(_PATH_NEIGHBOR_IP, neighbor_ip.encode()))
+    if identifier:
+        parts.append(encode_varint_field(_PATH_IDENTIFIER, identifier))
+    return b"".join(parts)
+
+
+def rib_paths(nlri, entries, peers, ipv6, serialized=False):
+    """
+        GoBGP paths of the entries of a RIB record
+
+    nlri, entries: as returned by parse_rib
+    peers: PEER_INDEX_TABLE of the file
+    serialized: Return serialized gobgp.Path bytes instead of gobgp.Path objects
+    """
+    family = IPV6_UNICAST if ipv6 else IPV4_UNICAST
+    paths = []
+    for peer_index, originated, identifier, attrs in entries:
+        try:
+            peer = peers[peer_index]
+        except (IndexError, TypeError):
+            raise MrtError("RIB entry refers to unknown peer {}".format(peer_index))
+
+        pattrs = split_attributes(attrs)
+        if ipv6:
+            pattrs = [full_mp_reach(attr, nlri) if attr[1] == MP_REACH_NLRI else attr for attr in pattrs]
+
+        if serialized:
+            paths.append(encode_path(nlri, pattrs, family, age=originated, source_asn=peer.asn,
+                                     source_id=peer.bgp_id, neighbor_ip=peer.address, identifier=identifier))
+        else:
+            paths.append(gobgp.Path(nlri=nlri, pattrs=[bytes(attr) for attr in pattrs], family=family,
+                                    age=originated, source_asn=peer.asn, source_id=peer.bgp_id,
+                                    neighbor_ip=peer.address, identifier=identifier))
+    return paths
+
+
+class MrtReader:
+    """
+        Read an MRT file record by record
+
+    Plain files are memory-mapped, record bodies are memoryviews over the mapping and nothing is
+    copied until paths are built. Files ending with .gz or .bz2 are decompressed as a stream.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.peers = None
+        self._file = None
+        self._mmap = None
+        if path.endswith(".bz2"):
+            self._file = bz2.open(path, "rb")
+        elif path.endswith(".gz"):
+            self._file = gzip.open(path, "rb")
+        else:
+            self._file = open(path, "rb")
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file
+                self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Record memoryviews still referenced, the mapping goes away with them
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def records(self):
+        """Yield (timestamp, type, subtype, body) of every record"""
+        if self._mmap is not None:
+            return self._mapped_records()
+        return self._streamed_records()
+
+    def _mapped_records(self):
+        view = memoryview(self._mmap)
+        try:
+            for record in iter_records(view):
+                yield record
+        finally:
+            view.release()
+
+    def _streamed_records(self):
+        read = self._file.read
+        while True:
+            header = read(HEADER.size)
+            if not header:
+                return
+            if len(header) < HEADER.size:
+                raise MrtError("Truncated MRT header")
+            timestamp, mrt_type, subtype, length = HEADER.unpack(header)
+            body = read(length)
+            if len(body) < length:
+                raise MrtError("Truncated MRT record")
+            yield timestamp, mrt_type, subtype, body
+
+    def rib_entries(self):
+        """
+            Yield (ipv6, nlri, entries) of every RIB record, see parse_rib
+
+        PEER_INDEX_TABLE is stored in self.peers on the way, other records are skipped.
+        """
+        for _, mrt_type, subtype, body in self.records():
+            if mrt_type != TABLE_DUMP_V2:
+                continue
+            if subtype == PEER_INDEX_TABLE:
+                self.peers = parse_peer_index_table(body)
+            elif subtype in RIB_SUBTYPES:
+                ipv6, add_path = RIB_SUBTYPES[subtype]
+                nlri, entries = parse_rib(body, add_path)
+                yield ipv6, nlri, entries
+
+    def paths(self, serialized=False):
+        """
+            Yield a GoBGP path for every RIB entry of the file
+
+        serialized: Yield serialized gobgp.Path bytes instead of gobgp.Path objects, cheaper to build
+            and accepted as they are by PyGoBGP.inject_mrt
+        """
+        for ipv6, nlri, entries in self.rib_entries():
+            for path in rib_paths(nlri, entries, self.peers, ipv6, serialized):
+                yield path
+
+
+def abbreviated_mp_reach(attr):
+    """
+        TABLE_DUMP_V2 form of an MP_REACH_NLRI attribute: next hop length and next hop only
+
+    RFC 6396 4.3.4, AFI, SAFI and NLRI are implied by the RIB record.
+    """
+    offset = 4 if attr[0] & _EXTENDED_LENGTH else 3
+    value = bytes(attr[offset:])
+    # AFI (2), SAFI (1), next hop length (1), next hop
+    return encode_attribute(attr[0], MP_REACH_NLRI, value[3:4 + value[3]])
+
+
+class MrtWriter:
+    """
+        Write a TABLE_DUMP_V2 MRT file, compressed if the path ends with .gz or .bz2
+
+    with MrtWriter("rib.mrt.bz2") as writer:
+        writer.write_peer_index_table("10.0.255.2", peers)
+        writer.write_rib(nlri, entries)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sequence = 0
+        if path.endswith(".bz2"):
+            self._file = bz2.open(path, "wb")
+        elif path.endswith(".gz"):
+            self._file = gzip.open(path, "wb")
+        else:
+            self._file = open(path, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write_record(self, mrt_type, subtype, body, timestamp=None):
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        self._file.write(HEADER.pack(timestamp, mrt_type, subtype, len(body)))
+        self._file.write(body)
+
+    def write_peer_index_table(self, collector_id, peers, view_name="", timestamp=None):
+        """peers: list of Peer (bgp_id, address, asn), RIB entries refer to them by index"""
+        name = view_name.encode()
+        parts = [socket.inet_aton(collector_id), struct.pack(">H", len(name)), name, struct.pack(">H", len(peers))]
+        for bgp_id, address, asn in peers:
+            ipv6 = ":" in address
+            # Peer type: bit 0 IPv6 address, bit 1 4 byte ASN (always used)
+            parts.append(struct.pack(">B", (0x01 if ipv6 else 0) | 0x02))
+            parts.append(socket.inet_aton(bgp_id or "0.0.0.0"))
+            parts.append(socket.inet_pton(socket.AF_INET6, address) if ipv6 else socket.inet_aton(address))
+            parts.append(struct.pack(">L", asn))
+        self.write_record(TABLE_DUMP_V2, PEER_INDEX_TABLE, b"".join(parts), timestamp)
+
+    def write_rib(self, nlri, entries, ipv6=False, timestamp=None):
+        """
+            Write a RIB_IPV4_UNICAST / RIB_IPV6_UNICAST record
+
+        nlri: prefix length followed by the significant prefix bytes
+        entries: list of (peer index, originated time, attributes bytes)
+        """
+        parts = [struct.pack(">L", self.sequence), nlri, struct.pack(">H", len(entries))]
+        for peer_index, originated, attrs in entries:
+            parts.append(struct.pack(">HLH", peer_index, originated, len(attrs)))
+            parts.append(attrs)
+        self.write_record(TABLE_DUMP_V2, RIB_IPV6_UNICAST if ipv6 else RIB_IPV4_UNICAST, b"".join(parts), timestamp)
+        self.sequence = (self.sequence + 1) & 0xffffffff
+
+    def write_paths(self, paths, peer_indexes, ipv6=False, timestamp=None):
+        """
+            Write serialized gobgp.Path messages (e.g. a raw GetPath stream) as RIB records
+
+        Consecutive paths of the same prefix, as streamed by GetPath, go into one record.
+        Path attributes are copied as they are, only MP_REACH_NLRI is abbreviated for IPv6.
+
+        peer_indexes: neighbor address -> peer index, paths of unknown neighbors (e.g. locally
+            originated ones) are attributed to peer 0
+        Returns the number of paths written
+        """
+        count = 0
+        current = None
+        entries = []
+        for buf in paths:
+            nlri, pattrs, age, neighbor_ip = _path_fields(buf)
+            if nlri != current:
+                if entries:
+                    self.write_rib(current, entries, ipv6, timestamp)
+                current = nlri
+                entries = []
+            if ipv6:
+                pattrs = [abbreviated_mp_reach(attr) if attr[1] == MP_REACH_NLRI else attr for attr in pattrs]
+            originated = min(max(age, 0), 0xffffffff)
+            entries.append((peer_indexes.get(neighbor_ip, 0), originated, b"".join(pattrs)))
+            count += 1
+        if entries:
+            self.write_rib(current, entries, ipv6, timestamp)
+        return count
+
+
+def _path_fields(buf):
+    """(nlri, pattrs, age, neighbor_ip) of a serialized gobgp.Path, read straight from the wire format"""
+    nlri = b""
+    pattrs = []
+    age = 0
+    neighbor_ip = ""
+    for number, wire_type, value, start, end in wire.iter_fields(buf):
+        if number == _PATH_NLRI:
+            nlri = buf[start:end]
+        elif number == _PATH_PATTRS:
+            pattrs.append(buf[start:end])
+        elif number == _PATH_AGE:
+            age = value - (1 << 64) if value >= 1 << 63 else value
+        elif number == _PATH_NEIGHBOR_IP:
+            neighbor_ip = buf[start:end].decode()
+    return nlri, pattrs, age, neighbor_ip
+
+
+# RouteBatch contents, see parse_parallel
+ROUTES = "routes"
+PATHS = "paths"
+
+
+class RouteBatch:
+    """
+        RIB entries of a range of an MRT file, stored by column
+
+    Every column is a list with one item per RIB entry, in file order:
+        prefix, peer_index, originated: always
+        as_path, next_hop, community, med: decoded attributes (ROUTES batches)
+        paths: serialized gobgp.Path messages, ready for PyGoBGP.inject_mrt (PATHS batches)
+    peers: PEER_INDEX_TABLE peer_index refers to
+    start, end: byte range of the file the batch was parsed from
+    """
+
+    COLUMNS = ("prefix", "peer_index", "originated", "as_path", "next_hop", "community", "med", "paths")
+
+    def __init__(self, peers, output=ROUTES, start=0, end=0):
+        self.peers = peers
+        self.output = output
+        self.start = start
+        self.end = end
+        for column in self.COLUMNS:
+            setattr(self, column, [])
+
+    def __len__(self):
+        return len(self.prefix)
+
+    def add_record(self, ipv6, nlri, entries):
+        """Append the entries of a RIB record (see parse_rib)"""
+        prefix = decode_nlri(nlri, ipv6=ipv6)
+        if self.output == PATHS:
+            self.paths.extend(rib_paths(nlri, entries, self.peers, ipv6, serialized=True))
+        for peer_index, originated, _, attrs in entries:
+            self.prefix.append(prefix)
+            self.peer_index.append(peer_index)
+            self.originated.append(originated)
+            if self.output == ROUTES:
+                pattrs = split_attributes(attrs)
+                if ipv6:
+                    pattrs = [full_mp_reach(attr, nlri) if attr[1] == MP_REACH_NLRI else attr for attr in pattrs]
+                as_path, next_hop, community, med = decode_pattrs(pattrs)
+                self.as_path.append(as_path)
+                self.next_hop.append(next_hop)
+                self.community.append(community)
+                self.med.append(med)
+
+    def routes(self):
+        """Yield PyGoBGP route dicts (ROUTES batches), "neighbor" is the address of the MRT peer"""
+        for i in range(len(self.prefix)):
+            yield {
+                "prefix": self.prefix[i],
+                "as_path": self.as_path[i],
+                "next_hop": self.next_hop[i],
+                "community": self.community[i],
+                "med": self.med[i],
+                "neighbor": self.peers[self.peer_index[i]].address,
+            }
+
+    @classmethod
+    def concat(cls, batches):
+        """Single batch holding the rows of batches, in order"""
+        batches = list(batches)
+        merged = cls(batches[0].peers if batches else None, batches[0].output if batches else ROUTES,
+                     batches[0].start if batches else 0, batches[-1].end if batches else 0)
+        for batch in batches:
+            for column in cls.COLUMNS:
+                getattr(merged, column).extend(getattr(batch, column))
+        return merged
+
+    def __repr__(self):
+        return "<RouteBatch {} rows={} bytes={}..{}>".format(self.output, len(self), self.start, self.end)
+
+
+def split_records(buf, chunks):
+    """
+        Split the records of an MRT file into about `chunks` ranges of whole records with
+        roughly the same number of bytes. Only record headers are read.
+
+    Returns list of (start, end, peers): peers is the PEER_INDEX_TABLE in effect at start
+    (parsed on the way, None before the first one).
+    """
+    end = len(buf)
+    target = max(1, end // max(1, chunks))
+    ranges = []
+    peers = None
+    chunk_start, chunk_peers = 0, None
+    pos = 0
+    while pos < end:
+        if pos + HEADER.size > end:
+            raise MrtError("Truncated MRT header at {}".format(pos))
+        _, mrt_type, subtype, length = HEADER.unpack_from(buf, pos)
+        record_end = pos + HEADER.size + length
+        if mrt_type == TABLE_DUMP_V2 and subtype == PEER_INDEX_TABLE:
+            peers = parse_peer_index_table(buf[pos + HEADER.size:record_end])
+        pos = record_end
+        if pos - chunk_start >= target:
+            ranges.append((chunk_start, pos, chunk_peers))
+            chunk_start, chunk_peers = pos, peers
+    if chunk_start < end:
+        ranges.append((chunk_start, end, chunk_peers))
+    return ranges
+
+
+def _add_records(batch, records):
+    """Add the RIB records of records to batch, following PEER_INDEX_TABLE records"""
+    for _, mrt_type, subtype, body in records:
+        if mrt_type != TABLE_DUMP_V2:
+            continue
+        if subtype == PEER_INDEX_TABLE:
+            batch.peers = parse_peer_index_table(body)
+        elif subtype in RIB_SUBTYPES:
+            ipv6, add_path = RIB_SUBTYPES[subtype]
+            nlri, entries = parse_rib(body, add_path)
+            batch.add_record(ipv6, nlri, entries)
+
+
+def parse_range(path, start, end, peers, output=ROUTES):
+    """
+        RouteBatch of the records in bytes start..end of an uncompressed MRT file
+
+    Process pool entry point, each worker maps the file itself so only offsets and
+    the resulting batch cross process boundaries.
+    """
+    batch = RouteBatch(peers, output, start, end)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            _add_records(batch, iter_records(view, start, end))
+        finally:
+            view.release()
+            mapped.close()
+    return batch
+
+
+def parse_parallel(path, workers=None, chunks=None, output=ROUTES, batch_records=10000):
+    """
+        Parse an MRT file in a pool of worker processes
+
+    path: MRT file. Compressed files can not be split, they are parsed in this process,
+        batch_records records per batch.
+    workers: number of processes, one per CPU by default
+    chunks: number of ranges the file is split into, 4 per worker by default
+    output: ROUTES (decoded attributes) or PATHS (serialized gobgp.Path)
+
+    Record boundaries are scanned first (headers only), then each range of whole records is
+    parsed by a worker, at most 2 ranges per worker are submitted ahead of the consumer. Yields
+    RouteBatch objects in file order as they are ready, e.g.
+        gobgp.inject_mrt(path for batch in parse_parallel(path, output=PATHS) for path in batch.paths)
+    """
+    if path.endswith((".gz", ".bz2")):
+        with MrtReader(path) as reader:
+            batch = RouteBatch(None, output)
+            for count, record in enumerate(reader.records(), 1):
+                _add_records(batch, (record,))
+                if count % batch_records == 0:
+                    yield batch
+                    batch = RouteBatch(batch.peers, output)
+            if len(batch):
+                yield batch
+        return
+
+    workers = workers or multiprocessing.cpu_count()
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return
+        try:
+            ranges = split_records(mapped, chunks or workers * 4)
+        finally:
+            mapped.close()
+
+    # Workers are spawned, forking a process using gRPC is not supported
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # At most 2 ranges per worker are outstanding, parsed batches wait for the consumer
+        futures = collections.deque()
+        ranges = collections.deque(ranges)
+        try:
+            while ranges or futures:
+                while ranges and len(futures) < workers * 2:
+                    start, end, peers = ranges.popleft()
+                    futures.append(pool.submit(parse_range, path, start, end, peers, output))
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+# BGP4MP (RFC 6396 4.4), BGP4MP_ET has an extra microseconds field
+BGP4MP = 16
+BGP4MP_ET = 17
+
+# BGP4MP subtypes carrying BGP messages received from a peer: subtype -> 4 byte ASNs
+BGP4MP_MESSAGE = 1
+BGP4MP_MESSAGE_AS4 = 4
+BGP4MP_MESSAGES = {BGP4MP_MESSAGE: False, BGP4MP_MESSAGE_AS4: True}
+
+# BGP message header: marker (16), length (2), type (1)
+BGP_HEADER_SIZE = 19
+BGP_UPDATE = 2
+
+AS_PATH = 2
+MP_UNREACH_NLRI = 15
+AS4_PATH = 17
+_AS_SEQUENCE = 2
+
+# Update.announced / withdrawn items are (family, nlri, ...), AFI -> family
+_UNICAST_FAMILIES = {1: IPV4_UNICAST, 2: IPV6_UNICAST}
+
+# Update.announced: list of (family, nlri, pattrs), Update.withdrawn: list of (family, nlri)
+Update = collections.namedtuple("Update", "timestamp peer_asn peer_address announced withdrawn")
+
+
+def _attribute_value(attr):
+    offset = 4 if attr[0] & _EXTENDED_LENGTH else 3
+    return attr[offset:]
+
+
+def _split_nlri(buf):
+    """Split a sequence of unicast NLRI (length, significant bytes) into one bytes item per prefix"""
+    prefixes = []
+    pos = 0
+    while pos < len(buf):
+        size = 1 + (buf[pos] + 7) // 8
+        prefixes.append(bytes(buf[pos:pos + size]))
+        pos += size
+    return prefixes
+
+
+def _as_path_segments(value, asn_size):
+    """(segment type, [ASNs]) of an AS_PATH / AS4_PATH value"""
+    segments = []
+    pos = 0
+    fmt = ">{}H" if asn_size == 2 else ">{}L"
+    while pos + 2 <= len(value):
+        segment_type, count = value[pos], value[pos + 1]
+        segments.append((segment_type, list(struct.unpack_from(fmt.format(count), value, pos + 2))))
+        pos += 2 + asn_size * count
+    return segments
+
+
+def _encode_as_path(flags, segments):
+    """AS_PATH attribute with 4 byte ASNs"""
+    value = b"".join(struct.pack(">BB{}L".format(len(asns)), segment_type, len(asns), *asns)
+                     for segment_type, asns in segments)
+    return encode_attribute(flags, AS_PATH, value)
+
+
+def _as4_as_path(as_path, as4_path):
+    """
+        AS_PATH with 4 byte ASNs from the 2 byte AS_PATH and the AS4_PATH of an old speaker (RFC 6793 4.2.3)
+
+    as4_path may be None. Leading ASNs of AS_PATH missing from AS4_PATH are kept, AS4_PATH replaces the rest.
+    """
+    segments = _as_path_segments(_attribute_value(as_path), 2)
+    if as4_path is not None:
+        as4_segments = _as_path_segments(_attribute_value(as4_path), 4)
+        count = sum(len(asns) for _, asns in segments)
+        count4 = sum(len(asns) for _, asns in as4_segments)
+        if count >= count4:
+            leading = [asn for _, asns in segments for asn in asns][:count - count4]
+            segments = ([(_AS_SEQUENCE, leading)] if leading else []) + as4_segments
+    return _encode_as_path(as_path[0], segments)
+
+
+def parse_update(body, as4=True):
+    """
+        Announced and withdrawn unicast prefixes of a BGP UPDATE message
+
+    body: UPDATE message without the 19 bytes BGP header
+    as4: ASNs are 4 bytes in AS_PATH (4 byte ASN capability negotiated)
+
+    Returns (announced, withdrawn):
+        announced: list of (family, nlri, pattrs), pattrs being the serialized path attributes in
+            GoBGP Path.pattrs form: AS_PATH with 4 byte ASNs (AS4_PATH merged in), and for IPv6 an
+            MP_REACH_NLRI holding the prefix only
+        withdrawn: list of (family, nlri)
+    Only IPv4 and IPv6 unicast are supported, other families are ignored.
+    """
+    withdrawn_length, = struct.unpack_from(">H", body, 0)
+    pos = 2
+    withdrawn = [(IPV4_UNICAST, nlri) for nlri in _split_nlri(body[pos:pos + withdrawn_length])]
+    pos += withdrawn_length
+    attrs_length, = struct.unpack_from(">H", body, pos)
+    pos += 2
+    pattrs = split_attributes(body[pos:pos + attrs_length])
+    nlri_v4 = _split_nlri(body[pos + attrs_length:])
+
+    common = []
+    mp_reach = None
+    as_path = as4_path = None
+    for attr in pattrs:
+        code = attr[1]
+        if code == MP_REACH_NLRI:
+            mp_reach = _attribute_value(attr)
+        elif code == MP_UNREACH_NLRI:
+            value = _attribute_value(attr)
+            afi, safi = struct.unpack_from(">HB", value, 0)
+            if safi == 1 and afi in _UNICAST_FAMILIES:
+                withdrawn.extend((_UNICAST_FAMILIES[afi], nlri) for nlri in _split_nlri(value[3:]))
+        elif code == AS_PATH and not as4:
+            as_path = attr
+        elif code == AS4_PATH and not as4:
+            as4_path = attr
+        else:
+            common.append(bytes(attr))
+    if as_path is not None:
+        common.insert(0, _as4_as_path(as_path, as4_path))
+
+    announced = [(IPV4_UNICAST, nlri, common) for nlri in nlri_v4]
+    if mp_reach is not None:
+        afi, safi, next_hop_length = struct.unpack_from(">HBB", mp_reach, 0)
+        if safi == 1 and afi in _UNICAST_FAMILIES:
+            family = _UNICAST_FAMILIES[afi]
+            next_hop = bytes(mp_reach[3:4 + next_hop_length])
+            # Reserved byte after the next hop
+            for nlri in _split_nlri(mp_reach[5 + next_hop_length:]):
+                value = struct.pack(">HB", afi, safi) + next_hop + b"\x00" + nlri
+                announced.append((family, nlri, common + [encode_attribute(_OPTIONAL, MP_REACH_NLRI, value)]))
+    return announced, withdrawn
+
+
+def parse_bgp4mp(body, subtype, extended=False):
+    """
+        (peer ASN, peer address, BGP message) of a BGP4MP_MESSAGE / BGP4MP_MESSAGE_AS4 record
+
+    extended: BGP4MP_ET record, the body starts with microseconds
+    """
+    pos = 4 if extended else 0
+    if BGP4MP_MESSAGES[subtype]:
+        peer_asn, _, _, afi = struct.unpack_from(">LLHH", body, pos)
+        pos += 12
+    else:
+        peer_asn, _, _, afi = struct.unpack_from(">HHHH", body, pos)
+        pos += 8
+    size = 16 if afi == 2 else 4
+    address = bytes(body[pos:pos + size])
+    peer_address = socket.inet_ntop(socket.AF_INET6, address) if size == 16 else socket.inet_ntoa(address)
+    # Peer address, local address
+    pos += 2 * size
+    return peer_asn, peer_address, body[pos:]
+
+
+def iter_updates(reader):
+    """
+        Yield Update for every BGP UPDATE received from a peer in BGP4MP / BGP4MP_ET records
+
+    reader: MrtReader
+    """
+    for timestamp, mrt_type, subtype, body in reader.records():
+        if mrt_type not in (BGP4MP, BGP4MP_ET) or subtype not in BGP4MP_MESSAGES:
+            continue
+        extended = mrt_type == BGP4MP_ET
+        peer_asn, peer_address, message = parse_bgp4mp(body, subtype, extended)
+        if len(message) < BGP_HEADER_SIZE or message[18] != BGP_UPDATE:
+            continue
+        if extended:
+            timestamp += struct.unpack_from(">L", body, 0)[0] / 1000000.0
+        announced, withdrawn = parse_update(message[BGP_HEADER_SIZE:], as4=BGP4MP_MESSAGES[subtype])
+        yield Update(timestamp, peer_asn, peer_address, announced, withdrawn)
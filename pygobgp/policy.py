@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+
+import pygobgp.gobgp_pb2 as gobgp
+
+
+def prefix_entry(entry):
+    """
+        Normalize a prefix set entry to a (ip_prefix, mask_length_min, mask_length_max) tuple
+
+    entry: "10.0.0.0/8", (ip_prefix, mask_length_min, mask_length_max) or gobgp.Prefix.
+        Without mask length range (or 0..0, as in gobgp.Prefix defaults), the prefix
+        matches itself only: "10.0.0.0/8" is ("10.0.0.0/8", 8, 8).
+    """
+    if isinstance(entry, gobgp.Prefix):
+        ip_prefix, low, high = entry.ip_prefix, entry.mask_length_min, entry.mask_length_max
+    elif isinstance(entry, str):
+        ip_prefix, low, high = entry, 0, 0
+    else:
+        ip_prefix, low, high = entry
+
+    network = ipaddress.ip_network(ip_prefix)
+    if not low and not high:
+        low = high = network.prefixlen
+    if not network.prefixlen <= low <= high <= network.max_prefixlen:
+        raise ValueError("Invalid mask length range {}..{} for {}".format(low, high, network))
+    return str(network), low, high
+
+
+def compact_prefixes(entries):
+    """
+        Rewrite prefix set entries into fewer mask length range entries matching exactly the same routes
+
+    entries: iterable of entries accepted by prefix_entry
+    Returns a sorted list of (ip_prefix, mask_length_min, mask_length_max) tuples
+
+    A prefix set matches a route of length L when one of its entries covers the route and
+    mask_length_min <= L <= mask_length_max. For each length L, the routes matched are exactly the
+    length L subnets of the entries valid at L. That set is collapsed independently for every L:
+    two sibling prefixes are replaced by their parent (e.g. 10.0.0.0/25 and 10.0.0.128/25 by
+    10.0.0.0/24) and prefixes covered by another one are dropped, which never changes the length L
+    subnets matched. Finally a prefix kept for consecutive lengths L1..L2 becomes a single
+    (prefix, L1, L2) entry. Only length L routes are affected by the entries produced for L,
+    so the compacted set matches the same routes as the original one.
+
+    Collapsing lengths independently can split a range into several entries. When the result
+    would have more entries than the original set, the original entries are returned, normalized
+    and sorted.
+
+    >>> compact_prefixes(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.0/24"])
+    [('10.0.0.0/24', 24, 25)]
+    """
+    # (version) -> mask length L -> set of (network bits, prefix length) valid at L
+    levels = {}
+    normalized = set()
+    for entry in entries:
+        ip_prefix, low, high = prefix_entry(entry)
+        normalized.add((ip_prefix, low, high))
+        network = ipaddress.ip_network(ip_prefix)
+        bits = network.max_prefixlen
+        key = (int(network.network_address) >> (bits - network.prefixlen), network.prefixlen)
+        by_length = levels.setdefault(network.version, {})
+        for length in range(low, high + 1):
+            by_length.setdefault(length, set()).add(key)
+
+    # (version, network bits, prefix length) -> lengths it is kept for
+    kept = {}
+    for version, by_length in levels.items():
+        for length, prefixes in by_length.items():
+            for key in _collapse(prefixes, length):
+                kept.setdefault((version,) + key, []).append(length)
+
+    result = []
+    for (version, value, prefix_length), lengths in kept.items():
+        bits = 32 if version == 4 else 128
+        ip_prefix = str(ipaddress.ip_network((value << (bits - prefix_length), prefix_length)))
+        lengths.sort()
+        run_start = previous = lengths[0]
+        for length in lengths[1:]:
+            if length != previous + 1:
+                result.append((version, value << (bits - prefix_length), prefix_length, ip_prefix, run_start, previous))
+                run_start = length
+            previous = length
+        result.append((version, value << (bits - prefix_length), prefix_length, ip_prefix, run_start, previous))
+    if len(result) > len(normalized):
+        result = []
+        for ip_prefix, low, high in normalized:
+            network = ipaddress.ip_network(ip_prefix)
+            result.append((network.version, int(network.network_address), network.prefixlen, ip_prefix, low, high))
+    result.sort()
+    return [entry[3:] for entry in result]
+
+
+def _collapse(prefixes, length):
+    """
+        Smallest set of prefixes whose length `length` subnets are the same as the ones of prefixes
+
+    prefixes: set of (network bits, prefix length) tuples, all prefix lengths <= length
+    """
+    by_length = {}
+    for value, prefix_length in prefixes:
+        by_length.setdefault(prefix_length, set()).add(value)
+
+    # Drop prefixes covered by a shorter one
+    shorter = []
+    for prefix_length in sorted(by_length):
+        values = by_length[prefix_length]
+        if shorter:
+            values.difference_update([value for value in values
+                                      if any(value >> (prefix_length - other) in by_length[other] for other in shorter)])
+        shorter.append(prefix_length)
+
+    # Merge siblings into their parent, from the longest prefixes up
+    for prefix_length in range(length, 0, -1):
+        values = by_length.get(prefix_length)
+        if not values:
+            continue
+        parents = set(value >> 1 for value in values if value & 1 == 0 and value | 1 in values)
+        if parents:
+            values.difference_update([parent << 1 for parent in parents])
+            values.difference_update([parent << 1 | 1 for parent in parents])
+            by_length.setdefault(prefix_length - 1, set()).update(parents)
+
+    return [(value, prefix_length) for prefix_length, values in by_length.items() for value in values]
+
+
+class PrefixSetDelta:
+    """
+        Changes applied (or to apply) by PrefixSetManager.sync
+
+    added, removed: sets of (ip_prefix, mask_length_min, mask_length_max) entries
+    replaced: True if the whole set was replaced instead of applying the delta
+    created: True if the set did not exist
+    requests: number of gRPC requests sent
+    """
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+        self.replaced = False
+        self.created = False
+        self.requests = 0
+
+    @property
+    def empty(self):
+        return not (self.added or self.removed)
+
+    def __repr__(self):
+        return "<PrefixSetDelta added={} removed={} replaced={} created={} requests={}>".format(
+            len(self.added), len(self.removed), self.replaced, self.created, self.requests)
+
+
+class PrefixSetManager:
+    """
+        Keep a GoBGP prefix DefinedSet in sync with a desired list of prefixes
+
+    The current content of the set is fetched once (GetDefinedSet) and tracked afterwards, every sync
+    only sends the entries added (AddDefinedSet) and removed (DeleteDefinedSet) in batches. When the
+    delta is large compared to the set, the whole set is sent at once with ReplaceDefinedSet instead.
+
+    gobgp = PyGoBGP(address="10.0.255.2")
+    manager = PrefixSetManager(gobgp, "customers")
+    manager.sync(["10.0.0.0/8", ("192.168.0.0/16", 24, 32)])
+    """
+
+    def __init__(self, client, name, batch_size=5000, replace_ratio=0.5):
+        """
+        client: PyGoBGP instance
+        name: prefix set name
+        batch_size: maximum number of prefixes per AddDefinedSet/DeleteDefinedSet request
+        replace_ratio: Replace the whole set if the delta (added + removed entries) is larger
+            than this fraction of the desired set
+        """
+        self.client = client
+        self.name = name
+        self.batch_size = batch_size
+        self.replace_ratio = replace_ratio
+        self.current = None
+
+    def fetch(self):
+        """Read the set from GoBGP, returns its entries (empty set if it does not exist)"""
+        sets = self.client.get_defined_sets(defined_type=gobgp.PREFIX, name=self.name)
+        self.current = set()
+        for defined_set in sets:
+            if defined_set.name == self.name:
+                self.current.update(prefix_entry(prefix) for prefix in defined_set.prefixes)
+        return self.current
+
+    def diff(self, desired):
+        """PrefixSetDelta between the set (fetched if not known yet) and desired entries, nothing is applied"""
+        if self.current is None:
+            self.fetch()
+        desired = set(prefix_entry(entry) for entry in desired)
+        delta = PrefixSetDelta(added=desired - self.current, removed=self.current - desired)
+        delta.created = not self.current
+        return delta, desired
+
+    def sync(self, desired, dry_run=False, compact=False):
+        """
+            Apply the minimal changes turning the set into desired
+
+        desired: iterable of entries accepted by prefix_entry
+        dry_run: only compute the delta
+        compact: Rewrite desired with compact_prefixes first, the set matches the same routes
+            with fewer entries
+
+        Returns PrefixSetDelta
+        """
+        if compact:
+            desired = compact_prefixes(desired)
+        delta, desired = self.diff(desired)
+        if dry_run or delta.empty:
+            return delta
+
+        if not desired:
+            self.client.delete_defined_set(self._defined_set(()), all=True)
+            delta.requests += 1
+        elif not delta.created and len(delta.added) + len(delta.removed) > self.replace_ratio * len(desired):
+            self.client.replace_defined_set(self._defined_set(desired))
+            delta.replaced = True
+            delta.requests += 1
+        else:
+            # AddDefinedSet creates the set if needed. Add first, the set never becomes empty in between
+            for batch in self._batches(delta.added):
+                self.client.add_defined_set(self._defined_set(batch))
+                delta.requests += 1
+            for batch in self._batches(delta.removed):
+                self.client.delete_defined_set(self._defined_set(batch))
+                delta.requests += 1
+
+        self.current = desired
+        return delta
+
+    def _batches(self, entries):
+        entries = sorted(entries)
+        for i in range(0, len(entries), self.batch_size):
+            yield entries[i:i + self.batch_size]
+
+    def _defined_set(self, entries):
+        """Build prefix DefinedSet object holding entries"""
+        defined_set = gobgp.DefinedSet(type=gobgp.PREFIX, name=self.name)
+        for ip_prefix, low, high in entries:
+            defined_set.prefixes.add(ip_prefix=ip_prefix, mask_length_min=low, mask_length_max=high)
+        return defined_set
@@ -1,26 +1,173 @@
 import grpc
+import heapq
+import ipaddress
+import itertools
+import multiprocessing
 import socket
 import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 import pygobgp.gobgp_pb2 as gobgp
 import pygobgp.gobgp_pb2_grpc as gobgp_grpc
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.aspath import AsPathMatcher
+from pygobgp.bulk import pipeline
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import decode_rib_response
+from pygobgp.decoder import decode_table_range
+from pygobgp.decoder import route_from_record
+from pygobgp.decoder import route_record
+from pygobgp.errors import InvalidNeighborConfig
 from pygobgp.errors import PeerNotFound
+from pygobgp.mrt import MrtWriter
+from pygobgp.mrt import Peer
+from pygobgp.reconcile import plan
+from pygobgp.ribfile import write_rib_file
+from pygobgp.singleflight import SingleFlight
+from pygobgp.wire import encode_field
+from pygobgp.wire import encode_varint
+from pygobgp.wire import encode_varint_field
+from pygobgp.wire import iter_rib
+from pygobgp.wire import split_destinations
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+# Address families as encoded by GoBGP: AFI << 16 | SAFI
+FAMILIES = {
+    "ipv4-unicast": IPV4_UNICAST,
+    "ipv6-unicast": IPV6_UNICAST,
+    "ipv4-labelled-unicast": 65540,
+    "ipv6-labelled-unicast": 131076,
+    "l3vpn-ipv4-unicast": 65664,
+    "l3vpn-ipv6-unicast": 131200,
+    "evpn": 1638470,
+    "ipv4-flowspec": 65669,
+    "ipv6-flowspec": 131205,
+}
+
+# Prefix lookup options, see PyGoBGP.get_rib
+LOOKUP_EXACT = gobgp.LOOKUP_EXACT
+LOOKUP_LONGER = gobgp.LOOKUP_LONGER
+LOOKUP_SHORTER = gobgp.LOOKUP_SHORTER
+
+# Default number of partitions fetched concurrently by get_rib, each one is a thread and a GetRib stream
+MAX_PARTITION_WORKERS = 32
+
+
+
+def _prefix_key(route):
+    """Sort key of IPv4 routes in prefix order: network address, then prefix length"""
+    address, length = route["prefix"].split("/")
+    return socket.inet_aton(address), int(length)
+
+
+def _as_path_matcher(as_path_regex):
+    """AsPathMatcher of an as_path_regex argument, matchers are used as they are to keep their cache"""
+    if isinstance(as_path_regex, AsPathMatcher):
+        return as_path_regex
+    return AsPathMatcher(as_path_regex)
 
 
 class PyGoBGP:
     """Basic GoBGP v1.25 Python API"""
     
-    def __init__(self, address, port=50051):
-        """Connect GoBGP via GRPC"""
+    def __init__(self, address, port=50051, coalesce=True, max_receive_message_length=None):
+        """
+            Connect GoBGP via GRPC
+
+        coalesce: If True (default), concurrent identical read requests (GetRib, GetNeighbor,
+            GetRibInfo, GetPolicy) issued from different threads share a single in-flight
+            gRPC call and its decoded result. Shared results must be treated as read-only.
+        max_receive_message_length: Maximum size in bytes of a gRPC response, -1 for unlimited.
+            gRPC default (4MB) if None, a full table GetRib response is much larger unless
+            get_rib is called with partitions.
+        """
         self.gobgp_address = "{}:{}".format(address, port)
-        self.channel = grpc.insecure_channel(self.gobgp_address)
+        options = []
+        if max_receive_message_length is not None:
+            options.append(("grpc.max_receive_message_length", max_receive_message_length))
+        self.channel = grpc.insecure_channel(self.gobgp_address, options=options)
         self.stub = gobgp_grpc.GobgpApiStub(self.channel)
+        self._flight = SingleFlight() if coalesce else None
+
+        # AddNeighbor taking already serialized AddNeighborRequest bytes, see Neighbor.serialized_request
+        self._add_neighbor_raw = self.channel.unary_unary(
+            "/gobgpapi.GobgpApi/AddNeighbor",
+            request_serializer=None,
+            response_deserializer=gobgp.AddNeighborResponse.FromString,
+        )
+
+        # GetRib returning the serialized GetRibResponse, decoded by PyGoBGP itself
+        self._get_rib_raw = self.channel.unary_unary(
+            "/gobgpapi.GobgpApi/GetRib",
+            request_serializer=gobgp.GetRibRequest.SerializeToString,
+            response_deserializer=None,
+        )
+
+        # GetPath streaming serialized Path messages, see dump_mrt
+        self._get_path_raw = self.channel.unary_stream(
+            "/gobgpapi.GobgpApi/GetPath",
+            request_serializer=gobgp.GetPathRequest.SerializeToString,
+            response_deserializer=None,
+        )
+
+        # InjectMrt taking already serialized InjectMrtRequest bytes, see inject_mrt
+        self._inject_mrt_raw = self.channel.stream_unary(
+            "/gobgpapi.GobgpApi/InjectMrt",
+            request_serializer=None,
+            response_deserializer=gobgp.InjectMrtResponse.FromString,
+        )
+        self._decode_pool = None
+        self._decode_pool_size = None
+        # Decodes running on each pool, a replaced pool is shut down once its last one is done
+        self._decode_pool_users = {}
+        self._decode_pool_lock = threading.Lock()
+
+    def _coalesced(self, method, request, fn):
+        """
+            Run fn(request) once for all concurrent callers sending the same request to the same RPC
+        """
+        if self._flight is None:
+            return fn(request)
+        key = (method, request.SerializeToString())
+        return self._flight.do(key, fn, request)
         
-    def get_rib(self):
+    def get_rib(self, prefixes=None, lookup=LOOKUP_EXACT, partitions=None, max_workers=None, decode_workers=None,
+                raw=False, as_path_regex=None):
         """ 
         Get Routes in BGP-RIB.
         Disclaimer: Only Global IPv4 addresses supported at the moment
         Supported BGP attributes: as path, standard community, next hop ip (v4) and MED,
         there is no support for other BGP attributes at the moment.
+
+        prefixes: Optional list of prefixes (e.g. ["10.0.0.0/8"]), only matching destinations
+            are returned. Filtering is done by GoBGP, not by PyGoBGP.
+        lookup: How prefixes are matched, one of
+            LOOKUP_EXACT: the prefix itself (default)
+            LOOKUP_LONGER: the prefix and every more specific prefix
+            LOOKUP_SHORTER: the prefix and every less specific prefix
+        partitions: Split the full table retrieval into this many requests (power of 2, up to 65536),
+            each one covering an equal slice of the IPv4 space. Partitions are fetched and decoded
+            concurrently and merged in prefix order, so no single response has to hold the whole
+            table. Ignored when prefixes are given.
+        max_workers: Number of partitions fetched concurrently, min(partitions, MAX_PARTITION_WORKERS) (32)
+            by default. One more worker fetches the routes less specific than the partitions.
+        decode_workers: Decode the response in a pool of this many worker processes instead of the
+            calling thread. The response is received serialized and handed over to the workers
+            through shared memory (Python 3.8+, pickled chunks otherwise), workers send back
+            compact route tuples. Worth it for large tables only, the pool is started on first
+            use and kept until close().
+        raw: Decode the response straight from the protobuf wire format (see pygobgp.wire), without
+            building GetRibResponse, Destination and Path objects first. Same routes, less time
+            and memory. Always the case with decode_workers.
+        as_path_regex: Only return routes whose AS path matches this GoBGP AS path expression
+            (e.g. "^65001_") or pygobgp.aspath.AsPathMatcher. Each distinct AS path is matched once.
         
         gRPC for GetRib is defined as below:
         https://github.com/osrg/gobgp/blob/615454451d59e11786fb7756c68c3c693a1fecfe/api/gobgp.proto#L40
@@ -40,15 +187,191 @@ class PyGoBGP:
           repeated Destination destinations = 4;
           bool post_policy = 5;
         }
+
+        Prefixes are sent as Table destinations, GoBGP only looks these up:
+
+        message Destination {
+          string prefix = 1;
+          repeated Path paths = 2;
+          bool longer_prefixes = 3;
+          bool shorter_prefixes = 4;
+        }
         
         """
-        
+        if partitions and partitions > 1 and not prefixes:
+            routes = self._get_rib_partitioned(partitions, max_workers, decode_workers, raw)
+        else:
+            request = self._get_rib_request(prefixes, lookup)
+            if decode_workers:
+                routes = self._coalesced("GetRib", request, lambda r: self._get_rib_process(r, decode_workers))
+            elif raw:
+                routes = self._coalesced("GetRib", request, self._get_rib_wire)
+            else:
+                routes = self._coalesced("GetRib", request, self._get_rib)
+
+        if as_path_regex is not None:
+            # Coalesced callers share the same list, filter into a new one
+            routes = _as_path_matcher(as_path_regex).filter(routes)
+        return routes
+
+    def _get_rib_partitioned(self, partitions, max_workers=None, decode_workers=None, raw=False):
+        """
+            Fetch the IPv4 table as `partitions` covering prefixes of equal size
+
+        Each covering prefix (e.g. 0.0.0.0/2, 64.0.0.0/2, 128.0.0.0/2, 192.0.0.0/2 for 4 partitions)
+        is looked up with LOOKUP_LONGER. Routes less specific than the covering prefixes span
+        several partitions, they are fetched once with an extra LOOKUP_SHORTER request.
+
+        Workers fetch and decode their partition, decoding of one partition overlaps with the
+        network transfer of the others. Partitions are disjoint and ordered, so merging is a
+        concatenation plus a merge of the less specific routes.
+        """
+        length = partitions.bit_length() - 1
+        if partitions != 1 << length or length > 16:
+            raise ValueError("partitions must be a power of 2 up to 65536, got {}".format(partitions))
+
+        covers = ["{}/{}".format(socket.inet_ntoa(struct.pack(">L", index << (32 - length))), length)
+                  for index in range(partitions)]
+
+        def fetch(cover):
+            routes = self.get_rib(prefixes=[cover], lookup=LOOKUP_LONGER, decode_workers=decode_workers, raw=raw)
+            return sorted(routes, key=_prefix_key)
+
+        def fetch_shorter():
+            routes = self.get_rib(prefixes=covers, lookup=LOOKUP_SHORTER, decode_workers=decode_workers, raw=raw)
+            unique = {route["prefix"]: route for route in routes if int(route["prefix"].rsplit("/", 1)[1]) < length}
+            return sorted(unique.values(), key=_prefix_key)
+
+        if not max_workers:
+            max_workers = min(partitions, MAX_PARTITION_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+            shorter = executor.submit(fetch_shorter)
+            parts = list(executor.map(fetch, covers))
+
+        return list(heapq.merge(shorter.result(), itertools.chain.from_iterable(parts), key=_prefix_key))
+
+    def lookup_prefixes(self, prefixes, lookup=LOOKUP_EXACT, batch_size=256, max_workers=4):
+        """
+            Look up a large number of prefixes
+
+        prefixes: iterable of prefixes
+        lookup: LOOKUP_EXACT, LOOKUP_LONGER or LOOKUP_SHORTER, see get_rib
+        batch_size: number of prefixes sent per GetRib request
+        max_workers: number of GetRib requests running concurrently
+
+        Prefixes are split into batches, each batch is one filtered GetRib request so only the
+        matching routes are transferred. Routes are returned in batch order, a route matching
+        prefixes of several batches (LOOKUP_LONGER, LOOKUP_SHORTER) is returned once.
+        """
+        prefixes = list(prefixes)
+        batches = [prefixes[i:i + batch_size] for i in range(0, len(prefixes), batch_size)]
+        if not batches:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda batch: self.get_rib(prefixes=batch, lookup=lookup), batches)
+
+            routes = []
+            seen = set()
+            for batch in results:
+                for route in batch:
+                    if route["prefix"] not in seen:
+                        seen.add(route["prefix"])
+                        routes.append(route)
+        return routes
+
+    def iter_paths(self, prefixes=None, lookup=LOOKUP_EXACT, family=IPV4_UNICAST, resource=gobgp.GLOBAL, name="",
+                   as_path_regex=None):
+        """
+            Stream every path (not only the best one) of a RIB
+
+        prefixes, lookup: Optional GoBGP side filtering, see get_rib
+        family: Address family, IPv4 unicast by default
+        resource: Table to read, gobgp.GLOBAL (default), gobgp.LOCAL, gobgp.ADJ_IN, gobgp.ADJ_OUT or gobgp.VRF
+        name: Neighbor address for ADJ_IN/ADJ_OUT/LOCAL, VRF name for VRF
+        as_path_regex: Only yield paths whose AS path matches, see get_rib
+
+        Yields one dict per path with the same keys as get_rib routes plus
+            "best": True if it is the best path for its prefix
+            "neighbor": address of the neighbor the path was received from
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetPath(GetPathRequest) returns (stream Path) {}
+        }
+
+        message GetPathRequest {
+          Resource type = 1;
+          string name = 2;
+          uint32 family = 3;
+          repeated TableLookupPrefix prefixes = 4;
+        }
+
+        message TableLookupPrefix {
+          string prefix = 1;
+          TableLookupOption lookup_option = 2;
+        }
+        """
+        request = gobgp.GetPathRequest(type=resource, name=name, family=family)
+        for prefix in prefixes or ():
+            request.prefixes.add(prefix=prefix, lookup_option=lookup)
+
+        matcher = _as_path_matcher(as_path_regex) if as_path_regex is not None else None
+        for path in self.stub.GetPath(request):
+            route = self._extract_route(self._decode_nlri(path.nlri, family), path)
+            if matcher is not None and not matcher(route["as_path"]):
+                continue
+            route["best"] = path.best
+            route["neighbor"] = path.neighbor_ip
+            yield route
+
+    def monitor_rib(self, family=IPV4_UNICAST, current=True, resource=gobgp.GLOBAL, name=""):
+        """
+            Stream RIB changes
+
+        family: Address family, IPv4 unicast by default
+        current: Start with the current content of the table
+        resource, name: Table to follow, see iter_paths
+
+        Yields gobgp.Destination objects, one per best path change. Apply them to a
+        pygobgp.rib.RibSnapshot to keep a local copy of the table.
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc MonitorRib(MonitorRibRequest) returns (stream Destination) {}
+        }
+
+        message MonitorRibRequest {
+          Table table = 1;
+          bool current = 2;
+        }
+        """
+        request = gobgp.MonitorRibRequest(current=current)
+        request.table.MergeFrom(gobgp.Table(type=resource, name=name, family=family))
+        return self.stub.MonitorRib(request)
+
+    @staticmethod
+    def _get_rib_request(prefixes=None, lookup=LOOKUP_EXACT):
+        """Build GetRibRequest for the global IPv4 table, optionally limited to prefixes"""
+
         # Build GetRibRequest object 
         ipv4_family = 65537      # IPv4 Family
         request = gobgp.GetRibRequest()
         table = gobgp.Table(family=ipv4_family)
+        for prefix in prefixes or ():
+            table.destinations.add(
+                prefix=prefix,
+                longer_prefixes=lookup == LOOKUP_LONGER,
+                shorter_prefixes=lookup == LOOKUP_SHORTER,
+            )
         request.table.MergeFrom(table)
-        
+        return request
+
+    def _get_rib(self, request):
+        """Send GetRibRequest and decode the response"""
+
         # Get Rib contents 
         # raw routes is a GetRibResponse object which contains a Table object
         raw_routes = self.stub.GetRib(request)
@@ -57,7 +380,379 @@ class PyGoBGP:
         # we extract them (kind of hackish for the moment)
         routes = self._extract_routes(raw_routes)
         return routes
+
+    def _get_rib_wire(self, request):
+        """Send GetRibRequest, receive the serialized response and decode it from the wire format"""
+        buf = self._get_rib_raw(request)
+        return [route_from_record(record) for record in decode_rib_response(buf)]
+
+    def _get_rib_process(self, request, workers):
+        """
+            Send GetRibRequest, receive the serialized response and decode it in worker processes
+
+        The response is split into ranges of whole Destinations (only field headers are read for
+        that), each range is decoded by a worker into route records.
+        """
+        buf = self._get_rib_raw(request)
+        ranges = split_destinations(buf, workers * 4)
+        if not ranges:
+            return []
+
+        pool = self._acquire_decode_pool(workers)
+        try:
+            if shared_memory is not None:
+                segment = shared_memory.SharedMemory(create=True, size=len(buf))
+                try:
+                    segment.buf[:len(buf)] = buf
+                    del buf
+                    futures = [pool.submit(decode_table_range, segment.name, start, end) for start, end in ranges]
+                    chunks = [future.result() for future in futures]
+                finally:
+                    segment.close()
+                    segment.unlink()
+            else:
+                futures = [pool.submit(decode_table_range, buf[start:end], 0, end - start) for start, end in ranges]
+                chunks = [future.result() for future in futures]
+        finally:
+            self._release_decode_pool(pool)
+
+        return [route_from_record(record) for chunk in chunks for record in chunk]
+
+    def _acquire_decode_pool(self, workers):
+        """
+            Process pool used to decode responses, (re)started when a different size is asked
+
+        The pool is pinned until _release_decode_pool: get_rib runs concurrently from the
+        partition and lookup thread pools, a pool replaced meanwhile is only shut down once
+        the decodes using it are done.
+        """
+        with self._decode_pool_lock:
+            if self._decode_pool is None or self._decode_pool_size != workers:
+                previous = self._decode_pool
+                # Workers are spawned, forking a process using gRPC is not supported
+                self._decode_pool = ProcessPoolExecutor(max_workers=workers,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+                self._decode_pool_size = workers
+                self._decode_pool_users[self._decode_pool] = 0
+                if previous is not None and not self._decode_pool_users[previous]:
+                    del self._decode_pool_users[previous]
+                    previous.shutdown(wait=False)
+            pool = self._decode_pool
+            self._decode_pool_users[pool] += 1
+            return pool
+
+    def _release_decode_pool(self, pool):
+        with self._decode_pool_lock:
+            if pool not in self._decode_pool_users:
+                # Shut down by close()
+                return
+            self._decode_pool_users[pool] -= 1
+            if pool is not self._decode_pool and not self._decode_pool_users[pool]:
+                del self._decode_pool_users[pool]
+                pool.shutdown(wait=False)
+
+    def close(self):
+        """Close the gRPC channel and stop the decoding worker processes, if any"""
+        with self._decode_pool_lock:
+            pools = list(self._decode_pool_users)
+            self._decode_pool = None
+            self._decode_pool_size = None
+            self._decode_pool_users = {}
+        for pool in pools:
+            pool.shutdown()
+        self.channel.close()
+
+    def get_rib_info(self, family=65537, resource=gobgp.GLOBAL, name=""):
+        """
+            Get BGP-RIB summary (number of destinations, paths and accepted paths)
+
+        resource, name: Table to count, see iter_paths
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetRibInfo(GetRibInfoRequest) returns (GetRibInfoResponse) {}
+        }
+
+        message GetRibInfoRequest {
+          TableInfo info = 1;
+        }
+
+        message TableInfo {
+          Resource type = 1;
+          string name = 2;
+          uint32 family = 3;
+          uint64 num_destination = 4;
+          uint64 num_path = 5;
+          uint64 num_accepted = 6;
+        }
+        """
+        request = gobgp.GetRibInfoRequest()
+        request.info.MergeFrom(gobgp.TableInfo(type=resource, name=name, family=family))
+
+        resp = self._coalesced("GetRibInfo", request, self.stub.GetRibInfo)
+        return resp.info
     
+    def get_roas(self, family=IPV4_UNICAST):
+        """
+            Get the ROAs received from RPKI servers, see pygobgp.rpki.RoaTable
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetRoa(GetRoaRequest) returns (GetRoaResponse) {}
+        }
+
+        message GetRoaRequest {
+          uint32 family = 1;
+        }
+
+        message Roa {
+          uint32 as = 1;
+          uint32 prefixlen = 2;
+          uint32 maxlen = 3;
+          string prefix = 4;
+          RPKIConf conf = 5;
+        }
+        """
+        request = gobgp.GetRoaRequest(family=family)
+        resp = self._coalesced("GetRoa", request, self.stub.GetRoa)
+        return resp.roas
+
+    def get_rpki(self, family=IPV4_UNICAST):
+        """
+            Get RPKI servers and their state (serial, record and message counters)
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetRpki(GetRpkiRequest) returns (GetRpkiResponse) {}
+        }
+
+        message Rpki {
+          RPKIConf conf = 1;
+          RPKIState state = 2;
+        }
+        """
+        request = gobgp.GetRpkiRequest(family=family)
+        resp = self._coalesced("GetRpki", request, self.stub.GetRpki)
+        return resp.servers
+
+    def validate_rib(self, prefix="", family=IPV4_UNICAST, resource=gobgp.GLOBAL):
+        """
+            Ask GoBGP to validate routes against its ROAs again
+
+        prefix: Only this prefix, the whole table if empty
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc ValidateRib(ValidateRibRequest) returns (ValidateRibResponse) {}
+        }
+
+        message ValidateRibRequest {
+          Resource type = 1;
+          uint32 family = 2;
+          string prefix = 3;
+        }
+        """
+        request = gobgp.ValidateRibRequest(type=resource, family=family, prefix=prefix)
+        self.stub.ValidateRib(request)
+
+    def inject_mrt(self, paths, batch_size=1000, resource=gobgp.GLOBAL, vrf_id=""):
+        """
+            Stream paths into a GoBGP table, as done by "gobgp mrt inject"
+
+        paths: iterable of gobgp.Path objects or serialized gobgp.Path bytes, e.g.
+            pygobgp.mrt.MrtReader(...).paths(serialized=True). Consumed lazily.
+        batch_size: number of paths per InjectMrtRequest
+        resource: gobgp.GLOBAL (default) or gobgp.VRF
+        vrf_id: VRF name for gobgp.VRF
+
+        Requests are built directly in the protobuf wire format from the serialized paths.
+        Returns the number of paths sent.
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc InjectMrt(stream InjectMrtRequest) returns (InjectMrtResponse) {}
+        }
+
+        message InjectMrtRequest {
+          Resource resource = 1;
+          string vrf_id = 2;
+          repeated Path paths = 3;
+        }
+        """
+        header = b""
+        if resource:
+            header += encode_varint_field(1, resource)
+        if vrf_id:
+            header += encode_field(2, vrf_id.encode())
+        sent = [0]
+
+        def requests():
+            batch = [header]
+            for path in paths:
+                if not isinstance(path, bytes):
+                    path = path.SerializeToString()
+                batch.append(encode_field(3, path))
+                if len(batch) > batch_size:
+                    sent[0] += len(batch) - 1
+                    yield b"".join(batch)
+                    batch = [header]
+            if len(batch) > 1:
+                sent[0] += len(batch) - 1
+                yield b"".join(batch)
+
+        self._inject_mrt_raw(requests())
+        return sent[0]
+
+    def get_server(self):
+        """
+            Get global configuration (AS, router ID, listen port and addresses)
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetServer(GetServerRequest) returns (GetServerResponse) {}
+        }
+
+        message GetServerResponse {
+          Global global = 1;
+        }
+        """
+        resp = self._coalesced("GetServer", gobgp.GetServerRequest(), self.stub.GetServer)
+        # "global" is a Python keyword
+        return getattr(resp, "global")
+
+    def dump_mrt(self, path, families=(IPV4_UNICAST, IPV6_UNICAST), resource=gobgp.GLOBAL, name=""):
+        """
+            Write a RIB to a TABLE_DUMP_V2 MRT file, compressed if path ends with .gz or .bz2
+
+        families: Address families written, IPv4 and IPv6 unicast by default
+        resource, name: Table to dump, see iter_paths
+
+        PEER_INDEX_TABLE holds GoBGP itself (index 0, for locally originated paths) and every
+        neighbor. GetPath results are received serialized and written as RIB records with their
+        path attributes copied verbatim, nothing is decoded. Returns the number of paths written.
+        """
+        server = self.get_server()
+        peers = [Peer(server.router_id, "0.0.0.0", getattr(server, "as"))]
+        for peer in self.get_all_neighbors():
+            peers.append(Peer(peer.conf.id, peer.conf.neighbor_address, peer.conf.peer_as))
+        peer_indexes = {address: index for index, (_, address, _) in enumerate(peers) if index}
+
+        count = 0
+        with MrtWriter(path) as writer:
+            writer.write_peer_index_table(server.router_id, peers)
+            for family in families:
+                request = gobgp.GetPathRequest(type=resource, name=name, family=family)
+                count += writer.write_paths(self._get_path_raw(request), peer_indexes, ipv6=family == IPV6_UNICAST)
+        return count
+
+    def save_rib(self, path, families=(IPV4_UNICAST, IPV6_UNICAST), resource=gobgp.GLOBAL, name=""):
+        """
+            Write the best paths of a RIB to a table file, see pygobgp.ribfile.MappedRib
+
+        families: Address families saved, IPv4 and IPv6 unicast by default
+        resource, name: Table to save, see iter_paths
+
+        GetRib responses are read from the wire format, path attributes are copied as they are.
+        Returns the size of the file.
+        """
+        routes = []
+        for family in families:
+            routes.extend(self.iter_rib_attributes(family=family, resource=resource, name=name))
+        return write_rib_file(path, routes)
+
+    def iter_rib_attributes(self, family=IPV4_UNICAST, resource=gobgp.GLOBAL, name=""):
+        """
+            Yield (prefix, path attributes) of the best path of every destination of a RIB
+
+        Path attributes are serialized and concatenated, as received from GoBGP: the GetRib
+        response is read from the wire format and nothing is decoded.
+        resource, name: Table to read, see iter_paths
+        """
+        request = gobgp.GetRibRequest(table=gobgp.Table(type=resource, name=name, family=family))
+        buf = self._get_rib_raw(request)
+        for prefix, paths in iter_rib(buf):
+            if paths:
+                yield prefix, b"".join(paths[0][0])
+
+    def delete_paths(self, paths, max_in_flight=64, timeout=None, resource=gobgp.GLOBAL, vrf_id=""):
+        """
+            Withdraw paths concurrently
+
+        paths: gobgp.Path objects (nlri, family and the source of the path to remove)
+        max_in_flight, timeout: see delete_neighbors
+
+        Returns pygobgp.bulk.BulkResult keyed by the index of the path in paths
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc DeletePath(DeletePathRequest) returns (DeletePathResponse) {}
+        }
+
+        message DeletePathRequest {
+          Resource resource = 1;
+          string vrf_id = 2;
+          uint32 family = 3;
+          Path path = 4;
+          bytes uuid = 5;
+        }
+        """
+        requests = ((index, gobgp.DeletePathRequest(resource=resource, vrf_id=vrf_id, family=path.family, path=path))
+                    for index, path in enumerate(paths))
+        return pipeline(self.stub.DeletePath, requests, max_in_flight=max_in_flight, timeout=timeout)
+
+    def add_bmp(self, address, port=11019, policy=gobgp.AddBmpRequest.PRE):
+        """
+            Stream BMP to a collector (see pygobgp.bmp.BmpCollector)
+
+        policy: gobgp.AddBmpRequest.PRE, POST, BOTH, LOCAL or ALL
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc AddBmp(AddBmpRequest) returns (AddBmpResponse) {}
+        }
+
+        message AddBmpRequest {
+          string address = 1;
+          uint32 port = 2;
+          enum MonitoringPolicy {
+            PRE = 0;
+            POST = 1;
+            BOTH = 2;
+            LOCAL = 3;
+            ALL = 4;
+          }
+          MonitoringPolicy type = 3;
+        }
+        """
+        request = gobgp.AddBmpRequest(address=address, port=port, type=policy)
+        self.stub.AddBmp(request)
+
+    def delete_bmp(self, address, port=11019):
+        """
+            Stop streaming BMP to a collector
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc DeleteBmp(DeleteBmpRequest) returns (DeleteBmpResponse) {}
+        }
+
+        message DeleteBmpRequest {
+          string address = 1;
+          uint32 port = 2;
+        }
+        """
+        request = gobgp.DeleteBmpRequest(address=address, port=port)
+        self.stub.DeleteBmp(request)
+
     def get_neighbor(self, address):
         """
             Get a single BGP Neighbor (Peer) details
@@ -73,12 +768,10 @@ class PyGoBGP:
           string address        = 2;
         }
         """
-        resp = self.stub.GetNeighbor(gobgp.GetNeighborRequest())
-
-        for peer in resp.peers:
+        for peer in self.get_all_neighbors():
             if peer.conf.neighbor_address == address:
                 return peer
-            raise PeerNotFound("BGP Neighbor {} is not in the BGP peer list".format(address))
+        raise PeerNotFound("BGP Neighbor {} is not in the BGP peer list".format(address))
 
     def get_all_neighbors(self):
         """
@@ -95,9 +788,99 @@ class PyGoBGP:
           string address        = 2;
         }
         """
-        resp = self.stub.GetNeighbor(gobgp.GetNeighborRequest())
+        resp = self._coalesced("GetNeighbor", gobgp.GetNeighborRequest(), self.stub.GetNeighbor)
         return resp.peers
+
+    def get_policy(self):
+        """
+            Get all policies defined on GoBGP
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetPolicy(GetPolicyRequest) returns (GetPolicyResponse) {}
+        }
+
+        message GetPolicyResponse {
+          repeated Policy policies = 1;
+        }
+        """
+        resp = self._coalesced("GetPolicy", gobgp.GetPolicyRequest(), self.stub.GetPolicy)
+        return resp.policies
         
+    def get_defined_sets(self, defined_type=gobgp.PREFIX, name=""):
+        """
+            Get defined sets (prefix, neighbor, AS path, community... sets used by policies)
+
+        defined_type: gobgp.PREFIX (default), gobgp.NEIGHBOR, gobgp.TAG, gobgp.AS_PATH, gobgp.COMMUNITY,
+            gobgp.EXT_COMMUNITY or gobgp.LARGE_COMMUNITY
+        name: Only the set with this name, all sets of the type if empty
+
+        GRPC service and messages are defined as below:
+
+        service GobgpApi {
+          rpc GetDefinedSet(GetDefinedSetRequest) returns (GetDefinedSetResponse) {}
+        }
+
+        message GetDefinedSetRequest {
+          DefinedType type = 1;
+          string name = 2;
+        }
+
+        message DefinedSet {
+          DefinedType type = 1;
+          string name = 2;
+          repeated string list = 3;
+          repeated Prefix prefixes = 4;
+        }
+        """
+        request = gobgp.GetDefinedSetRequest(type=defined_type, name=name)
+        resp = self.stub.GetDefinedSet(request)
+        return resp.sets
+
+    def add_defined_set(self, defined_set):
+        """
+            Create a defined set, or add entries to an existing one
+
+        defined_set: gobgp.DefinedSet object, see pygobgp.policy.PrefixSetManager for prefix sets
+
+        service GobgpApi {
+          rpc AddDefinedSet(AddDefinedSetRequest) returns (AddDefinedSetResponse) {}
+        }
+        """
+        request = gobgp.AddDefinedSetRequest()
+        request.set.MergeFrom(defined_set)
+        return self.stub.AddDefinedSet(request)
+
+    def delete_defined_set(self, defined_set, all=False):
+        """
+            Remove entries of a defined set, or the whole set if all is True
+
+        service GobgpApi {
+          rpc DeleteDefinedSet(DeleteDefinedSetRequest) returns (DeleteDefinedSetResponse) {}
+        }
+
+        message DeleteDefinedSetRequest {
+          DefinedSet set = 1;
+          bool all = 2;
+        }
+        """
+        request = gobgp.DeleteDefinedSetRequest(all=all)
+        request.set.MergeFrom(defined_set)
+        return self.stub.DeleteDefinedSet(request)
+
+    def replace_defined_set(self, defined_set):
+        """
+            Replace all entries of an existing defined set
+
+        service GobgpApi {
+          rpc ReplaceDefinedSet(ReplaceDefinedSetRequest) returns (ReplaceDefinedSetResponse) {}
+        }
+        """
+        request = gobgp.ReplaceDefinedSetRequest()
+        request.set.MergeFrom(defined_set)
+        return self.stub.ReplaceDefinedSet(request)
+
     def delete_neighbor(self, address):
         """
             Remove BGP neighbor 
@@ -113,6 +896,30 @@ class PyGoBGP:
         }
         
         """
+        request = self._delete_neighbor_request(address)
+        
+        # send DeleteNeighborRequest
+        resp = self.stub.DeleteNeighbor(request)
+        return resp
+
+    def delete_neighbors(self, addresses, max_in_flight=64, timeout=None):
+        """
+            Remove many BGP neighbors concurrently
+
+        addresses: iterable of neighbor addresses
+        max_in_flight: maximum number of DeleteNeighbor requests outstanding at any time
+        timeout: per request deadline in seconds
+
+        Returns a pygobgp.bulk.BulkResult keyed by neighbor address, one failing peer
+        does not stop the others. An address given twice raises ValueError.
+        """
+        requests = ((address, self._delete_neighbor_request(address)) for address in addresses)
+        return pipeline(self.stub.DeleteNeighbor, requests, max_in_flight=max_in_flight, timeout=timeout)
+
+    @staticmethod
+    def _delete_neighbor_request(address):
+        """Build DeleteNeighborRequest for the given neighbor address"""
+
         # Build PeerConf object 
         conf = gobgp.PeerConf(neighbor_address=address)
         
@@ -123,10 +930,7 @@ class PyGoBGP:
         # Build DeleteNeighborRequest object
         request = gobgp.DeleteNeighborRequest()
         request.peer.MergeFrom(peer)
-        
-        # send DeleteNeighborRequest
-        resp = self.stub.DeleteNeighbor(request)
-        return resp
+        return request
     
     def add_neighbor(self, neighbor=None, **kwargs):
         """
@@ -159,24 +963,80 @@ class PyGoBGP:
         }
         
         """
+        request = self._add_neighbor_request(neighbor, **kwargs)
         
-        if not neighbor:
-            # Build PeerConf object 
-            conf = gobgp.PeerConf(**kwargs)
+        # send AddNeighborRequest
+        resp = self._add_neighbor_raw(request)
+        return resp
+
+    def add_neighbors(self, neighbors, max_in_flight=64, timeout=None):
+        """
+            Add many BGP neighbors concurrently
+
+        neighbors: iterable of pygobgp.Neighbor objects
+        max_in_flight: maximum number of AddNeighbor requests outstanding at any time
+        timeout: per request deadline in seconds
+
+        Requests are pipelined over the existing channel. Returns a pygobgp.bulk.BulkResult
+        keyed by neighbor address with per peer errors and throughput, one failing peer
+        does not stop the others. A neighbor address given twice raises ValueError.
+        """
+        requests = ((neighbor.neighbor_address, self._add_neighbor_request(neighbor))
+                    for neighbor in neighbors)
+        return pipeline(self._add_neighbor_raw, requests, max_in_flight=max_in_flight, timeout=timeout)
+
+    def reconcile(self, desired_neighbors, dry_run=False, prune=True, max_in_flight=64, timeout=None):
+        """
+            Converge GoBGP neighbors to the desired set
+
+        desired_neighbors: iterable of pygobgp.Neighbor objects
+        dry_run: If True, only compute and return the plan, nothing is changed on GoBGP
+        prune: If True (default), configured peers which are not desired are deleted
+        max_in_flight: maximum number of outstanding requests per phase
+        timeout: per request deadline in seconds
+
+        Current peers are fetched once and compared to the desired neighbors on the
+        fields managed by pygobgp.Neighbor, families and prefix limits included
+        (see pygobgp.reconcile.diff_peer). Only missing, extra and changed peers are touched:
+        obsolete and changed peers are deleted concurrently first, then missing and changed
+        peers are added concurrently. A changed peer whose deletion failed is not added back.
+
+        Returns a pygobgp.reconcile.ReconcilePlan, print it for a human readable plan.
+        """
+        result = plan(self.get_all_neighbors(), desired_neighbors, prune=prune)
+        if dry_run or result.empty:
+            return result
+
+        updated = {neighbor.neighbor_address: neighbor for neighbor, _ in result.update}
+        result.delete_result = self.delete_neighbors(
+            result.delete + list(updated), max_in_flight=max_in_flight, timeout=timeout)
+
+        to_add = result.add + [neighbor for address, neighbor in updated.items()
+                               if address not in result.delete_result.errors]
+        result.add_result = self.add_neighbors(to_add, max_in_flight=max_in_flight, timeout=timeout)
+        return result
+
+    @staticmethod
+    def _add_neighbor_request(neighbor=None, **kwargs):
+        """
+            Serialized AddNeighborRequest either from a pygobgp.Neighbor (cached by the neighbor)
+            or from PeerConf kwargs
+        """
+
+        if neighbor:
+            return neighbor.serialized_request
+
+        # Build PeerConf object 
+        conf = gobgp.PeerConf(**kwargs)
         
-            # Build Peer object
-            peer = gobgp.Peer(families=[65537])
-            peer.conf.MergeFrom(conf)
-        else:
-            peer = neighbor.peer
+        # Build Peer object
+        peer = gobgp.Peer(families=[65537])
+        peer.conf.MergeFrom(conf)
         
         # Build AddNeighborRequest object
         request = gobgp.AddNeighborRequest()
         request.peer.MergeFrom(peer)
-        
-        # send AddNeighborRequest
-        resp = self.stub.AddNeighbor(request)
-        return resp
+        return request.SerializeToString()
 
     def _extract_routes(self, routes):
         """ 
@@ -204,98 +1064,135 @@ class PyGoBGP:
         Community prefix is C00808. First community FAFA:FFFF second community EEEE:DDDD
         Next Hop prefix is 400304. Next Hop value is 3c010203 (60.1.2.3)
         MED prefix is 800404. MED value is 0000BBBB
+
+        Attributes are decoded by pygobgp.decoder.decode_pattrs
         
         """
         container = []
         for destination in routes.table.destinations:
-            prefix = destination.prefix
-            as_path = self._extract_as_path(destination)
-            next_hop = self._extract_next_hop(destination)
-            community = self._extract_community(destination)
-            med = self._extract_med(destination)
-            route = { 
-                "prefix": prefix,
-                "as_path": as_path,
-                "next_hop": next_hop,
-                "community": community,
-                "med": med,
-            }
+            route = self._extract_route(destination.prefix, destination.paths[0])
             container.append(route)
         return container
 
-    def _extract_as_path(self, destination):
-        prefix = "4002"
-        for attr in destination.paths[0].pattrs:
-            attr = attr.hex()
-            if attr.startswith(prefix):
-                aspath = attr[10:]
-                aspath = list(self.chunkstring(string=aspath, length=8))
-                return aspath 
-        return None
-    
-    def _extract_community(self, destination):
-        prefix = "C00"
-        for attr in destination.paths[0].pattrs:
-            attr = attr.hex()
-            if attr.upper().startswith(prefix):
-                communities = attr[6:]
-                communities = list(self.chunkstring(string=communities, length=4))
-                output = []
-                for index, _ in enumerate(communities):
-                    if index % 2 == 1:
-                        output.append("{}:{}".format(communities[index-1], communities[index]))
-                return output
-        return None
-    
-    def _extract_next_hop(self, destination):
-        prefix = "4003"
-        for attr in destination.paths[0].pattrs:
-            attr = attr.hex()
-            if attr.startswith(prefix):
-                next_hop = int(attr[6:], 16)
-                next_hop = socket.inet_ntoa(struct.pack(">L", next_hop))
-                return next_hop 
-        return None
-    
-    def _extract_med(self, destination):
-        prefix = "800"
-        for attr in destination.paths[0].pattrs:
-            attr = attr.hex()
-            if attr.startswith(prefix):
-                med = int(attr[6:], 16)
-                return med
-        return None
-    
+    def _extract_route(self, prefix, path):
+        """Build route dict of a prefix from the BGP path attributes of one of its paths"""
+        return route_from_record(route_record(prefix, path.pattrs))
+
+    @staticmethod
+    def _decode_nlri(nlri, family=IPV4_UNICAST):
+        """
+            Decode prefix of a Path NLRI, GoBGP serializes unicast NLRI as in BGP UPDATE messages:
+            prefix length (1 byte) followed by the significant bytes of the prefix
+        """
+        return decode_nlri(nlri, ipv6=family == IPV6_UNICAST)
+
     @staticmethod
     def chunkstring(string, length):
         return (int(string[0+i:length+i], 16) for i in range(0, len(string), length))
 
     
+# Field 1 (peer), wire type 2 (length delimited) of AddNeighborRequest
+_ADD_NEIGHBOR_PEER_TAG = b"\x0a"
+
+
 class Neighbor:
     """
-        PyGoBGP Neighbor class (Only supports basic configuration of IPv4 neighbors currently )
+        PyGoBGP Neighbor class
 
+        Parameters are validated when the neighbor is created (see _validate), invalid
+        configurations raise pygobgp.errors.InvalidNeighborConfig.
     """
+    __slots__ = (
+        "_families", "_local_address", "_neighbor_address", "_local_as", "_peer_as", "_transport_address",
+        "_ebgp_multihop", "_ebgp_multihop_ttl", "_router_id", "_auth_password", "_description",
+        "_passive_mode", "_remote_port", "_hold_time", "_keepalive_interval", "_connect_retry",
+        "_minimum_advertisement_interval", "_graceful_restart", "_graceful_restart_time",
+        "_graceful_restart_helper_only", "_graceful_restart_deferral_time", "_long_lived_graceful_restart",
+        "_route_reflector_client", "_route_reflector_cluster_id", "_route_server_client",
+        "_add_paths_receive", "_add_paths_send_max", "_prefix_limits",
+        "_template", "_changed", "_peer", "_parts", "_request",
+    )
+
+    # __init__ parameters, each one is stored in the slot of the same name prefixed with "_"
+    _PARAMS = (
+        "local_address", "neighbor_address", "local_as", "peer_as", "transport_address", "ebgp_multihop",
+        "ebgp_multihop_ttl", "router_id", "auth_password", "description", "families", "passive_mode",
+        "remote_port", "hold_time", "keepalive_interval", "connect_retry", "minimum_advertisement_interval",
+        "graceful_restart", "graceful_restart_time", "graceful_restart_helper_only",
+        "graceful_restart_deferral_time", "long_lived_graceful_restart", "route_reflector_client",
+        "route_reflector_cluster_id", "route_server_client", "add_paths_receive", "add_paths_send_max",
+        "prefix_limits",
+    )
+
+    _TIMERS = ("connect_retry", "hold_time", "keepalive_interval", "minimum_advertisement_interval")
+    _GRACEFUL_RESTART = ("graceful_restart", "graceful_restart_time", "graceful_restart_helper_only",
+                         "graceful_restart_deferral_time", "long_lived_graceful_restart")
+    _ADD_PATHS = ("add_paths_receive", "add_paths_send_max")
+
+    # Peer fields built by Neighbor (families excluded), in field number order: name, field number,
+    # builder and the parameters they are built from. Builders return a message, a list of
+    # messages or None if the field is not needed.
+    _PEER_MESSAGES = (
+        ("conf", 3, "_create_peer_conf", ("local_address", "neighbor_address", "local_as", "peer_as",
+                                          "auth_password", "description", "prefix_limits")),
+        ("ebgp_multihop", 4, "_create_ebgp_multihop", ("ebgp_multihop", "ebgp_multihop_ttl")),
+        ("route_reflector", 5, "_create_route_reflector", ("route_reflector_client", "route_reflector_cluster_id")),
+        ("timers", 7, "_create_timers", _TIMERS),
+        ("transport", 8, "_create_transport", ("transport_address", "passive_mode", "remote_port")),
+        ("route_server", 9, "_create_route_server", ("route_server_client",)),
+        ("graceful_restart", 10, "_create_graceful_restart", _GRACEFUL_RESTART),
+        ("afi_safis", 11, "_create_afi_safis", ("families",) + _GRACEFUL_RESTART + _ADD_PATHS),
+        ("add_paths", 12, "_create_add_paths", _ADD_PATHS),
+    )
+
     def __init__(self, local_address, neighbor_address, local_as, peer_as, transport_address=None,
                  ebgp_multihop=True, ebgp_multihop_ttl=255, router_id=None, auth_password=None,
-                 description=None, **kwargs):
+                 description=None, families=None, passive_mode=False, remote_port=None,
+                 hold_time=None, keepalive_interval=None, connect_retry=None, minimum_advertisement_interval=None,
+                 graceful_restart=False, graceful_restart_time=None, graceful_restart_helper_only=False,
+                 graceful_restart_deferral_time=None, long_lived_graceful_restart=False,
+                 route_reflector_client=False, route_reflector_cluster_id=None, route_server_client=False,
+                 add_paths_receive=False, add_paths_send_max=0, prefix_limits=None, **kwargs):
         """
 
-        
-        local_address: Local IPv4 address for BGP peering.
-        neighbor_adddress: Remote router IPv4 address for BGP peering.
+
+        local_address: Local IP address for BGP peering.
+        neighbor_adddress: Remote router IP address for BGP peering.
         local_as : Local autonomous system number
         peer_as: Remote autonomous system number.
-        transport_address: IPv4 address for outgoing BGP messages. By default set to local_address
+        transport_address: IP address for outgoing BGP messages. By default set to local_address
         ebgp_multihop: True if enabled. Default True
         ebgp_multihop_ttl: Unlike Cisco routers, by default it's set to 255, not 1.
         router_id: By default set to local_address
         auth_password: BGP MD5 password by default None
         description: Neighbor description, freetext
+        families: Address families, list of family names (see pygobgp.FAMILIES) or numbers.
+            Default IPv4 unicast only
+        passive_mode: If True, GoBGP waits for the neighbor to open the session
+        remote_port: Neighbor TCP port, GoBGP default (179) if None
+        hold_time: Hold time in seconds, 0 or 3-65535. GoBGP default (90) if None
+        keepalive_interval: Keepalive interval in seconds, must be lower than hold_time. GoBGP default (30) if None
+        connect_retry: Connect retry interval in seconds. GoBGP default (120) if None
+        minimum_advertisement_interval: MRAI in seconds. GoBGP default if None
+        graceful_restart: Enable graceful restart (RFC 4724) for the session and all its families
+        graceful_restart_time: Restart time in seconds advertised to the neighbor, 0-4095
+        graceful_restart_helper_only: Only act as graceful restart helper
+        graceful_restart_deferral_time: Route selection deferral time in seconds
+        long_lived_graceful_restart: Enable long lived graceful restart, requires graceful_restart
+        route_reflector_client: Neighbor is a route reflector client, iBGP only
+        route_reflector_cluster_id: Route reflector cluster id (IPv4 address format), requires route_reflector_client
+        route_server_client: Neighbor is a route server client
+        add_paths_receive: Accept multiple paths per prefix from the neighbor (RFC 7911)
+        add_paths_send_max: Number of paths per prefix to send to the neighbor, 0-255, 0 disables sending
+        prefix_limits: dict of family -> max_prefixes or family -> (max_prefixes, shutdown_threshold_pct),
+            families must be enabled in families. Normalized to a tuple of (family, max_prefixes, pct)
         apply_policy: Not yet defined, all accept both for out and in policies currently (TODO: Create Policy Class)
-        
+
         """
-        self._families = [65537] # Only support for BGP IPv4 currently
+        if kwargs:
+            raise InvalidNeighborConfig("Unknown Neighbor parameters: {}".format(", ".join(sorted(kwargs))))
+
+        self._families = families if families is not None else [IPV4_UNICAST]
         self._local_address = local_address
         self._neighbor_address = neighbor_address
         self._local_as = local_as
@@ -306,83 +1203,431 @@ class Neighbor:
         self._router_id = router_id if router_id else local_address
         self._auth_password = auth_password
         self._description = description
-        self.peer = self._create_peer() 
+        self._passive_mode = passive_mode
+        self._remote_port = remote_port
+        self._hold_time = hold_time
+        self._keepalive_interval = keepalive_interval
+        self._connect_retry = connect_retry
+        self._minimum_advertisement_interval = minimum_advertisement_interval
+        self._graceful_restart = graceful_restart
+        self._graceful_restart_time = graceful_restart_time
+        self._graceful_restart_helper_only = graceful_restart_helper_only
+        self._graceful_restart_deferral_time = graceful_restart_deferral_time
+        self._long_lived_graceful_restart = long_lived_graceful_restart
+        self._route_reflector_client = route_reflector_client
+        self._route_reflector_cluster_id = route_reflector_cluster_id
+        self._route_server_client = route_server_client
+        self._add_paths_receive = add_paths_receive
+        self._add_paths_send_max = add_paths_send_max
+        self._prefix_limits = prefix_limits if prefix_limits is not None else {}
+        self._template = None
+        self._changed = None
+        self._peer = None
+        self._parts = None
+        self._request = None
+        self._validate()
 
-    def _create_peer(self, **kwargs):
-        """ 
+    def _validate(self):
+        """
+            Check parameters, normalize families and prefix_limits.
+            Raises InvalidNeighborConfig describing the first problem found.
+        """
+        def fail(msg, *args):
+            raise InvalidNeighborConfig("Neighbor {}: {}".format(self._neighbor_address, msg.format(*args)))
+
+        def check_int(name, value, low, high):
+            if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+                fail("{} must be an integer between {} and {}, got {!r}", name, low, high, value)
+
+        for name in ("local_address", "neighbor_address", "transport_address"):
+            try:
+                ipaddress.ip_address(getattr(self, "_" + name))
+            except ValueError:
+                fail("{} is not a valid IP address: {!r}", name, getattr(self, "_" + name))
+        for name in ("router_id", "route_reflector_cluster_id"):
+            value = getattr(self, "_" + name)
+            if value is None and name == "route_reflector_cluster_id":
+                continue
+            try:
+                ipaddress.IPv4Address(value)
+            except ValueError:
+                fail("{} must be in IPv4 address format: {!r}", name, value)
+
+        check_int("local_as", self._local_as, 1, 4294967295)
+        check_int("peer_as", self._peer_as, 1, 4294967295)
+        check_int("ebgp_multihop_ttl", self._ebgp_multihop_ttl, 1, 255)
+        if self._remote_port is not None:
+            check_int("remote_port", self._remote_port, 1, 65535)
+
+        for name in self._TIMERS:
+            value = getattr(self, "_" + name)
+            if value is not None:
+                check_int(name, value, 0, 65535)
+        if self._hold_time is not None and 0 < self._hold_time < 3:
+            fail("hold_time must be 0 or at least 3 seconds, got {}", self._hold_time)
+        if self._keepalive_interval is not None and self._hold_time:
+            if self._keepalive_interval >= self._hold_time:
+                fail("keepalive_interval ({}) must be lower than hold_time ({})",
+                     self._keepalive_interval, self._hold_time)
+
+        if self._graceful_restart_time is not None:
+            check_int("graceful_restart_time", self._graceful_restart_time, 0, 4095)
+        if self._graceful_restart_deferral_time is not None:
+            check_int("graceful_restart_deferral_time", self._graceful_restart_deferral_time, 0, 65535)
+        if not self._graceful_restart and (self._graceful_restart_helper_only or self._long_lived_graceful_restart):
+            fail("graceful_restart_helper_only and long_lived_graceful_restart require graceful_restart")
+
+        if self._route_reflector_client and self._local_as != self._peer_as:
+            fail("route_reflector_client requires an iBGP session")
+        if self._route_reflector_cluster_id is not None and not self._route_reflector_client:
+            fail("route_reflector_cluster_id requires route_reflector_client")
+
+        check_int("add_paths_send_max", self._add_paths_send_max, 0, 255)
+
+        families = []
+        for family in self._families:
+            number = FAMILIES.get(family, family)
+            if number not in FAMILIES.values():
+                fail("unknown address family {!r}", family)
+            if number in families:
+                fail("address family {!r} is defined more than once", family)
+            families.append(number)
+        if not families:
+            fail("at least one address family is required")
+        self._families = tuple(families)
+
+        prefix_limits = []
+        limits = self._prefix_limits.items() if isinstance(self._prefix_limits, dict) else self._prefix_limits
+        if not isinstance(limits, (tuple, list, type({}.items()))):
+            fail("prefix_limits must be a dict of family -> limit, got {!r}", self._prefix_limits)
+        for entry in limits:
+            # (family, limit) pairs, or (family, max_prefixes, pct) once normalized
+            if not isinstance(entry, (tuple, list)) or len(entry) not in (2, 3):
+                fail("prefix limit must be a (family, limit) pair, got {!r}", entry)
+            family, limit = (entry[0], entry[1:]) if len(entry) == 3 else entry
+            if isinstance(limit, (tuple, list)):
+                if len(limit) != 2:
+                    fail("prefix limit of {!r} must be max_prefixes or (max_prefixes, shutdown_threshold_pct), "
+                         "got {!r}", family, limit)
+                max_prefixes, pct = limit
+            else:
+                max_prefixes, pct = limit, 0
+            try:
+                number = FAMILIES.get(family, family)
+            except TypeError:
+                fail("unknown address family {!r}", family)
+            if number not in self._families:
+                fail("prefix limit for address family {!r} which is not enabled", family)
+            check_int("max_prefixes", max_prefixes, 1, 4294967295)
+            check_int("shutdown_threshold_pct", pct, 0, 100)
+            prefix_limits.append((number, max_prefixes, pct))
+        self._prefix_limits = tuple(sorted(prefix_limits))
+
+    @property
+    def neighbor_address(self):
+        """
+            Neighbor IP address, read without building the Peer object
+        """
+        return self._neighbor_address
+
+    @property
+    def peer(self):
+        """
+            gobgp Peer object of this neighbor, built on first access and reused afterwards.
+            Treat it as read-only.
+        """
+        if self._peer is None:
+            if self._template is None and self._parts is None:
+                self._peer = self._create_peer()
+            else:
+                self._peer = gobgp.Peer.FromString(b"".join(self._serialized_parts()))
+        return self._peer
+
+    @property
+    def serialized_request(self):
+        """
+            AddNeighborRequest for this neighbor serialized to bytes, built once and cached.
+
+            A serialized message is the concatenation of its serialized fields, so the Peer is
+            assembled from the serialized Peer fields (see _serialized_parts) and no Peer or
+            AddNeighborRequest object is built at all.
+        """
+        if self._request is None:
+            peer = b"".join(self._serialized_parts())
+            self._request = _ADD_NEIGHBOR_PEER_TAG + encode_varint(len(peer)) + peer
+        return self._request
+
+    def _serialized_parts(self):
+        """
+            Serialized Peer fields (families, then _PEER_MESSAGES), computed once.
+
+            A derived neighbor reuses the bytes of its template for every field not affected by
+            its changes, so only changed sub-messages are built and serialized.
+        """
+        if self._parts is None:
+            template = self._template._serialized_parts() if self._template is not None else None
+            if template and "families" not in self._changed:
+                parts = [template[0]]
+            else:
+                parts = [gobgp.Peer(families=self._families).SerializeToString()]
+            for index, (_, number, builder, params) in enumerate(self._PEER_MESSAGES, 1):
+                if template and not self._changed.intersection(params):
+                    parts.append(template[index])
+                    continue
+                messages = getattr(self, builder)()
+                if messages is None:
+                    messages = []
+                elif not isinstance(messages, list):
+                    messages = [messages]
+                parts.append(b"".join(encode_field(number, message.SerializeToString()) for message in messages))
+            self._parts = tuple(parts)
+            self._template = None
+            self._changed = None
+        return self._parts
+
+    def derive(self, **changes):
+        """
+            Create a new Neighbor from this one with some parameters changed
+
+        changes: any of the __init__ parameters, e.g. derive(neighbor_address="10.0.255.4", peer_as=65002)
+
+        transport_address and router_id follow local_address if they were left to their default.
+        The new neighbor keeps a reference to this one as a template until it is serialized: the
+        serialized Peer fields of the template are reused and only the sub-messages affected by
+        the changes are built, so deriving thousands of neighbors from one template is much
+        cheaper than building each of them from scratch.
+        """
+        unknown = set(changes) - set(self._PARAMS)
+        if unknown:
+            raise InvalidNeighborConfig("Unknown Neighbor parameters: {}".format(", ".join(sorted(unknown))))
+
+        neighbor = Neighbor.__new__(Neighbor)
+        for param in self._PARAMS:
+            setattr(neighbor, "_" + param, getattr(self, "_" + param))
+
+        if "local_address" in changes:
+            for param in ("transport_address", "router_id"):
+                if param not in changes and getattr(self, "_" + param) == self._local_address:
+                    changes[param] = changes["local_address"]
+        for param, value in changes.items():
+            setattr(neighbor, "_" + param, value)
+
+        # Never chain templates, share the template of a not yet serialized neighbor instead
+        if self._template is not None:
+            neighbor._template = self._template
+            neighbor._changed = self._changed | frozenset(changes)
+        else:
+            neighbor._template = self
+            neighbor._changed = frozenset(changes)
+        neighbor._peer = None
+        neighbor._parts = None
+        neighbor._request = None
+        neighbor._validate()
+        return neighbor
+
+    def _create_peer(self):
+        """
         Peer object is required for things like AddNeigborRequest, DeleteNeighborRequest, GetNeighborRequest
         https://github.com/oneryalcin/PyGoBGP-Example/blob/372bf4c15fb0a86b5ca8886c8b7a07ec24127136/docker/control/proto_files/gobgp.proto#L119
         """
-        
-        # Build PeerConf
-        peer_conf = self._create_peer_conf(**kwargs)
-        
-        # Build BGP Transport 
-        transport = self._create_transport(**kwargs)
-        
-        # Build EBGP Multihop
-        ebgp_multihop = self._create_ebgp_multihop(**kwargs)
-        
+
         # Build Peer object
         peer = gobgp.Peer(families=self._families)
-        peer.conf.MergeFrom(peer_conf)
-        peer.transport.MergeFrom(transport)
-        peer.ebgp_multihop.MergeFrom(ebgp_multihop)
-        
+
+        # Build PeerConf, EbgpMultihop, Transport and every optional sub-message needed
+        for name, _, builder, _ in self._PEER_MESSAGES:
+            messages = getattr(self, builder)()
+            if messages is None:
+                continue
+            if isinstance(messages, list):
+                getattr(peer, name).extend(messages)
+            else:
+                getattr(peer, name).MergeFrom(messages)
+
         return peer
 
-    def _create_peer_conf(self, **kwargs):
-        """ 
+    def _create_peer_conf(self):
+        """
         Create gRPC object for PeerConf
         https://github.com/oneryalcin/PyGoBGP-Example/blob/372bf4c15fb0a86b5ca8886c8b7a07ec24127136/docker/control/proto_files/gobgp.proto#L626
         """
-
-        # Discard kwargs until I come back to adding this feature later
-        _ = kwargs
-
         params = {
             "local_address": self._local_address,
             "neighbor_address": self._neighbor_address,
             "local_as": self._local_as,
             "peer_as": self._peer_as,
         }
-        
+
         # Add optional Params
         if self._auth_password:
             params['auth_password'] = self._auth_password
-            
+
         if self._description:
             params['description'] = self._description
-        
+
+        if self._prefix_limits:
+            params['prefix_limits'] = [
+                gobgp.PrefixLimit(family=family, max_prefixes=max_prefixes, shutdown_threshold_pct=pct)
+                for family, max_prefixes, pct in self._prefix_limits
+            ]
+
         return gobgp.PeerConf(**params)
-        
-    def _create_transport(self, **kwargs):
-        """ 
+
+    def _create_transport(self):
+        """
         BGP Transport address, where BGP packets are sourced
         https://github.com/oneryalcin/PyGoBGP-Example/blob/372bf4c15fb0a86b5ca8886c8b7a07ec24127136/docker/control/proto_files/gobgp.proto#L607
         """
-        # Discard kwargs until I come back to adding this feature later
-        _ = kwargs
-
         params = {
-            "local_address": self._local_address,
+            "local_address": self._transport_address,
         }
-        
+
+        if self._passive_mode:
+            params['passive_mode'] = True
+
+        if self._remote_port:
+            params['remote_port'] = self._remote_port
+
         return gobgp.Transport(**params)
-        
-    def _create_ebgp_multihop(self, **kwargs):
-        """ 
-        eBGP Multihop params 
+
+    def _create_ebgp_multihop(self):
+        """
+        eBGP Multihop params
         https://github.com/oneryalcin/PyGoBGP-Example/blob/372bf4c15fb0a86b5ca8886c8b7a07ec24127136/docker/control/proto_files/gobgp.proto#L656
         """
-
-        # Discard kwargs until I come back to adding this feature later
-        _ = kwargs
-
         params = {
             "enabled": self._ebgp_multihop,
             "multihop_ttl": self._ebgp_multihop_ttl,
         }
-        
+
         return gobgp.EbgpMultihop(**params)
 
+    def _create_timers(self):
+        """
+        Session timers, only the ones set are sent, GoBGP defaults apply to the others
+
+        message Timers {
+          TimersConfig config = 1;
+          TimersState state = 2;
+        }
+        """
+        params = {name: getattr(self, "_" + name) for name in self._TIMERS if getattr(self, "_" + name) is not None}
+        if not params:
+            return None
+
+        timers = gobgp.Timers()
+        timers.config.MergeFrom(gobgp.TimersConfig(**params))
+        return timers
+
+    def _create_route_reflector(self):
+        """
+        Route reflector client params
+
+        message RouteReflector {
+          bool route_reflector_client = 1;
+          string route_reflector_cluster_id = 2;
+        }
+        """
+        if not self._route_reflector_client:
+            return None
+
+        params = {
+            "route_reflector_client": True,
+        }
+
+        if self._route_reflector_cluster_id:
+            params['route_reflector_cluster_id'] = self._route_reflector_cluster_id
+
+        return gobgp.RouteReflector(**params)
+
+    def _create_route_server(self):
+        """
+        Route server client params
+
+        message RouteServer {
+          bool route_server_client = 1;
+        }
+        """
+        if not self._route_server_client:
+            return None
+
+        return gobgp.RouteServer(route_server_client=True)
+
+    def _create_graceful_restart(self):
+        """
+        Graceful restart params
+
+        message GracefulRestart {
+          bool enabled = 1;
+          uint32 restart_time = 2;
+          bool helper_only = 3;
+          uint32 deferral_time = 4;
+          bool notification_enabled = 5;
+          bool longlived_enabled = 6;
+        }
+        """
+        if not self._graceful_restart:
+            return None
+
+        params = {
+            "enabled": True,
+            "helper_only": self._graceful_restart_helper_only,
+            "notification_enabled": True,
+            "longlived_enabled": self._long_lived_graceful_restart,
+        }
+
+        if self._graceful_restart_time is not None:
+            params['restart_time'] = self._graceful_restart_time
+
+        if self._graceful_restart_deferral_time is not None:
+            params['deferral_time'] = self._graceful_restart_deferral_time
+
+        return gobgp.GracefulRestart(**params)
+
+    def _create_add_paths(self):
+        """
+        ADD-PATH params (RFC 7911) of the session
+
+        message AddPaths {
+          AddPathsConfig config = 1;
+          AddPathsState state = 2;
+        }
+        """
+        if not (self._add_paths_receive or self._add_paths_send_max):
+            return None
+
+        add_paths = gobgp.AddPaths()
+        add_paths.config.MergeFrom(self._create_add_paths_config())
+        return add_paths
+
+    def _create_add_paths_config(self):
+        return gobgp.AddPathsConfig(receive=self._add_paths_receive, send_max=self._add_paths_send_max)
+
+    def _create_afi_safis(self):
+        """
+        One AfiSafi per enabled family carrying the per family graceful restart and ADD-PATH params
+
+        message AfiSafi {
+          MpGracefulRestart mp_graceful_restart = 1;
+          AfiSafiConfig config = 2;
+          ...
+          LongLivedGracefulRestart long_lived_graceful_restart = 8;
+          AddPaths add_paths = 9;
+        }
+        """
+        afi_safis = []
+        for family in self._families:
+            afi_safi = gobgp.AfiSafi()
+            afi_safi.config.MergeFrom(gobgp.AfiSafiConfig(family=family, enabled=True))
+
+            if self._graceful_restart:
+                afi_safi.mp_graceful_restart.config.enabled = True
+
+            if self._long_lived_graceful_restart:
+                afi_safi.long_lived_graceful_restart.config.enabled = True
+
+            if self._add_paths_receive or self._add_paths_send_max:
+                afi_safi.add_paths.config.MergeFrom(self._create_add_paths_config())
+
+            afi_safis.append(afi_safi)
+        return afi_safis
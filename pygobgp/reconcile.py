@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Peer sub-messages and fields managed by pygobgp.Neighbor, only these are compared
+# when deciding whether an existing peer has to be re-provisioned. Flags default to off on
+# both sides, so they are always compared and turning one off is a change too.
+RECONCILED_FIELDS = (
+    ("conf", ("local_as", "peer_as", "local_address", "auth_password", "description")),
+    ("transport", ("local_address", "passive_mode")),
+    ("ebgp_multihop", ("enabled", "multihop_ttl")),
+    ("route_reflector", ("route_reflector_client",)),
+    ("route_server", ("route_server_client",)),
+    ("graceful_restart", ("enabled", "helper_only", "longlived_enabled")),
+    ("add_paths.config", ("receive", "send_max")),
+)
+
+# Optional fields, GoBGP fills in its defaults for them so they are only compared
+# when the desired neighbor sets them.
+OPTIONAL_RECONCILED_FIELDS = (
+    ("transport", ("remote_port",)),
+    ("timers.config", ("connect_retry", "hold_time", "keepalive_interval", "minimum_advertisement_interval")),
+    ("route_reflector", ("route_reflector_cluster_id",)),
+    ("graceful_restart", ("restart_time", "deferral_time")),
+)
+
+
+def _get_message(peer, path):
+    for name in path.split("."):
+        peer = getattr(peer, name)
+    return peer
+
+
+def _families(peer):
+    """Enabled families of peer, sorted. GoBGP reports them in afi_safis, Peer.families is a fallback"""
+    families = [afi_safi.config.family for afi_safi in peer.afi_safis]
+    return tuple(sorted(families or peer.families))
+
+
+def _prefix_limits(peer):
+    """(family, max_prefixes, shutdown_threshold_pct) of every PeerConf prefix limit, sorted"""
+    return tuple(sorted((limit.family, limit.max_prefixes, limit.shutdown_threshold_pct)
+                        for limit in peer.conf.prefix_limits))
+
+
+def diff_peer(current, desired):
+    """
+        Compare two Peer objects on RECONCILED_FIELDS, OPTIONAL_RECONCILED_FIELDS, families and prefix limits
+
+    Families and prefix limits are compared regardless of their order.
+    Returns dict of "message.field" -> (current value, desired value) for every differing field,
+    empty dict if the peers are equivalent.
+    """
+    changes = {}
+    for optional, managed in ((False, RECONCILED_FIELDS), (True, OPTIONAL_RECONCILED_FIELDS)):
+        for message, fields in managed:
+            current_message = _get_message(current, message)
+            desired_message = _get_message(desired, message)
+            for field in fields:
+                current_value = getattr(current_message, field)
+                desired_value = getattr(desired_message, field)
+                if optional and not desired_value:
+                    continue
+                if current_value != desired_value:
+                    changes["{}.{}".format(message, field)] = (current_value, desired_value)
+    for name, values in (("afi_safis", _families), ("conf.prefix_limits", _prefix_limits)):
+        current_value = values(current)
+        desired_value = values(desired)
+        if current_value != desired_value:
+            changes[name] = (current_value, desired_value)
+    return changes
+
+
+class ReconcilePlan:
+    """
+        Minimal set of changes converging GoBGP neighbors to a desired set
+
+    add: Neighbor objects not configured on GoBGP yet
+    delete: addresses of configured peers which are not desired
+    update: list of (Neighbor, changes) for configured peers which differ from the desired state,
+        changes is the dict returned by diff_peer. GoBGP v1.25 has no UpdateNeighbor call,
+        these peers are deleted and added back.
+    unchanged: addresses of configured peers already in the desired state
+
+    Once applied, add_result and delete_result hold the pygobgp.bulk.BulkResult of each phase.
+    """
+
+    def __init__(self):
+        self.add = []
+        self.delete = []
+        self.update = []
+        self.unchanged = []
+        self.add_result = None
+        self.delete_result = None
+
+    @property
+    def empty(self):
+        return not (self.add or self.delete or self.update)
+
+    @property
+    def applied(self):
+        return self.add_result is not None or self.delete_result is not None
+
+    @property
+    def ok(self):
+        return all(result.ok for result in (self.add_result, self.delete_result) if result is not None)
+
+    def __str__(self):
+        lines = []
+        for neighbor in self.add:
+            lines.append("+ {}".format(neighbor.neighbor_address))
+        for address in self.delete:
+            lines.append("- {}".format(address))
+        for neighbor, changes in self.update:
+            lines.append("~ {}".format(neighbor.neighbor_address))
+            for field in sorted(changes):
+                lines.append("    {}: {!r} -> {!r}".format(field, *changes[field]))
+        lines.append("{} to add, {} to delete, {} to update, {} unchanged".format(
+            len(self.add), len(self.delete), len(self.update), len(self.unchanged)))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "<ReconcilePlan add={} delete={} update={} unchanged={}>".format(
+            len(self.add), len(self.delete), len(self.update), len(self.unchanged))
+
+
+def plan(current_peers, desired_neighbors, prune=True):
+    """
+        Compute ReconcilePlan from current Peer objects and desired pygobgp.Neighbor objects
+
+    prune: If True, configured peers missing from desired_neighbors are deleted
+    """
+    result = ReconcilePlan()
+    current = {peer.conf.neighbor_address: peer for peer in current_peers}
+
+    desired_addresses = set()
+    for neighbor in desired_neighbors:
+        address = neighbor.neighbor_address
+        if address in desired_addresses:
+            raise ValueError("Neighbor {} is defined more than once".format(address))
+        desired_addresses.add(address)
+
+        peer = current.get(address)
+        if peer is None:
+            result.add.append(neighbor)
+            continue
+
+        changes = diff_peer(peer, neighbor.peer)
+        if changes:
+            result.update.append((neighbor, changes))
+        else:
+            result.unchanged.append(address)
+
+    if prune:
+        result.delete = [address for address in current if address not in desired_addresses]
+    return result
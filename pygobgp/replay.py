@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+    Replay BGP4MP UPDATE captures into GoBGP
+
+Updates are scheduled on the capture timeline, scaled by a speed factor, and sent once per tick:
+announcements with InjectMrt, withdrawals with DeletePath. Within a tick only the last update of
+each (peer, prefix) is sent, as GoBGP would end up in the same state.
+
+replayer = Replayer(gobgp, "updates.20181001.0000.bz2", speed=100)
+print(replayer.run())
+"""
+import time
+
+import pygobgp.gobgp_pb2 as gobgp
+from pygobgp.mrt import MrtReader
+from pygobgp.mrt import encode_path
+from pygobgp.mrt import iter_updates
+
+
+class ReplayStats:
+    """
+        Outcome of Replayer.run
+
+    updates: BGP UPDATE messages read
+    announced, withdrawn: prefixes sent to GoBGP
+    coalesced: prefix updates superseded by a later one of the same tick, not sent
+    ticks: batches sent
+    capture_seconds: capture time span replayed
+    elapsed: wall clock seconds of the replay
+    busy: seconds spent waiting for GoBGP (InjectMrt and DeletePath)
+    max_lag: largest delay between the scheduled time of a batch and the moment GoBGP had it
+    errors: failed DeletePath requests
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.updates = 0
+        self.announced = 0
+        self.withdrawn = 0
+        self.coalesced = 0
+        self.ticks = 0
+        self.capture_seconds = 0.0
+        self.elapsed = 0.0
+        self.busy = 0.0
+        self.max_lag = 0.0
+        self.errors = 0
+
+    @property
+    def target_rate(self):
+        """Prefix updates per second asked for: capture rate times speed, None as fast as possible"""
+        if self.speed is None or not self.capture_seconds:
+            return None
+        return (self.announced + self.withdrawn + self.coalesced) / self.capture_seconds * self.speed
+
+    @property
+    def rate(self):
+        """Prefix updates per second achieved"""
+        if not self.elapsed:
+            return 0.0
+        return (self.announced + self.withdrawn + self.coalesced) / self.elapsed
+
+    @property
+    def load(self):
+        """Fraction of the replay spent waiting for GoBGP, close to 1 when it does not keep up"""
+        if not self.elapsed:
+            return 0.0
+        return self.busy / self.elapsed
+
+    def __repr__(self):
+        target = "max" if self.target_rate is None else "{:.1f}/s".format(self.target_rate)
+        return ("<ReplayStats updates={} announced={} withdrawn={} coalesced={} ticks={} target={} "
+                "rate={:.1f}/s load={:.2f} max_lag={:.3f}s errors={}>").format(
+            self.updates, self.announced, self.withdrawn, self.coalesced, self.ticks, target,
+            self.rate, self.load, self.max_lag, self.errors)
+
+
+class Replayer:
+    """
+        Replay the BGP4MP updates of an MRT file into GoBGP
+
+    Paths are attributed to the peer the update was captured from (source ASN and neighbor
+    address), so withdrawals remove what the same peer announced.
+    """
+
+    def __init__(self, client, path, speed=1.0, tick=0.1, max_batch=10000, max_in_flight=64):
+        """
+        client: PyGoBGP instance
+        path: MRT file with BGP4MP / BGP4MP_ET records
+        speed: Replay speed factor (1.0 real time, 100 for 100x), None for as fast as possible
+        tick: Seconds of wall clock time per batch
+        max_batch: Maximum prefix updates per batch, batches are sent early when reached
+        max_in_flight: Concurrent DeletePath requests
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive or None")
+        self.client = client
+        self.path = path
+        self.speed = speed
+        self.tick = tick
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+
+    def run(self, progress=None):
+        """
+            Replay the whole file, returns ReplayStats
+
+        progress: called with the ReplayStats after every batch
+        """
+        stats = ReplayStats(self.speed)
+        # (peer address, family, nlri) -> serialized announced path, None for a withdrawal
+        pending = {}
+        batch_due = None
+        first = None
+        start = time.monotonic()
+
+        with MrtReader(self.path) as reader:
+            for update in iter_updates(reader):
+                if first is None:
+                    first = update.timestamp
+                stats.updates += 1
+                stats.capture_seconds = update.timestamp - first
+
+                due = self._due(start, update.timestamp - first)
+                if pending and (due - batch_due >= self.tick or len(pending) >= self.max_batch):
+                    self._flush(pending, batch_due, stats, progress)
+                    pending = {}
+                if not pending:
+                    batch_due = due
+                    self._wait(batch_due)
+
+                for family, nlri in update.withdrawn:
+                    self._pending(pending, stats, (update.peer_address, update.peer_asn, family, nlri), None)
+                for family, nlri, pattrs in update.announced:
+                    path = encode_path(nlri, pattrs, family, age=int(update.timestamp), source_asn=update.peer_asn,
+                                       source_id=update.peer_address, neighbor_ip=update.peer_address)
+                    self._pending(pending, stats, (update.peer_address, update.peer_asn, family, nlri), path)
+
+        if pending:
+            self._flush(pending, batch_due, stats, progress)
+        stats.elapsed = time.monotonic() - start
+        return stats
+
+    def _due(self, start, offset):
+        """Wall clock time an update offset seconds into the capture is due"""
+        if self.speed is None:
+            return time.monotonic()
+        return start + offset / self.speed
+
+    @staticmethod
+    def _wait(due):
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _pending(pending, stats, key, path):
+        if key in pending:
+            stats.coalesced += 1
+        pending[key] = path
+
+    def _flush(self, pending, due, stats, progress):
+        """Send a batch, announcements first"""
+        sent = time.monotonic()
+        announced = [path for path in pending.values() if path is not None]
+        if announced:
+            stats.announced += self.client.inject_mrt(announced, batch_size=len(announced))
+
+        withdrawals = [(peer_address, peer_asn, family, nlri)
+                       for (peer_address, peer_asn, family, nlri), path in pending.items() if path is None]
+        if withdrawals:
+            paths = [gobgp.Path(nlri=nlri, family=family, is_withdraw=True, source_asn=peer_asn,
+                                source_id=peer_address, neighbor_ip=peer_address)
+                     for peer_address, peer_asn, family, nlri in withdrawals]
+            result = self.client.delete_paths(paths, max_in_flight=self.max_in_flight)
+            stats.withdrawn += len(result.succeeded)
+            stats.errors += len(result.errors)
+
+        done = time.monotonic()
+        stats.busy += done - sent
+        stats.max_lag = max(stats.max_lag, done - due)
+        stats.ticks += 1
+        if progress is not None:
+            progress(stats)
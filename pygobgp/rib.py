@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from pygobgp.aspath import AsPathMatcher
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import route_from_record
+from pygobgp.decoder import route_record
+
+# Inverted indexes a RibSnapshot can maintain
+COMMUNITY = "community"
+ORIGIN = "origin"
+NEXT_HOP = "next_hop"
+INDEXES = (COMMUNITY, ORIGIN, NEXT_HOP)
+
+
+def _index_keys(index, route):
+    """Keys of route in an inverted index"""
+    if index == COMMUNITY:
+        return route.get("community") or ()
+    if index == ORIGIN:
+        as_path = route.get("as_path")
+        return (as_path[-1],) if as_path else ()
+    next_hop = route.get("next_hop")
+    return (next_hop,) if next_hop else ()
+
+
+class RibSnapshot:
+    """
+        Routes of a RIB keyed by prefix, with optional inverted indexes
+
+    Indexes map a community ("65000:666"), an origin ASN (last ASN of the AS path) or a next hop
+    to the prefixes having it, queries cost O(result) instead of a scan of the table. They are
+    built in the same pass as the snapshot and kept up to date by apply().
+
+    snapshot = RibSnapshot(gobgp.get_rib(raw=True))
+    snapshot.by_community("65000:666")
+    snapshot.by_origin(13335)
+
+    # Follow the table, GoBGP sends the current best paths first then every change
+    snapshot = RibSnapshot()
+    for destination in gobgp.monitor_rib(current=True):
+        snapshot.apply(destination)
+    """
+
+    def __init__(self, routes=(), indexes=INDEXES, ipv6=False):
+        """
+        routes: PyGoBGP route dicts (get_rib)
+        indexes: inverted indexes to maintain, any of COMMUNITY, ORIGIN and NEXT_HOP.
+            Queries on other keys scan the table.
+        ipv6: Destinations given to apply() are IPv6, used to decode their NLRI when
+            they have no prefix
+        """
+        for index in indexes:
+            if index not in INDEXES:
+                raise ValueError("Unknown index {}, expected one of {}".format(index, INDEXES))
+        self.ipv6 = ipv6
+        self.routes = {}
+        # index name -> key -> set of prefixes
+        self.indexes = {index: {} for index in indexes}
+        for route in routes:
+            self.add(route)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __iter__(self):
+        return iter(self.routes.values())
+
+    def __contains__(self, prefix):
+        return prefix in self.routes
+
+    def get(self, prefix):
+        """Route of prefix, None if missing"""
+        return self.routes.get(prefix)
+
+    def add(self, route):
+        """Add or replace the route of route["prefix"]"""
+        prefix = route["prefix"]
+        if prefix in self.routes:
+            self.remove(prefix)
+        self.routes[prefix] = route
+        for index, entries in self.indexes.items():
+            for key in _index_keys(index, route):
+                entries.setdefault(key, set()).add(prefix)
+
+    def remove(self, prefix):
+        """Remove the route of prefix, returns it (None if missing)"""
+        route = self.routes.pop(prefix, None)
+        if route is None:
+            return None
+        for index, entries in self.indexes.items():
+            for key in _index_keys(index, route):
+                prefixes = entries.get(key)
+                if prefixes is not None:
+                    prefixes.discard(prefix)
+                    if not prefixes:
+                        del entries[key]
+        return route
+
+    def apply(self, destination):
+        """
+            Apply a MonitorRib delta (gobgp.Destination)
+
+        The destination route is replaced by the first path which is not a withdrawal,
+        the route is removed if every path is withdrawn.
+        """
+        prefix = destination.prefix
+        for path in destination.paths:
+            if not prefix:
+                prefix = decode_nlri(path.nlri, ipv6=self.ipv6)
+            if not path.is_withdraw:
+                self.add(route_from_record(route_record(prefix, path.pattrs)))
+                return
+        if prefix:
+            self.remove(prefix)
+
+    def by_community(self, community):
+        """Routes tagged with community ("ASN:value")"""
+        return self._lookup(COMMUNITY, community)
+
+    def by_origin(self, asn):
+        """Routes originated by asn"""
+        return self._lookup(ORIGIN, asn)
+
+    def by_next_hop(self, next_hop):
+        """Routes whose next hop is next_hop"""
+        return self._lookup(NEXT_HOP, next_hop)
+
+    def filter_as_path(self, as_path_regex):
+        """Routes whose AS path matches a GoBGP AS path expression or pygobgp.aspath.AsPathMatcher"""
+        if not isinstance(as_path_regex, AsPathMatcher):
+            as_path_regex = AsPathMatcher(as_path_regex)
+        return as_path_regex.filter(self.routes.values())
+
+    def _lookup(self, index, key):
+        entries = self.indexes.get(index)
+        if entries is None:
+            return [route for route in self.routes.values() if key in _index_keys(index, route)]
+        return [self.routes[prefix] for prefix in entries.get(key, ())]
+
+    def __repr__(self):
+        return "<RibSnapshot routes={} indexes={}>".format(len(self.routes), sorted(self.indexes))
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+    Compact binary RIB tables, memory-mapped from disk
+
+A RIB table is one buffer: prefixes sorted by (network, length) per IP version, each pointing to
+an interned block of serialized path attributes (routes sharing attributes share the block) and
+to the closest prefix of the table covering it. Exact and longest prefix match lookups are binary
+searches over the buffer, nothing is loaded or decoded when a file is opened.
+
+gobgp.save_rib("rib.pgb")                  # from GetRib, attributes are not decoded
+rib = MappedRib("rib.pgb")                 # milliseconds, whatever the table size
+rib.follow(gobgp)                          # catch up with MonitorRib in a thread
+rib.lookup("8.8.8.8")
+
+Layout (big endian):
+    HEADER                 magic, timestamp, IPv4 entries, IPv6 entries, attribute blocks, blob size
+    ENTRY4 * IPv4 entries  network, length, attribute block, parent entry
+    ENTRY6 * IPv6 entries  network (2 x 64 bits), length, attribute block, parent entry
+    OFFSET * (blocks + 1)  start of each block in the blob, then the blob size
+    blob                   attribute blocks, each the path attributes of a route concatenated
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.address import format_prefix
+from pygobgp.address import parse_prefix
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import route_from_record
+from pygobgp.decoder import route_record
+from pygobgp.mrt import split_attributes
+
+MAGIC = b"PGBRIB01"
+HEADER = struct.Struct(">8sdLLLQ")
+ENTRY4 = struct.Struct(">LBLL")
+ENTRY6 = struct.Struct(">QQBLL")
+OFFSET = struct.Struct(">Q")
+NO_PARENT = 0xFFFFFFFF
+
+_MASK64 = (1 << 64) - 1
+
+
+class RibFileError(ValueError):
+    """Invalid RIB table"""
+    pass
+
+
+def _covers(network, length, other, bits):
+    """network/length covers other (an address or a longer network)"""
+    return (network ^ other) >> (bits - length) == 0 if length else True
+
+
+def destination_change(destination, ipv6=False):
+    """
+        (prefix, concatenated path attributes) of a MonitorRib delta (gobgp.Destination), attributes
+        are None when the prefix is withdrawn. See RibSnapshot.apply.
+    """
+    prefix = destination.prefix
+    for path in destination.paths:
+        if not prefix:
+            prefix = decode_nlri(path.nlri, ipv6=ipv6)
+        if not path.is_withdraw:
+            return prefix, b"".join(path.pattrs)
+    return prefix, None
+
+
+def build_rib_table(routes, timestamp=None):
+    """
+        Serialize routes into a RIB table (bytes)
+
+    routes: iterable of (prefix, pattrs), prefix as "10.0.0.0/8", pattrs the serialized path
+        attributes, either concatenated (bytes-like) or a list of them (GoBGP Path.pattrs).
+        The last route of a prefix wins.
+    timestamp: time the table was taken, now by default
+    """
+    by_key = {}
+    for prefix, pattrs in routes:
+        if not isinstance(pattrs, (bytes, bytearray, memoryview)):
+            pattrs = b"".join(bytes(attr) for attr in pattrs)
+        by_key[parse_prefix(prefix)] = bytes(pattrs)
+    return pack_rib_table(by_key, timestamp)
+
+
+def pack_rib_table(by_key, timestamp=None):
+    """
+        Serialize a RIB table from a dict (version, network, length) -> concatenated path attributes
+
+    See parse_prefix for keys and build_rib_table.
+    """
+    # Interned attribute blocks
+    blocks = {}
+    offsets = [0]
+    blob = []
+    entries = {4: [], 6: []}
+    for version, network, length in sorted(by_key):
+        pattrs = by_key[(version, network, length)]
+        block = blocks.get(pattrs)
+        if block is None:
+            block = blocks[pattrs] = len(blob)
+            blob.append(pattrs)
+            offsets.append(offsets[-1] + len(pattrs))
+        entries[version].append((network, length, block))
+
+    parts = [HEADER.pack(MAGIC, time.time() if timestamp is None else timestamp, len(entries[4]),
+                         len(entries[6]), len(blob), offsets[-1])]
+    for version, entry in ((4, ENTRY4), (6, ENTRY6)):
+        bits = 32 if version == 4 else 128
+        # Entries covering the current one, innermost last
+        stack = []
+        for index, (network, length, block) in enumerate(entries[version]):
+            while stack and not _covers(stack[-1][0], stack[-1][1], network, bits):
+                stack.pop()
+            parent = stack[-1][2] if stack else NO_PARENT
+            if version == 4:
+                parts.append(entry.pack(network, length, block, parent))
+            else:
+                parts.append(entry.pack(network >> 64, network & _MASK64, length, block, parent))
+            stack.append((network, length, index))
+    parts.extend(OFFSET.pack(offset) for offset in offsets)
+    parts.extend(blob)
+    return b"".join(parts)
+
+
+def write_rib_file(path, routes, timestamp=None):
+    """Write a RIB table file (see build_rib_table), atomically replacing path"""
+    data = build_rib_table(routes, timestamp)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return len(data)
+
+
+class RibTable:
+    """
+        Read-only view of a RIB table in a buffer (bytes, mmap, shared memory...)
+
+    Attribute blocks are returned as memoryviews over the buffer, route dicts are only built by
+    route(), lookup() and iteration.
+    """
+
+    def __init__(self, buf, offset=0):
+        self._view = memoryview(buf)
+        magic, self.timestamp, self.count4, self.count6, self.blocks, self.blob_size = \
+            HEADER.unpack_from(self._view, offset)
+        if magic != MAGIC:
+            raise RibFileError("Not a RIB table")
+        self._entries4 = offset + HEADER.size
+        self._entries6 = self._entries4 + self.count4 * ENTRY4.size
+        self._offsets = self._entries6 + self.count6 * ENTRY6.size
+        self._blob = self._offsets + (self.blocks + 1) * OFFSET.size
+        self.size = self._blob + self.blob_size - offset
+
+    def release(self):
+        """Release the buffer, the table cannot be used anymore"""
+        self._view.release()
+
+    def __len__(self):
+        return self.count4 + self.count6
+
+    def _entry(self, version, index):
+        """(network, length, block, parent) of an entry"""
+        if version == 4:
+            return ENTRY4.unpack_from(self._view, self._entries4 + index * ENTRY4.size)
+        high, low, length, block, parent = ENTRY6.unpack_from(self._view, self._entries6 + index * ENTRY6.size)
+        return high << 64 | low, length, block, parent
+
+    def _bisect(self, version, network, length):
+        """Index of the first entry greater than (network, length)"""
+        low, high = 0, self.count4 if version == 4 else self.count6
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(version, middle)
+            if (entry[0], entry[1]) <= (network, length):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def pattrs(self, block):
+        """Concatenated path attributes of an attribute block (memoryview)"""
+        start, end = struct.unpack_from(">QQ", self._view, self._offsets + block * OFFSET.size)
+        return self._view[self._blob + start:self._blob + end]
+
+    def find(self, version, network, length):
+        """Attribute block of a prefix, None if missing"""
+        index = self._bisect(version, network, length) - 1
+        if index >= 0:
+            entry = self._entry(version, index)
+            if entry[0] == network and entry[1] == length:
+                return entry[2]
+        return None
+
+    def covering(self, version, address, length=None):
+        """
+            Yield (network, length, block) of the entries covering address/length, longest first
+
+        length: full address length by default (longest prefix match of an address)
+        """
+        bits = 32 if version == 4 else 128
+        if length is None:
+            length = bits
+        index = self._bisect(version, address, length) - 1
+        while 0 <= index != NO_PARENT:
+            network, entry_length, block, parent = self._entry(version, index)
+            if entry_length <= length and _covers(network, entry_length, address, bits):
+                yield network, entry_length, block
+            index = parent
+
+    def get(self, prefix):
+        """Concatenated path attributes of prefix (memoryview), None if missing"""
+        block = self.find(*parse_prefix(prefix))
+        return None if block is None else self.pattrs(block)
+
+    def route(self, prefix):
+        """PyGoBGP route dict of prefix, None if missing"""
+        pattrs = self.get(prefix)
+        if pattrs is None:
+            return None
+        version, network, length = parse_prefix(prefix)
+        return route_from_pattrs(format_prefix(version, network, length), pattrs)
+
+    def lookup(self, address):
+        """Route of the longest prefix matching address ("8.8.8.8" or "10.1.0.0/16"), None if none"""
+        version, network, length = parse_prefix(address)
+        for network, length, block in self.covering(version, network, length):
+            return route_from_pattrs(format_prefix(version, network, length), self.pattrs(block))
+        return None
+
+    def items(self):
+        """Yield (version, network, length, pattrs) of every entry, in prefix order"""
+        for version, count in ((4, self.count4), (6, self.count6)):
+            for index in range(count):
+                network, length, block, _ = self._entry(version, index)
+                yield version, network, length, self.pattrs(block)
+
+    def __iter__(self):
+        for version, network, length, pattrs in self.items():
+            yield route_from_pattrs(format_prefix(version, network, length), pattrs)
+
+    def __repr__(self):
+        return "<RibTable ipv4={} ipv6={} attribute_blocks={} size={}>".format(
+            self.count4, self.count6, self.blocks, self.size)
+
+
+def route_from_pattrs(prefix, pattrs):
+    """PyGoBGP route dict from concatenated path attributes"""
+    return route_from_record(route_record(prefix, split_attributes(pattrs)))
+
+
+class MappedRib:
+    """
+        RIB table file opened with mmap, plus the changes received since it was written
+
+    Changes (apply, follow) are kept in an overlay consulted before the file, save() writes the
+    merged table. Lookups are answered from the file right away, follow() then brings the table
+    up to date, including the routes which changed or were withdrawn while nothing was following
+    GoBGP (e.g. during a restart).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.table = RibTable(self._mmap)
+        # (version, network, length) -> concatenated path attributes, None when withdrawn
+        self.overlay = {}
+        # version -> prefix lengths in the overlay
+        self._overlay_lengths = {4: set(), 6: set()}
+        self._lock = threading.Lock()
+        self._stream = None
+        # Set once follow() received the current table of every family
+        self.synced = threading.Event()
+        self._unsynced = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.stop()
+        if self._mmap is not None:
+            self.table.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Attribute memoryviews still referenced, the mapping goes away with them
+                pass
+            self._mmap = None
+            self._file.close()
+
+    @property
+    def timestamp(self):
+        return self.table.timestamp
+
+    def apply(self, destination, ipv6=False):
+        """Apply a MonitorRib delta (gobgp.Destination), see RibSnapshot.apply"""
+        prefix, pattrs = destination_change(destination, ipv6)
+        if prefix:
+            self.update(prefix, pattrs)
+
+    def update(self, prefix, pattrs):
+        """Set the concatenated path attributes of prefix, None to withdraw it"""
+        self._update(parse_prefix(prefix), pattrs)
+
+    def _update(self, key, pattrs):
+        with self._lock:
+            self.overlay[key] = pattrs
+            self._overlay_lengths[key[0]].add(key[2])
+
+    def follow(self, client, families=(IPV4_UNICAST, IPV6_UNICAST), **kwargs):
+        """
+            Apply the MonitorRib stream of client (PyGoBGP) in background threads until stop()
+
+        GoBGP first sends its current table: every route is applied again and, once as many
+        prefixes as GetRibInfo counted were received, the prefixes of the file (or of earlier
+        changes) GoBGP did not send are withdrawn. self.synced is set when this is done for
+        every family. Changes made to the table between GetRibInfo and MonitorRib are corrected
+        by the changes which follow.
+
+        kwargs: resource and name, see PyGoBGP.monitor_rib
+        """
+        self._stream = []
+        self.synced.clear()
+        self._unsynced = len(families)
+        for family in families:
+            expected = client.get_rib_info(family=family, **kwargs).num_destination
+            stream = client.monitor_rib(family=family, current=True, **kwargs)
+            self._stream.append(stream)
+            thread = threading.Thread(target=self._follow, args=(stream, family, expected), daemon=True)
+            thread.start()
+
+    def _follow(self, stream, family, expected):
+        ipv6 = family == IPV6_UNICAST
+        version = 6 if ipv6 else 4
+        # Prefixes of the current table received so far, None once synced
+        received = set()
+        try:
+            if not expected:
+                received = self._synced(version, received)
+            for destination in stream:
+                prefix, pattrs = destination_change(destination, ipv6)
+                if not prefix:
+                    continue
+                key = parse_prefix(prefix)
+                self._update(key, pattrs)
+                if received is not None:
+                    received.add(key)
+                    if len(received) >= expected:
+                        received = self._synced(version, received)
+        except Exception:
+            # Cancelled by stop()
+            if self._stream is not None:
+                raise
+
+    def _synced(self, version, received):
+        """Withdraw the prefixes of an IP version missing from the current table received"""
+        stale = [(entry_version, network, length) for entry_version, network, length, _ in self.items()
+                 if entry_version == version and (entry_version, network, length) not in received]
+        for key in stale:
+            self._update(key, None)
+        with self._lock:
+            self._unsynced -= 1
+            if not self._unsynced:
+                self.synced.set()
+        return None
+
+    def stop(self):
+        streams, self._stream = self._stream, None
+        for stream in streams or ():
+            stream.cancel()
+
+    def get(self, prefix):
+        """Concatenated path attributes of prefix, None if missing"""
+        key = parse_prefix(prefix)
+        if key in self.overlay:
+            return self.overlay[key]
+        return self.table.get(prefix)
+
+    def route(self, prefix):
+        """PyGoBGP route dict of prefix, None if missing"""
+        pattrs = self.get(prefix)
+        if pattrs is None:
+            return None
+        return route_from_pattrs(format_prefix(*parse_prefix(prefix)), pattrs)
+
+    def lookup(self, address):
+        """Route of the longest prefix matching address, None if none"""
+        version, network, length = parse_prefix(address)
+        bits = 32 if version == 4 else 128
+        overlay = self.overlay
+        best = None
+        # Longest table entry neither withdrawn nor replaced since
+        for entry_network, entry_length, block in self.table.covering(version, network, length):
+            if (version, entry_network, entry_length) not in overlay:
+                best = (entry_length, entry_network, self.table.pattrs(block))
+                break
+        for overlay_length in sorted(self._overlay_lengths[version], reverse=True):
+            if overlay_length > length or (best is not None and overlay_length <= best[0]):
+                continue
+            overlay_network = network >> (bits - overlay_length) << (bits - overlay_length)
+            pattrs = overlay.get((version, overlay_network, overlay_length))
+            if pattrs is not None:
+                best = (overlay_length, overlay_network, pattrs)
+                break
+        if best is None:
+            return None
+        return route_from_pattrs(format_prefix(version, best[1], best[0]), best[2])
+
+    def items(self):
+        """Yield (version, network, length, pattrs) of the merged table"""
+        overlay = dict(self.overlay)
+        for version, network, length, pattrs in self.table.items():
+            key = (version, network, length)
+            if key in overlay:
+                pattrs = overlay.pop(key)
+                if pattrs is None:
+                    continue
+            yield version, network, length, pattrs
+        for (version, network, length), pattrs in overlay.items():
+            if pattrs is not None:
+                yield version, network, length, pattrs
+
+    def __iter__(self):
+        for version, network, length, pattrs in self.items():
+            yield route_from_pattrs(format_prefix(version, network, length), pattrs)
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def save(self, path=None):
+        """Write the merged table, to the file it was opened from by default, returns the size written"""
+        routes = ((format_prefix(version, network, length), pattrs)
+                  for version, network, length, pattrs in self.items())
+        return write_rib_file(path or self.path, routes)
+
+    def __repr__(self):
+        return "<MappedRib {} table={} overlay={}>".format(self.path, self.table, len(self.overlay))
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+    Route origin validation (RFC 6811) against the ROAs known to GoBGP
+"""
+import ipaddress
+import threading
+
+import pygobgp.gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.address import parse_prefix
+
+# Validation states, as in gobgp.RPKIValidation.State
+NOT_FOUND = gobgp.RPKIValidation.STATE_NOT_FOUND
+VALID = gobgp.RPKIValidation.STATE_VALID
+INVALID = gobgp.RPKIValidation.STATE_INVALID
+
+STATE_NAMES = {NOT_FOUND: "not-found", VALID: "valid", INVALID: "invalid"}
+
+# IPv4 and IPv6 unicast, the families ROAs are fetched for
+ROA_FAMILIES = (IPV4_UNICAST, IPV6_UNICAST)
+
+
+def roa_key(roa):
+    """
+        Hashable (asn, prefix, maxlen) of a ROA
+
+    roa: gobgp.Roa, or (asn, "10.0.0.0/8", maxlen) tuple
+    """
+    if isinstance(roa, gobgp.Roa):
+        # "as" is a Python keyword
+        prefix = ipaddress.ip_network("{}/{}".format(roa.prefix, roa.prefixlen))
+        return getattr(roa, "as"), str(prefix), roa.maxlen
+    asn, prefix, maxlen = roa
+    return asn, str(ipaddress.ip_network(prefix)), maxlen
+
+
+class RoaTable:
+    """
+        ROAs indexed by prefix for route origin validation
+
+    ROAs are grouped by IP version and prefix length, the ROAs covering a route are found with one
+    dict lookup per distinct ROA prefix length (at most 24 for IPv4 in practice). Verdicts are cached
+    per (prefix, origin ASN) until the table changes, so validating the same table again after a
+    refresh that changed nothing is a cache lookup per route.
+
+    roas = RoaTable.from_gobgp(gobgp)
+    states = roas.validate(gobgp.get_rib())
+    """
+
+    def __init__(self, roas=()):
+        """roas: gobgp.Roa objects or (asn, prefix, maxlen) tuples"""
+        self.roas = set()
+        # (version, prefix length) -> {network >> (bits - prefix length): set of (asn, maxlen)}
+        self._index = {}
+        # version -> sorted prefix lengths present in the index
+        self._lengths = {4: [], 6: []}
+        self._cache = {}
+        self.generation = 0
+        self.update(added=roas)
+
+    @classmethod
+    def from_gobgp(cls, client, families=ROA_FAMILIES):
+        """RoaTable of the ROAs received by GoBGP from its RPKI servers (client: PyGoBGP)"""
+        roas = []
+        for family in families:
+            roas.extend(client.get_roas(family=family))
+        return cls(roas)
+
+    def __len__(self):
+        return len(self.roas)
+
+    def __contains__(self, roa):
+        return roa_key(roa) in self.roas
+
+    def update(self, added=(), removed=()):
+        """
+            Add and remove ROAs
+
+        Returns the number of ROAs actually added or removed. If any, the generation is
+        increased and cached verdicts are dropped.
+        """
+        changed = 0
+        for roa in removed:
+            key = roa_key(roa)
+            if key in self.roas:
+                self.roas.discard(key)
+                self._unindex(key)
+                changed += 1
+        for roa in added:
+            key = roa_key(roa)
+            if key not in self.roas:
+                self.roas.add(key)
+                self._index_roa(key)
+                changed += 1
+        if changed:
+            self.generation += 1
+            self._cache = {}
+        return changed
+
+    def add(self, roa):
+        return self.update(added=(roa,))
+
+    def remove(self, roa):
+        return self.update(removed=(roa,))
+
+    def _index_roa(self, key):
+        asn, prefix, maxlen = key
+        version, value, length = parse_prefix(prefix)
+        bits = 32 if version == 4 else 128
+        by_network = self._index.get((version, length))
+        if by_network is None:
+            by_network = self._index[(version, length)] = {}
+            self._lengths[version] = sorted(self._lengths[version] + [length])
+        by_network.setdefault(value >> (bits - length), set()).add((asn, maxlen))
+
+    def _unindex(self, key):
+        asn, prefix, maxlen = key
+        version, value, length = parse_prefix(prefix)
+        bits = 32 if version == 4 else 128
+        by_network = self._index[(version, length)]
+        network = value >> (bits - length)
+        entries = by_network[network]
+        entries.discard((asn, maxlen))
+        if not entries:
+            del by_network[network]
+            if not by_network:
+                del self._index[(version, length)]
+                self._lengths[version] = [other for other in self._lengths[version] if other != length]
+
+    def covering(self, prefix):
+        """(asn, ROA prefix, maxlen) of the ROAs covering prefix"""
+        version, value, length = parse_prefix(prefix)
+        bits = 32 if version == 4 else 128
+        roas = []
+        for roa_length in self._lengths[version]:
+            if roa_length > length:
+                break
+            network = value >> (bits - roa_length)
+            for asn, maxlen in self._index[(version, roa_length)].get(network, ()):
+                address = ipaddress.ip_address(network << (bits - roa_length))
+                roas.append((asn, "{}/{}".format(address, roa_length), maxlen))
+        return roas
+
+    def validate_prefix(self, prefix, origin):
+        """
+            Validation state of a route
+
+        origin: origin ASN (last ASN of the AS path), None for locally originated routes,
+            which can only be NOT_FOUND or INVALID
+        """
+        key = (prefix, origin)
+        state = self._cache.get(key)
+        if state is not None:
+            return state
+
+        version, value, length = parse_prefix(prefix)
+        bits = 32 if version == 4 else 128
+        state = NOT_FOUND
+        for roa_length in self._lengths[version]:
+            if roa_length > length:
+                break
+            entries = self._index[(version, roa_length)].get(value >> (bits - roa_length))
+            if entries is None:
+                continue
+            state = INVALID
+            for asn, maxlen in entries:
+                # AS 0 ROAs never match as no route originates from AS 0
+                if asn == origin and asn != 0 and length <= maxlen:
+                    state = VALID
+                    break
+            if state == VALID:
+                break
+
+        self._cache[key] = state
+        return state
+
+    def validate(self, routes, annotate=False):
+        """
+            Validation states (NOT_FOUND, VALID or INVALID) of PyGoBGP route dicts, in order
+
+        annotate: Also store the state in route["validation"], used by rpki_result conditions
+            of pygobgp.simulator.PolicySimulator
+        """
+        states = []
+        validate_prefix = self.validate_prefix
+        for route in routes:
+            as_path = route.get("as_path")
+            state = validate_prefix(route["prefix"], as_path[-1] if as_path else None)
+            if annotate:
+                route["validation"] = state
+            states.append(state)
+        return states
+
+    def __repr__(self):
+        return "<RoaTable roas={} generation={}>".format(len(self.roas), self.generation)
+
+
+class RpkiUpdate:
+    """
+        Outcome of RpkiMonitor.poll
+
+    serials: RPKI server address -> serial
+    added, removed: sets of (asn, prefix, maxlen) ROAs
+    revalidated: route prefixes ValidateRib was called for, "" for a whole table
+    """
+
+    def __init__(self, serials):
+        self.serials = serials
+        self.added = set()
+        self.removed = set()
+        self.revalidated = []
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed)
+
+    def __repr__(self):
+        return "<RpkiUpdate serials={} added={} removed={} revalidated={}>".format(
+            self.serials, len(self.added), len(self.removed), len(self.revalidated))
+
+
+class RpkiMonitor:
+    """
+        Follow the RPKI servers of GoBGP and keep a RoaTable in sync
+
+    GetRpki is cheap, ROAs are only fetched (GetRoa) when a server serial changed. The new ROA set
+    is compared with the table, only the ROAs added or removed are applied to it, and GoBGP is asked
+    to revalidate (ValidateRib) the routes covered by those ROAs instead of its whole RIB.
+
+    monitor = RpkiMonitor(gobgp)
+    monitor.run(callback=print)      # every 60 seconds, until monitor.stop()
+    """
+
+    def __init__(self, client, table=None, families=ROA_FAMILIES, interval=60, max_targeted=1000,
+                 revalidate=True):
+        """
+        client: PyGoBGP instance
+        table: RoaTable to keep in sync, built from GoBGP on first poll if None
+        families: Address families of the ROAs
+        interval: Seconds between polls in run()
+        max_targeted: Revalidate whole tables when more ROA prefixes than this changed in a poll, or the
+            changed ROAs of a family cover more routes than this
+        revalidate: Call ValidateRib for the routes covered by changed ROAs
+        """
+        self.client = client
+        self.table = table
+        self.families = families
+        self.interval = interval
+        self.max_targeted = max_targeted
+        self.revalidate = revalidate
+        self.serials = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        """Check server serials and apply ROA changes, returns RpkiUpdate"""
+        servers = self.client.get_rpki(family=self.families[0])
+        serials = {server.conf.address: server.state.serial for server in servers}
+        update = RpkiUpdate(serials)
+        if serials == self.serials and self.table is not None:
+            return update
+
+        roas = set()
+        for family in self.families:
+            roas.update(roa_key(roa) for roa in self.client.get_roas(family=family))
+        self.serials = serials
+
+        if self.table is None:
+            # GoBGP validated its RIB against these ROAs already
+            self.table = RoaTable(roas)
+            return update
+
+        update.added = roas - self.table.roas
+        update.removed = self.table.roas - roas
+        self.table.update(added=update.added, removed=update.removed)
+        if self.revalidate and update.changed:
+            update.revalidated = self._revalidate(update.added | update.removed)
+        return update
+
+    def _revalidate(self, roas):
+        """
+            ValidateRib for every route covered by roas, or whole tables if there are too many of them
+
+        Covered routes are looked up with LOOKUP_LONGER on the ROA prefixes, routes longer than the
+        maxlen of a ROA are revalidated too: a ROA makes them invalid rather than not found.
+        """
+        by_family = {}
+        for _, prefix, _ in roas:
+            by_family.setdefault(IPV6_UNICAST if ":" in prefix else IPV4_UNICAST, set()).add(prefix)
+        if sum(len(prefixes) for prefixes in by_family.values()) > self.max_targeted:
+            for family in self.families:
+                self.client.validate_rib(family=family)
+            return [""]
+
+        targets = {}
+        for family, prefixes in sorted(by_family.items()):
+            covered = set()
+            for route in self.client.iter_paths(prefixes=sorted(prefixes), lookup=gobgp.LOOKUP_LONGER,
+                                                family=family):
+                covered.add(route["prefix"])
+                if len(covered) > self.max_targeted:
+                    covered = None
+                    break
+            targets[family] = covered
+
+        revalidated = []
+        for family, covered in sorted(targets.items()):
+            if covered is None:
+                self.client.validate_rib(family=family)
+                revalidated.append("")
+                continue
+            for prefix in sorted(covered):
+                self.client.validate_rib(prefix=prefix, family=family)
+            revalidated.extend(sorted(covered))
+        return revalidated
+
+    def run(self, callback=None):
+        """
+            Poll every interval seconds until stop() is called
+
+        callback: called with the RpkiUpdate of every poll which changed the ROAs
+        """
+        self._stop.clear()
+        while not self._stop.is_set():
+            update = self.poll()
+            if callback is not None and update.changed:
+                callback(update)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+    RIB shared by many processes through memory-mapped files in /dev/shm
+
+One writer process keeps the table (GetRib, then MonitorRib) and publishes it as pygobgp.ribfile
+tables: a base table, rebuilt when enough changes piled up, and a small delta table of the changes
+since, republished every interval. Tables are written to new files which are never modified, a
+control file names the current ones. Readers map them and do lookups on the mappings, nothing is
+copied or decoded per process beyond the routes asked for.
+
+The control file is a seqlock: the writer makes the sequence odd, updates the generations, then
+makes it even again; readers retry until they read the same even sequence before and after. Old
+tables are unlinked once replaced, processes still mapping them keep a valid mapping.
+
+# Updater process
+spawn_writer("10.0.255.2")
+
+# gunicorn workers
+rib = SharedRib()
+rib.lookup("8.8.8.8")
+"""
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.address import format_prefix
+from pygobgp.address import parse_prefix
+from pygobgp.ribfile import RibTable
+from pygobgp.ribfile import destination_change
+from pygobgp.ribfile import pack_rib_table
+from pygobgp.ribfile import route_from_pattrs
+
+DEFAULT_DIRECTORY = "/dev/shm"
+DEFAULT_NAME = "pygobgp-rib"
+
+CONTROL_MAGIC = b"PGBSHM01"
+# Magic, sequence, base generation, delta generation (0 for none), publication time
+CONTROL = struct.Struct(">8sQQQd")
+_SEQUENCE = struct.Struct(">Q")
+_SEQUENCE_OFFSET = 8
+_GENERATIONS = struct.Struct(">QQd")
+_GENERATIONS_OFFSET = 16
+
+
+class SharedRibError(RuntimeError):
+    """No shared RIB published"""
+    pass
+
+
+def _control_path(directory, name):
+    return os.path.join(directory, "{}.ctl".format(name))
+
+
+def _table_path(directory, name, generation):
+    return os.path.join(directory, "{}.{}".format(name, generation))
+
+
+def _map(path, write=False):
+    with open(path, "r+b" if write else "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+
+
+class _MappedTable:
+    """RibTable over a read-only mapping of a table file"""
+
+    def __init__(self, path):
+        self._mmap = _map(path)
+        self.table = RibTable(self._mmap)
+
+    def close(self):
+        self.table.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Attribute memoryviews still referenced, the mapping goes away with them
+            pass
+
+
+class SharedRibWriter:
+    """
+        Maintain the shared RIB from GoBGP
+
+    writer = SharedRibWriter(gobgp)
+    writer.run()                   # blocks until stop()
+    """
+
+    def __init__(self, client, name=DEFAULT_NAME, directory=DEFAULT_DIRECTORY,
+                 families=(IPV4_UNICAST, IPV6_UNICAST), interval=1.0, max_delta=100000, **kwargs):
+        """
+        client: PyGoBGP instance
+        name, directory: Files are directory/name.ctl and directory/name.<generation>
+        families: Address families shared
+        interval: Seconds between publications of the changes
+        max_delta: Rebuild the base table when the delta holds more prefixes than this
+        kwargs: resource and name of the table, see PyGoBGP.iter_rib_attributes
+        """
+        self.client = client
+        self.name = name
+        self.directory = directory
+        self.families = families
+        self.interval = interval
+        self.max_delta = max_delta
+        self.table_kwargs = kwargs
+        # (version, network, length) -> concatenated path attributes
+        self.table = {}
+        # Changes since the base table, b"" for withdrawals
+        self.delta = {}
+        # Changes received since the last publication, None for withdrawals
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._streams = None
+        self._stop = threading.Event()
+        self._generation = 0
+        self._base = 0
+        self._published = 0
+        self._control = None
+        self.publications = 0
+
+    def _open_control(self):
+        path = _control_path(self.directory, self.name)
+        if os.path.exists(path):
+            control = _map(path, write=True)
+            magic, sequence, base, delta, _ = CONTROL.unpack_from(control, 0)
+            if magic == CONTROL_MAGIC:
+                # Generations keep increasing across writer restarts
+                self._generation = max(base, delta)
+                self._base, self._published = base, delta
+                return control
+            control.close()
+        with open(path + ".tmp", "wb") as f:
+            f.write(CONTROL.pack(CONTROL_MAGIC, 0, 0, 0, 0.0).ljust(mmap.PAGESIZE, b"\x00"))
+        os.replace(path + ".tmp", path)
+        return _map(path, write=True)
+
+    def _write_table(self, by_key):
+        self._generation += 1
+        path = _table_path(self.directory, self.name, self._generation)
+        with open(path + ".tmp", "wb") as f:
+            f.write(pack_rib_table(by_key))
+        os.replace(path + ".tmp", path)
+        return self._generation
+
+    def _publish(self, base, delta):
+        """Point the control file to new tables (seqlock), then unlink the replaced ones"""
+        control = self._control
+        sequence, = _SEQUENCE.unpack_from(control, _SEQUENCE_OFFSET)
+        _SEQUENCE.pack_into(control, _SEQUENCE_OFFSET, sequence + 1)
+        _GENERATIONS.pack_into(control, _GENERATIONS_OFFSET, base, delta, time.time())
+        _SEQUENCE.pack_into(control, _SEQUENCE_OFFSET, sequence + 2)
+        for generation in set((self._base, self._published)) - set((base, delta, 0)):
+            try:
+                os.remove(_table_path(self.directory, self.name, generation))
+            except FileNotFoundError:
+                pass
+        self._base, self._published = base, delta
+        self.publications += 1
+
+    def load(self):
+        """Fetch the tables from GoBGP (GetRib, not decoded) and publish them as base table"""
+        if self._control is None:
+            self._control = self._open_control()
+        self.table = {}
+        for family in self.families:
+            for prefix, pattrs in self.client.iter_rib_attributes(family=family, **self.table_kwargs):
+                self.table[parse_prefix(prefix)] = pattrs
+        self.delta = {}
+        self._publish(self._write_table(self.table), 0)
+
+    def apply(self, destination, ipv6=False):
+        """Queue a MonitorRib delta (gobgp.Destination) for the next publication"""
+        prefix, pattrs = destination_change(destination, ipv6)
+        if prefix:
+            with self._lock:
+                self._pending[parse_prefix(prefix)] = pattrs
+
+    def publish(self):
+        """Publish the queued changes, returns the number of prefixes which changed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        for key, pattrs in pending.items():
+            if pattrs is None:
+                self.table.pop(key, None)
+                self.delta[key] = b""
+            else:
+                self.table[key] = pattrs
+                self.delta[key] = pattrs
+        if len(self.delta) > self.max_delta:
+            self.delta = {}
+            self._publish(self._write_table(self.table), 0)
+        else:
+            self._publish(self._base, self._write_table(self.delta))
+        return len(pending)
+
+    def run(self):
+        """Load the tables, then follow MonitorRib and publish changes every interval until stop()"""
+        self._stop.clear()
+        self._streams = []
+        # Subscribe before the full fetch so that no change is missed in between
+        for family in self.families:
+            stream = self.client.monitor_rib(family=family, current=False, **self.table_kwargs)
+            self._streams.append(stream)
+            thread = threading.Thread(target=self._follow, args=(stream, family == IPV6_UNICAST), daemon=True)
+            thread.start()
+        self.load()
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def _follow(self, stream, ipv6):
+        try:
+            for destination in stream:
+                self.apply(destination, ipv6=ipv6)
+        except Exception:
+            # Cancelled by stop()
+            if self._streams is not None:
+                raise
+
+    def stop(self):
+        self._stop.set()
+        streams, self._streams = self._streams, None
+        for stream in streams or ():
+            stream.cancel()
+
+    def close(self):
+        """Stop, and remove the shared files"""
+        self.stop()
+        for generation in set((self._base, self._published)) - set((0,)):
+            try:
+                os.remove(_table_path(self.directory, self.name, generation))
+            except FileNotFoundError:
+                pass
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+            os.remove(_control_path(self.directory, self.name))
+
+    def __repr__(self):
+        return "<SharedRibWriter {} routes={} delta={} publications={}>".format(
+            self.name, len(self.table), len(self.delta), self.publications)
+
+
+def _writer_main(address, port, kwargs):
+    from pygobgp.pygobgp import PyGoBGP
+    client = PyGoBGP(address, port=port, max_receive_message_length=-1)
+    SharedRibWriter(client, **kwargs).run()
+
+
+def spawn_writer(address, port=50051, **kwargs):
+    """
+        Start a SharedRibWriter in a new process (spawned, gRPC does not support fork)
+
+    kwargs: see SharedRibWriter. Returns the multiprocessing.Process, terminate() it to stop.
+    """
+    process = multiprocessing.get_context("spawn").Process(target=_writer_main, args=(address, port, kwargs),
+                                                           daemon=True)
+    process.start()
+    return process
+
+
+class SharedRib:
+    """
+        Read-only access to the shared RIB
+
+    Every call first checks the control file (one read) and maps the new tables if the writer
+    published some. Attribute lookups (get, lookup_pattrs) return memoryviews over the mappings.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, directory=DEFAULT_DIRECTORY, retries=100):
+        self.name = name
+        self.directory = directory
+        self.retries = retries
+        self._control = None
+        self._sequence = None
+        self._generations = (0, 0)
+        self.published = None
+        self._base = None
+        self._delta = None
+
+    def close(self):
+        for mapped in (self._base, self._delta):
+            if mapped is not None:
+                mapped.close()
+        self._base = self._delta = None
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_control(self):
+        """(sequence, base, delta, published) read consistently, retried while the writer updates it"""
+        if self._control is None:
+            try:
+                self._control = _map(_control_path(self.directory, self.name))
+            except FileNotFoundError:
+                raise SharedRibError("No shared RIB {} in {}".format(self.name, self.directory))
+        for _ in range(self.retries):
+            magic, sequence, base, delta, published = CONTROL.unpack_from(self._control, 0)
+            if sequence & 1 == 0 and _SEQUENCE.unpack_from(self._control, _SEQUENCE_OFFSET)[0] == sequence:
+                if magic != CONTROL_MAGIC or not base:
+                    raise SharedRibError("No shared RIB {} in {}".format(self.name, self.directory))
+                return sequence, base, delta, published
+            time.sleep(0)
+        raise SharedRibError("Shared RIB control file kept changing")
+
+    def refresh(self):
+        """Map the current tables if they changed, returns True if they did"""
+        sequence, base, delta, published = self._read_control()
+        if sequence == self._sequence:
+            return False
+        for _ in range(self.retries):
+            new_base = new_delta = None
+            try:
+                new_base = self._base if base == self._generations[0] else \
+                    _MappedTable(_table_path(self.directory, self.name, base))
+                if delta:
+                    new_delta = _MappedTable(_table_path(self.directory, self.name, delta))
+                break
+            except FileNotFoundError:
+                # Replaced meanwhile, drop the base mapped for this attempt
+                if new_base is not None and new_base is not self._base:
+                    new_base.close()
+                sequence, base, delta, published = self._read_control()
+        else:
+            raise SharedRibError("Shared RIB tables kept changing")
+
+        if new_base is not self._base and self._base is not None:
+            self._base.close()
+        if self._delta is not None:
+            self._delta.close()
+        self._base, self._delta = new_base, new_delta
+        self._sequence = sequence
+        self._generations = (base, delta)
+        self.published = published
+        return True
+
+    def _tables(self):
+        self.refresh()
+        return self._base.table, self._delta.table if self._delta is not None else None
+
+    def get(self, prefix):
+        """Concatenated path attributes of prefix (memoryview), None if missing"""
+        base, delta = self._tables()
+        key = parse_prefix(prefix)
+        if delta is not None:
+            block = delta.find(*key)
+            if block is not None:
+                pattrs = delta.pattrs(block)
+                return pattrs if len(pattrs) else None
+        block = base.find(*key)
+        return None if block is None else base.pattrs(block)
+
+    def route(self, prefix):
+        """PyGoBGP route dict of prefix, None if missing"""
+        pattrs = self.get(prefix)
+        if pattrs is None:
+            return None
+        return route_from_pattrs(format_prefix(*parse_prefix(prefix)), pattrs)
+
+    def lookup_pattrs(self, address):
+        """(prefix, concatenated path attributes) of the longest prefix matching address, None if none"""
+        base, delta = self._tables()
+        version, network, length = parse_prefix(address)
+        best = None
+        for entry_network, entry_length, block in base.covering(version, network, length):
+            # Skip prefixes changed since the base table, the delta has them
+            if delta is None or delta.find(version, entry_network, entry_length) is None:
+                best = (entry_length, entry_network, base.pattrs(block))
+                break
+        if delta is not None:
+            for entry_network, entry_length, block in delta.covering(version, network, length):
+                if best is not None and entry_length <= best[0]:
+                    break
+                pattrs = delta.pattrs(block)
+                if len(pattrs):
+                    best = (entry_length, entry_network, pattrs)
+                    break
+        if best is None:
+            return None
+        return format_prefix(version, best[1], best[0]), best[2]
+
+    def lookup(self, address):
+        """Route of the longest prefix matching address ("8.8.8.8" or "10.1.0.0/16"), None if none"""
+        found = self.lookup_pattrs(address)
+        return None if found is None else route_from_pattrs(*found)
+
+    def __repr__(self):
+        return "<SharedRib {} generations={} published={}>".format(self.name, self._generations, self.published)
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+    Offline evaluation of GoBGP routing policies
+
+Policies and defined sets are read once from GoBGP (or given as gobgp_pb2 objects), compiled into
+matcher functions and run over PyGoBGP route dicts (get_rib, iter_paths), so the effect of a policy
+change can be checked before AddPolicy/ReplacePolicy pushes it.
+
+Supported conditions: prefix_set, neighbor_set, as_path_set, community_set, as_path_length, rpki_result
+Supported actions: route_action, community, med, as_prepend, nexthop, local_pref
+"""
+import ipaddress
+import re
+
+import pygobgp.gobgp_pb2 as gobgp
+from pygobgp.address import parse_prefix
+from pygobgp.aspath import AsPathMatcher
+
+ACCEPT = gobgp.ACCEPT
+REJECT = gobgp.REJECT
+NONE = gobgp.NONE
+
+# Defined set types the simulator can evaluate
+DEFINED_TYPES = (gobgp.PREFIX, gobgp.NEIGHBOR, gobgp.AS_PATH, gobgp.COMMUNITY)
+
+# Well known communities accepted by GoBGP community sets
+WELL_KNOWN_COMMUNITIES = {
+    "no-export": "65535:65281",
+    "no-advertise": "65535:65282",
+    "no-export-subconfed": "65535:65283",
+    "no-peer": "65535:65284",
+}
+
+_COMMUNITY = re.compile(r"^(\d+):(\d+)$")
+
+
+class SimulationResult:
+    """
+        Outcome of PolicySimulator.run
+
+    accepted: routes accepted, with the policy actions applied
+    rejected: routes rejected, as given
+    modified: number of accepted routes changed by an action
+    """
+
+    def __init__(self):
+        self.accepted = []
+        self.rejected = []
+        self.modified = 0
+
+    def __repr__(self):
+        return "<SimulationResult accepted={} rejected={} modified={}>".format(
+            len(self.accepted), len(self.rejected), self.modified)
+
+
+class PrefixIndex:
+    """
+        Prefix set compiled for fast lookups
+
+    Entries are grouped by IP version and route length: for a route of length L, only the entries
+    whose mask length range contains L are checked, one set lookup per distinct entry prefix length.
+    """
+
+    def __init__(self, prefixes):
+        """prefixes: gobgp.Prefix objects of a DefinedSet"""
+        # (version, route length) -> {entry prefix length: set of entry networks >> (bits - length)}
+        index = {}
+        for prefix in prefixes:
+            network = ipaddress.ip_network(prefix.ip_prefix)
+            low, high = prefix.mask_length_min, prefix.mask_length_max
+            if not low and not high:
+                low = high = network.prefixlen
+            value = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+            for length in range(low, high + 1):
+                by_length = index.setdefault((network.version, length), {})
+                by_length.setdefault(network.prefixlen, set()).add(value)
+
+        # (version, route length) -> list of (shift, networks)
+        self.index = {}
+        for (version, length), by_length in index.items():
+            self.index[(version, length)] = [(length - prefix_length, values)
+                                             for prefix_length, values in sorted(by_length.items())]
+
+    def match(self, key):
+        """True if the route parsed by parse_prefix into key matches an entry"""
+        version, value, length = key
+        bits = 32 if version == 4 else 128
+        value >>= bits - length
+        for shift, values in self.index.get((version, length), ()):
+            if value >> shift in values:
+                return True
+        return False
+
+
+class PolicySimulator:
+    """
+        Evaluate GoBGP policies over routes without applying them
+
+    gobgp = PyGoBGP(address="10.0.255.2")
+    simulator = PolicySimulator.from_gobgp(gobgp)
+    result = simulator.run(gobgp.get_rib(), ["import-customers"])
+
+    Routes are PyGoBGP route dicts. Besides the get_rib keys, conditions use "neighbor" (as set by
+    iter_paths) for neighbor sets and "validation" (RPKIValidation.State) for rpki_result, actions
+    may set "local_pref". Evaluation follows GoBGP: policies and their statements are evaluated in
+    order, the actions of every matching statement are applied and the first ACCEPT or REJECT
+    route action is final. Routes reaching the end get the default action.
+    """
+
+    def __init__(self, policies, defined_sets=(), next_hop_self=None):
+        """
+        policies: gobgp.Policy objects
+        defined_sets: gobgp.DefinedSet objects referenced by the policies
+        next_hop_self: Address used for the next hop "self" action, "self" is kept otherwise
+        """
+        self.next_hop_self = next_hop_self
+        self.sets = {}
+        for defined_set in defined_sets:
+            self.sets[(defined_set.type, defined_set.name)] = defined_set
+
+        self._compiled_sets = {}
+        self.policies = {}
+        for policy in policies:
+            self.policies[policy.name] = [self._compile_statement(statement) for statement in policy.statements]
+
+    @classmethod
+    def from_gobgp(cls, client, next_hop_self=None):
+        """PolicySimulator for every policy and defined set configured on GoBGP (client: PyGoBGP)"""
+        defined_sets = []
+        for defined_type in DEFINED_TYPES:
+            defined_sets.extend(client.get_defined_sets(defined_type=defined_type))
+        return cls(client.get_policy(), defined_sets, next_hop_self=next_hop_self)
+
+    def evaluate(self, route, policy_names, default=ACCEPT):
+        """
+            Evaluate one route
+
+        policy_names: policies applied in order, as in a policy assignment
+        default: Route action when no statement accepts or rejects the route
+
+        Returns (route action, route), route is a modified copy if an action changed it
+        """
+        return self._evaluate(route, self._statements(policy_names), default)
+
+    def run(self, routes, policy_names, default=ACCEPT):
+        """Evaluate every route, returns SimulationResult"""
+        statements = self._statements(policy_names)
+
+        result = SimulationResult()
+        for route in routes:
+            action, new_route = self._evaluate(route, statements, default)
+            if action == REJECT:
+                result.rejected.append(route)
+            else:
+                result.accepted.append(new_route)
+                if new_route is not route:
+                    result.modified += 1
+        return result
+
+    def _statements(self, policy_names):
+        statements = []
+        for name in policy_names:
+            try:
+                statements.extend(self.policies[name])
+            except KeyError:
+                raise ValueError("Unknown policy {}".format(name))
+        return statements
+
+    def _evaluate(self, route, statements, default):
+        # Values derived from the route once and shared by the conditions
+        context = {}
+        for conditions, actions, route_action in statements:
+            if all(condition(route, context) for condition in conditions):
+                if actions:
+                    if "copy" not in context:
+                        route = dict(route)
+                        context["copy"] = True
+                    for action in actions:
+                        action(route)
+                if route_action != NONE:
+                    return route_action, route
+        return default, route
+
+    def _compile_statement(self, statement):
+        """(condition functions, action functions, route action) of a gobgp.Statement"""
+        conditions = []
+        compiled = statement.conditions
+        if compiled.HasField("prefix_set"):
+            conditions.append(self._prefix_condition(compiled.prefix_set))
+        if compiled.HasField("neighbor_set"):
+            conditions.append(self._neighbor_condition(compiled.neighbor_set))
+        if compiled.HasField("as_path_length"):
+            conditions.append(self._as_path_length_condition(compiled.as_path_length))
+        if compiled.HasField("as_path_set"):
+            conditions.append(self._as_path_condition(compiled.as_path_set))
+        if compiled.HasField("community_set"):
+            conditions.append(self._community_condition(compiled.community_set))
+        if compiled.rpki_result:
+            conditions.append(self._rpki_condition(compiled.rpki_result))
+        for field in ("ext_community_set", "large_community_set"):
+            if compiled.HasField(field):
+                raise ValueError("Statement {}: {} conditions are not supported".format(statement.name, field))
+        if compiled.route_type:
+            raise ValueError("Statement {}: route_type conditions are not supported".format(statement.name))
+
+        actions = []
+        compiled = statement.actions
+        if compiled.HasField("community"):
+            actions.append(self._community_action(compiled.community))
+        if compiled.HasField("med"):
+            actions.append(self._med_action(compiled.med))
+        if compiled.HasField("as_prepend"):
+            actions.append(self._as_prepend_action(compiled.as_prepend))
+        if compiled.HasField("nexthop"):
+            actions.append(self._nexthop_action(compiled.nexthop))
+        if compiled.HasField("local_pref"):
+            actions.append(self._local_pref_action(compiled.local_pref))
+        for field in ("ext_community", "large_community"):
+            if compiled.HasField(field):
+                raise ValueError("Statement {}: {} actions are not supported".format(statement.name, field))
+        return conditions, actions, compiled.route_action
+
+    def _defined_set(self, defined_type, name, compile_fn):
+        """Compiled defined set, each set is compiled once and shared by the statements using it"""
+        key = (defined_type, name)
+        if key not in self._compiled_sets:
+            try:
+                defined_set = self.sets[key]
+            except KeyError:
+                raise ValueError("Unknown defined set {}".format(name))
+            self._compiled_sets[key] = compile_fn(defined_set)
+        return self._compiled_sets[key]
+
+    @staticmethod
+    def _match_set(match_set, match_any):
+        """Condition applying match_set.type (ANY or INVERT) to match_any(route, context)"""
+        if match_set.type == gobgp.INVERT:
+            return lambda route, context: not match_any(route, context)
+        return match_any
+
+    # Conditions
+
+    def _prefix_condition(self, match_set):
+        if match_set.type == gobgp.ALL:
+            raise ValueError("Prefix set {}: match type ALL is not supported".format(match_set.name))
+        index = self._defined_set(gobgp.PREFIX, match_set.name, lambda s: PrefixIndex(s.prefixes))
+
+        def match_any(route, context):
+            key = context.get("prefix")
+            if key is None:
+                key = context["prefix"] = parse_prefix(route["prefix"])
+            return index.match(key)
+        return self._match_set(match_set, match_any)
+
+    def _neighbor_condition(self, match_set):
+        if match_set.type == gobgp.ALL:
+            raise ValueError("Neighbor set {}: match type ALL is not supported".format(match_set.name))
+
+        def compile_set(defined_set):
+            addresses = set()
+            networks = []
+            for entry in defined_set.list:
+                if "/" in entry:
+                    networks.append(ipaddress.ip_network(entry, strict=False))
+                else:
+                    addresses.add(str(ipaddress.ip_address(entry)))
+            return addresses, networks
+        addresses, networks = self._defined_set(gobgp.NEIGHBOR, match_set.name, compile_set)
+
+        def match_any(route, context):
+            neighbor = route.get("neighbor")
+            if not neighbor:
+                return False
+            if neighbor in addresses:
+                return True
+            if networks:
+                address = ipaddress.ip_address(neighbor)
+                return any(address in network for network in networks)
+            return False
+        return self._match_set(match_set, match_any)
+
+    @staticmethod
+    def _as_path_length_condition(as_path_length):
+        length = as_path_length.length
+        if as_path_length.type == gobgp.GE:
+            return lambda route, context: len(route.get("as_path") or ()) >= length
+        if as_path_length.type == gobgp.LE:
+            return lambda route, context: len(route.get("as_path") or ()) <= length
+        return lambda route, context: len(route.get("as_path") or ()) == length
+
+    def _as_path_condition(self, match_set):
+        expressions = self._defined_set(gobgp.AS_PATH, match_set.name, lambda s: list(s.list))
+        matcher = AsPathMatcher(expressions, match_all=match_set.type == gobgp.ALL)
+        if match_set.type == gobgp.INVERT:
+            return lambda route, context: not matcher(route.get("as_path"))
+        return lambda route, context: matcher(route.get("as_path"))
+
+    def _community_condition(self, match_set):
+        def compile_set(defined_set):
+            return [community_matcher(entry) for entry in defined_set.list]
+        matchers = self._defined_set(gobgp.COMMUNITY, match_set.name, compile_set)
+
+        if match_set.type == gobgp.ALL:
+            def match_all(route, context):
+                communities = route.get("community") or ()
+                return all(any(matcher(community) for community in communities) for matcher in matchers)
+            return match_all
+
+        def match_any(route, context):
+            for community in route.get("community") or ():
+                for matcher in matchers:
+                    if matcher(community):
+                        return True
+            return False
+        return self._match_set(match_set, match_any)
+
+    @staticmethod
+    def _rpki_condition(state):
+        return lambda route, context: route.get("validation", gobgp.RPKIValidation.STATE_NONE) == state
+
+    # Actions, applied to a copy of the route
+
+    @staticmethod
+    def _community_action(action):
+        communities = [WELL_KNOWN_COMMUNITIES.get(community, community) for community in action.communities]
+        if action.type == gobgp.COMMUNITY_REPLACE:
+            def replace(route):
+                route["community"] = list(communities)
+            return replace
+
+        if action.type == gobgp.COMMUNITY_REMOVE:
+            matchers = [community_matcher(community) for community in action.communities]
+
+            def remove(route):
+                route["community"] = [community for community in route.get("community") or ()
+                                      if not any(matcher(community) for matcher in matchers)]
+            return remove
+
+        def add(route):
+            current = list(route.get("community") or ())
+            current.extend(community for community in communities if community not in current)
+            route["community"] = current
+        return add
+
+    @staticmethod
+    def _med_action(action):
+        value = action.value
+        if action.type == gobgp.MED_MOD:
+            def modify(route):
+                med = (route.get("med") or 0) + value
+                route["med"] = min(max(med, 0), 0xffffffff)
+            return modify
+
+        def replace(route):
+            route["med"] = value
+        return replace
+
+    @staticmethod
+    def _as_prepend_action(action):
+        asn, repeat, use_left_most = action.asn, action.repeat, action.use_left_most
+
+        def prepend(route):
+            as_path = route.get("as_path") or []
+            if use_left_most and not as_path:
+                return
+            prepended = as_path[0] if use_left_most else asn
+            route["as_path"] = [prepended] * repeat + list(as_path)
+        return prepend
+
+    def _nexthop_action(self, action):
+        next_hop = (self.next_hop_self or "self") if action.self else action.address
+
+        def set_next_hop(route):
+            route["next_hop"] = next_hop
+        return set_next_hop
+
+    @staticmethod
+    def _local_pref_action(action):
+        value = action.value
+
+        def set_local_pref(route):
+            route["local_pref"] = value
+        return set_local_pref
+
+
+def community_matcher(entry):
+    """
+        Function matching "ASN:value" community strings against a GoBGP community set entry
+
+    Entries are either communities ("65000:100", well known names) matched exactly or regular expressions.
+    """
+    entry = WELL_KNOWN_COMMUNITIES.get(entry.lower(), entry)
+    found = _COMMUNITY.match(entry)
+    if found:
+        community = "{}:{}".format(int(found.group(1)), int(found.group(2)))
+        return lambda value: value == community
+    return re.compile(entry).search
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import threading
+
+
+class _Call:
+    """A single in-flight call, shared by every caller asking for the same key"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+        Coalesce concurrent identical calls into one
+
+    While a call for a given key is in flight, any other thread asking for the same key
+    waits for it and receives the very same result (or exception) instead of issuing
+    a duplicate request. Once the call completes the key is forgotten, so the next caller
+    triggers a fresh request - nothing is cached beyond the lifetime of the call.
+
+    Results are shared between callers, treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+            Run fn(*args, **kwargs) unless a call for key is already running,
+            in which case wait for it and return its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+    Minimal protobuf wire format reader and writer
+
+Used to walk serialized GoBGP responses and to build requests without building protobuf
+objects for them. Only what GoBGP messages need is supported: varint (0), 64-bit (1),
+length delimited (2) and 32-bit (5) wire types.
+"""
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+# GetRibResponse.table
+GET_RIB_RESPONSE_TABLE = 1
+# Table.destinations
+TABLE_DESTINATIONS = 4
+# Destination.prefix, Destination.paths
+DESTINATION_PREFIX = 1
+DESTINATION_PATHS = 2
+# Path.pattrs, Path.age, Path.best
+PATH_PATTRS = 2
+PATH_AGE = 3
+PATH_BEST = 4
+
+
+class WireError(ValueError):
+    """Buffer is not valid protobuf wire format"""
+    pass
+
+
+def read_varint(buf, pos):
+    """Read a varint at pos, returns (value, position after the varint)"""
+    result = 0
+    shift = 0
+    while True:
+        try:
+            byte = buf[pos]
+        except IndexError:
+            raise WireError("Truncated varint at {}".format(pos))
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise WireError("Varint too long at {}".format(pos))
+
+
+def encode_varint(value):
+    """Encode an unsigned integer as protobuf base 128 varint"""
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_field(number, payload):
+    """Encode a length delimited protobuf field (wire type 2)"""
+    return encode_varint(number << 3 | LENGTH_DELIMITED) + encode_varint(len(payload)) + payload
+
+
+def encode_varint_field(number, value):
+    """Encode a varint protobuf field (wire type 0), negative values as 64 bits two's complement"""
+    if value < 0:
+        value += 1 << 64
+    return encode_varint(number << 3 | VARINT) + encode_varint(value)
+
+
+def iter_fields(buf, start=0, end=None):
+    """
+        Iterate over the fields of a serialized message in buf[start:end]
+
+    Yields (field number, wire type, value, start, end):
+        value is the integer for varint and fixed wire types, None for length delimited fields
+        whose payload is buf[start:end]
+    """
+    pos = start
+    end = len(buf) if end is None else end
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == LENGTH_DELIMITED:
+            length, pos = read_varint(buf, pos)
+            if pos + length > end:
+                raise WireError("Field {} overruns message ({} > {})".format(number, pos + length, end))
+            yield number, wire_type, None, pos, pos + length
+            pos += length
+        elif wire_type == VARINT:
+            value, pos = read_varint(buf, pos)
+            yield number, wire_type, value, pos, pos
+        elif wire_type == FIXED64:
+            yield number, wire_type, int.from_bytes(buf[pos:pos + 8], "little"), pos, pos + 8
+            pos += 8
+        elif wire_type == FIXED32:
+            yield number, wire_type, int.from_bytes(buf[pos:pos + 4], "little"), pos, pos + 4
+            pos += 4
+        else:
+            raise WireError("Unsupported wire type {} for field {}".format(wire_type, number))
+
+
+def find_field(buf, number, start=0, end=None):
+    """(start, end) of the last length delimited field `number` in buf[start:end], None if missing"""
+    found = None
+    for field, wire_type, _, field_start, field_end in iter_fields(buf, start, end):
+        if field == number and wire_type == LENGTH_DELIMITED:
+            found = (field_start, field_end)
+    return found
+
+
+def table_span(buf):
+    """(start, end) of the Table of a serialized GetRibResponse, None if the response has no table"""
+    return find_field(buf, GET_RIB_RESPONSE_TABLE)
+
+
+def destination_spans(buf, start=0, end=None):
+    """
+        Yield (start, end) of each serialized Destination of a Table in buf[start:end]
+    """
+    for field, wire_type, _, field_start, field_end in iter_fields(buf, start, end):
+        if field == TABLE_DESTINATIONS and wire_type == LENGTH_DELIMITED:
+            yield field_start, field_end
+
+
+def split_destinations(buf, chunks):
+    """
+        Split the Table of a serialized GetRibResponse into about `chunks` ranges of whole
+        Destination fields with roughly the same number of bytes.
+
+    Returns list of (start, end) ranges of the Table payload, each range can be walked with
+    destination_spans. Only field headers are read, payloads are skipped.
+    """
+    span = table_span(buf)
+    if span is None:
+        return []
+    start, end = span
+    target = max(1, (end - start) // max(1, chunks))
+
+    ranges = []
+    chunk_start = start
+    for field, _, _, _, field_end in iter_fields(buf, start, end):
+        if field_end - chunk_start >= target:
+            ranges.append((chunk_start, field_end))
+            chunk_start = field_end
+    if chunk_start < end:
+        ranges.append((chunk_start, end))
+    return ranges
+
+
+def iter_destinations(buf, start=0, end=None, first_path_only=True):
+    """
+        Walk the serialized Destinations of a Table in buf[start:end] without building protobuf objects
+
+    buf: bytes-like object, wrapped in a memoryview so nothing is copied
+    first_path_only: Only parse the first path of each destination (the one PyGoBGP routes are built from)
+
+    Yields (prefix, paths) for each destination, paths is a list of (pattrs, best, age) tuples
+    where pattrs is a list of memoryviews over buf, one per serialized path attribute.
+    """
+    view = buf if isinstance(buf, memoryview) else memoryview(buf)
+    for dest_start, dest_end in destination_spans(view, start, end):
+        prefix = ""
+        paths = []
+        for number, wire_type, _, field_start, field_end in iter_fields(view, dest_start, dest_end):
+            if wire_type != LENGTH_DELIMITED:
+                continue
+            if number == DESTINATION_PREFIX:
+                prefix = bytes(view[field_start:field_end]).decode("utf-8")
+            elif number == DESTINATION_PATHS and not (first_path_only and paths):
+                paths.append(parse_path(view, field_start, field_end))
+        yield prefix, paths
+
+
+def parse_path(view, start, end):
+    """(pattrs, best, age) of the Path serialized in view[start:end], pattrs are memoryviews over view"""
+    pattrs = []
+    best = False
+    age = 0
+    for number, wire_type, value, field_start, field_end in iter_fields(view, start, end):
+        if number == PATH_PATTRS and wire_type == LENGTH_DELIMITED:
+            pattrs.append(view[field_start:field_end])
+        elif number == PATH_BEST and wire_type == VARINT:
+            best = bool(value)
+        elif number == PATH_AGE and wire_type == VARINT:
+            # int64, negative values are encoded as 64 bits two's complement
+            age = value - (1 << 64) if value >= 1 << 63 else value
+    return pattrs, best, age
+
+
+def iter_rib(buf):
+    """iter_destinations over the Table of a serialized GetRibResponse"""
+    span = table_span(buf)
+    if span is None:
+        return iter(())
+    return iter_destinations(buf, span[0], span[1])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+
+from pygobgp.aspath import AsPathMatcher
+from pygobgp.aspath import as_path_regex
+
+
+class CountingRegex:
+    """Compiled regular expression counting searches"""
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.searches = 0
+
+    def search(self, string):
+        self.searches += 1
+        return self.regex.search(string)
+
+
+def counting(matcher):
+    matcher._regexes = [CountingRegex(regex) for regex in matcher._regexes]
+    return matcher._regexes
+
+
+class AsPathMatcherTest(unittest.TestCase):
+
+    def test_boundary(self):
+        self.assertEqual(as_path_regex("^65001_"), "^65001(^|[,{}() ]|$)")
+        cases = [
+            ("^65001_", [65001], True), ("^65001_", [65001, 65002], True), ("^65001_", [650011], False),
+            ("^65001_", [65002, 65001], False),
+            ("_65002$", [65001, 65002], True), ("_65002$", [65001, 165002], False),
+            ("_174_", [174], True), ("_174_", [65001, 174, 65002], True), ("_174_", [1174, 1745], False),
+            ("^65001_65002", [65001, 65002, 1], True), ("^65001_65002", [65001, 1, 65002], False),
+            ("^$", [], True), ("^$", [1], False), ("_1_", None, False),
+        ]
+        for expression, as_path, expected in cases:
+            self.assertEqual(AsPathMatcher(expression)(as_path), expected, (expression, as_path))
+
+    def test_verdict_reuse(self):
+        matcher = AsPathMatcher("_174_")
+        regex, = counting(matcher)
+        paths = [[65001, 174], (65001, 174), [65002], [65001, 174], [65002], None, []]
+        self.assertEqual([matcher(path) for path in paths], [True, True, False, True, False, False, False])
+        # Lists and tuples of the same ASNs share a verdict, as do None and []
+        self.assertEqual(regex.searches, 3)
+        self.assertEqual(matcher.cached, 3)
+
+    def test_filter(self):
+        routes = [{"prefix": "10.{}.0.0/16".format(i), "as_path": [65001, 174 if i % 2 else 3356]} for i in range(100)]
+        routes.append({"prefix": "11.0.0.0/8", "as_path": None})
+        matcher = AsPathMatcher("_174$")
+        regex, = counting(matcher)
+        self.assertEqual(matcher.filter(routes), routes[1:100:2])
+        self.assertEqual(regex.searches, 3)
+
+    def test_several_expressions(self):
+        paths = [[65001, 174], [65001, 3356], [65002, 174], [174, 3356]]
+        self.assertEqual([AsPathMatcher(["^65001_", "_174_"])(path) for path in paths], [True, True, True, True])
+        self.assertEqual([AsPathMatcher(["^65001_", "_174_"], match_all=True)(path) for path in paths],
+                         [True, False, False, False])
+        self.assertEqual([AsPathMatcher([])(path) for path in paths], [False] * 4)
+
+    def test_max_cache(self):
+        matcher = AsPathMatcher("_174_", max_cache=10)
+        for asn in range(25):
+            matcher([asn])
+        self.assertEqual(matcher.cached, 5)
+        self.assertTrue(matcher([174]))
+
+    def test_invalid(self):
+        with self.assertRaises(re.error):
+            AsPathMatcher("_(174_")
+
+
+if __name__ == "__main__":
+    unittest.main()
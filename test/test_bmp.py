@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+import struct
+import unittest
+
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.bmp import INITIATION
+from pygobgp.bmp import PEER_DOWN
+from pygobgp.bmp import PEER_UP
+from pygobgp.bmp import ROUTE_MONITORING
+from pygobgp.bmp import STATISTICS_REPORT
+from pygobgp.bmp import BmpCollector
+from pygobgp.bmp import BmpError
+from pygobgp.bmp import BmpProtocol
+from pygobgp.bmp import parse_message
+from pygobgp.decoder import decode_nlri
+from pygobgp.mrt import encode_attribute
+
+
+def common(message_type, body):
+    return struct.pack(">BLB", 3, 6 + len(body), message_type) + body
+
+
+def peer_header(address="10.0.0.2", asn=65002, flags=0x40):
+    if ":" in address:
+        raw = socket.inet_pton(socket.AF_INET6, address)
+        flags |= 0x80
+    else:
+        raw = b"\x00" * 12 + socket.inet_aton(address)
+    return struct.pack(">BB8s16sL4sLL", 0, flags, b"\x00" * 8, raw, asn, socket.inet_aton("1.1.1.1"), 1000, 500000)
+
+
+def bgp(message_type, body):
+    return b"\xff" * 16 + struct.pack(">HB", 19 + len(body), message_type) + body
+
+
+def update(nlri=b"", withdrawn=b"", attrs=b""):
+    return bgp(2, struct.pack(">H", len(withdrawn)) + withdrawn + struct.pack(">H", len(attrs)) + attrs + nlri)
+
+
+ATTRS = (encode_attribute(0x40, 1, b"\x00") +
+         encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65002, 13335)) +
+         encode_attribute(0x40, 3, socket.inet_aton("10.0.0.2")))
+MP_REACH = (struct.pack(">HBB", 2, 1, 16) + socket.inet_pton(socket.AF_INET6, "2001:db8::1") + b"\x00" +
+            bytes([32]) + socket.inet_pton(socket.AF_INET6, "2001:db8::")[:4])
+ATTRS6 = (encode_attribute(0x40, 1, b"\x00") +
+          encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65002, 64500)) +
+          encode_attribute(0x80, 14, MP_REACH))
+OPEN = bgp(1, b"\x04" + struct.pack(">HH4sB", 65002, 90, socket.inet_aton("1.1.1.1"), 0))
+
+INITIATION_MESSAGE = common(INITIATION, struct.pack(">HH", 2, 5) + b"gobgp")
+PEER_UP_MESSAGE = common(PEER_UP, peer_header() + b"\x00" * 12 + socket.inet_aton("10.0.0.1") +
+                         struct.pack(">HH", 179, 40000) + OPEN + OPEN + struct.pack(">HH", 0, 2) + b"up")
+ANNOUNCE = common(ROUTE_MONITORING, peer_header() + update(nlri=bytes([24, 192, 0, 2, 16, 10, 1]), attrs=ATTRS))
+ANNOUNCE6 = common(ROUTE_MONITORING, peer_header("2001:db8::2") + update(attrs=ATTRS6))
+WITHDRAW = common(ROUTE_MONITORING, peer_header() + update(withdrawn=bytes([16, 10, 1])))
+STATS = common(STATISTICS_REPORT, peer_header() + struct.pack(">L", 3) + struct.pack(">HHL", 0, 4, 7) +
+               struct.pack(">HHQ", 7, 8, 99) + struct.pack(">HHHBQ", 9, 11, 1, 1, 42))
+PEER_DOWN_MESSAGE = common(PEER_DOWN, peer_header() + b"\x02")
+MESSAGES = [INITIATION_MESSAGE, PEER_UP_MESSAGE, ANNOUNCE, ANNOUNCE6, WITHDRAW, STATS, PEER_DOWN_MESSAGE]
+
+
+def parse(data):
+    return parse_message(memoryview(data), 0, len(data))
+
+
+class ParseMessageTest(unittest.TestCase):
+
+    def test_initiation(self):
+        message = parse(INITIATION_MESSAGE)
+        self.assertEqual(message.type, INITIATION)
+        self.assertIsNone(message.peer)
+        self.assertEqual(message.information, [(2, b"gobgp")])
+
+    def test_peer_up(self):
+        message = parse(PEER_UP_MESSAGE)
+        self.assertEqual((message.peer.address, message.peer.asn, message.peer.bgp_id), ("10.0.0.2", 65002, "1.1.1.1"))
+        self.assertTrue(message.peer.post_policy)
+        self.assertTrue(message.peer.as4)
+        self.assertEqual((message.local_address, message.local_port, message.remote_port), ("10.0.0.1", 179, 40000))
+        self.assertEqual(message.information, [(0, b"up")])
+
+    def test_route_monitoring(self):
+        message = parse(ANNOUNCE)
+        self.assertEqual([(family, decode_nlri(nlri)) for family, nlri, _ in message.announced],
+                         [(IPV4_UNICAST, "192.0.2.0/24"), (IPV4_UNICAST, "10.1.0.0/16")])
+        self.assertEqual(message.withdrawn, [])
+        message = parse(WITHDRAW)
+        self.assertEqual([(family, decode_nlri(nlri)) for family, nlri in message.withdrawn],
+                         [(IPV4_UNICAST, "10.1.0.0/16")])
+
+    def test_route_monitoring_ipv6(self):
+        message = parse(ANNOUNCE6)
+        self.assertEqual(message.peer.address, "2001:db8::2")
+        self.assertEqual([(family, decode_nlri(nlri, ipv6=True)) for family, nlri, _ in message.announced],
+                         [(IPV6_UNICAST, "2001:db8::/32")])
+
+    def test_statistics(self):
+        self.assertEqual(parse(STATS).stats, {0: 7, 7: 99, (9, IPV4_UNICAST): 42})
+
+    def test_peer_down(self):
+        self.assertEqual(parse(PEER_DOWN_MESSAGE).reason, 2)
+
+    def test_version(self):
+        with self.assertRaises(BmpError):
+            parse(b"\x02" + ANNOUNCE[1:])
+
+
+class BmpCollectorTest(unittest.TestCase):
+
+    def test_server(self):
+        async def collect():
+            collector = BmpCollector(max_queue=100)
+            await collector.start("127.0.0.1", 0)
+            _, writer = await asyncio.open_connection("127.0.0.1", collector.port)
+            writer.write(b"".join(MESSAGES))
+            await writer.drain()
+            messages = []
+            async for message in collector:
+                messages.append(message)
+                if len(messages) == len(MESSAGES):
+                    collector.close()
+            writer.close()
+            return messages
+
+        messages = asyncio.run(collect())
+        self.assertEqual([message.type for message in messages],
+                         [INITIATION, PEER_UP, ROUTE_MONITORING, ROUTE_MONITORING, ROUTE_MONITORING,
+                          STATISTICS_REPORT, PEER_DOWN])
+
+
+class Transport:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+
+class FailingCollector(BmpCollector):
+
+    def deliver(self, message, session):
+        raise RuntimeError("consumer failed")
+
+
+class BmpProtocolTest(unittest.TestCase):
+
+    def session(self, collector):
+        protocol = BmpProtocol(collector)
+        protocol.connection_made(Transport())
+        return protocol
+
+    def test_framing(self):
+        data = b"".join(MESSAGES)
+        for size in (1, 7, 100, len(data)):
+            collector = BmpCollector(mirror=True, max_queue=0)
+            protocol = self.session(collector)
+            for start in range(0, len(data), size):
+                protocol.data_received(data[start:start + size])
+            self.assertEqual(collector.received, len(MESSAGES))
+            self.assertEqual(protocol.buffer, bytearray())
+            self.assertFalse(protocol.transport.closed)
+
+    def test_mirror(self):
+        collector = BmpCollector(mirror=True, max_queue=0)
+        protocol = self.session(collector)
+        protocol.data_received(b"".join(MESSAGES[:4]))
+        rib = collector.mirror.get("10.0.0.2", post_policy=True)
+        self.assertEqual(sorted(route["prefix"] for route in rib), ["10.1.0.0/16", "192.0.2.0/24"])
+        self.assertEqual(sorted(route["prefix"] for route in rib.by_origin(13335)), ["10.1.0.0/16", "192.0.2.0/24"])
+        protocol.data_received(WITHDRAW)
+        self.assertEqual(sorted(route["prefix"] for route in rib), ["192.0.2.0/24"])
+        protocol.data_received(PEER_DOWN_MESSAGE)
+        self.assertIsNone(collector.mirror.get("10.0.0.2", post_policy=True))
+
+    def test_partial_message_kept(self):
+        collector = BmpCollector(max_queue=0)
+        protocol = self.session(collector)
+        protocol.data_received(ANNOUNCE + WITHDRAW[:10])
+        self.assertEqual(collector.received, 1)
+        self.assertEqual(bytes(protocol.buffer), WITHDRAW[:10])
+        protocol.data_received(WITHDRAW[10:])
+        self.assertEqual(collector.received, 2)
+        self.assertEqual(protocol.buffer, bytearray())
+
+    def test_invalid_message(self):
+        collector = BmpCollector(max_queue=0)
+        protocol = self.session(collector)
+        protocol.data_received(ANNOUNCE + b"\x03\x00\x00\x00\x01\x00")
+        self.assertEqual(collector.errors, 1)
+        self.assertTrue(protocol.transport.closed)
+
+    def test_deliver_error_releases_buffer(self):
+        protocol = self.session(FailingCollector(max_queue=0))
+        errors = []
+        try:
+            protocol.data_received(ANNOUNCE + WITHDRAW[:10])
+        except RuntimeError as e:
+            # Keep the traceback, and so the frame of data_received, alive as an event loop would
+            errors.append(e)
+        self.assertEqual(len(errors), 1)
+        # The buffer must still be resizable
+        protocol.buffer.extend(b"\x00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+from pygobgp.bulk import BulkResult
+from pygobgp.bulk import pipeline
+
+
+class Future:
+    """grpc.Future of a unary call, completed by the multi-callable or cancelled"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._done = False
+        self._cancelled = False
+        self._error = None
+
+    def _finish(self, error=None, cancelled=False):
+        with self._lock:
+            if self._done:
+                return False
+            self._done, self._error, self._cancelled = True, error, cancelled
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+        return True
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def cancel(self):
+        return self._finish(cancelled=True)
+
+    def done(self):
+        return self._done
+
+    def result(self, timeout=None):
+        if self._cancelled:
+            raise CancelledError()
+        if self._error is not None:
+            raise self._error
+        return "response"
+
+
+class MultiCallable:
+    """
+        Unary-unary multi-callable answering after delay seconds
+
+    errors: request -> exception raised by the call, exceptions raised when issuing it for
+        requests in issue_errors
+    """
+
+    def __init__(self, delay=0.001, errors=None, issue_errors=None, complete=True):
+        self.delay = delay
+        self.errors = errors or {}
+        self.issue_errors = issue_errors or {}
+        self.complete = complete
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self.futures = []
+
+    def future(self, request, timeout=None):
+        if request in self.issue_errors:
+            raise self.issue_errors[request]
+        future = Future()
+        self.futures.append(future)
+        with self.lock:
+            self.outstanding += 1
+            self.max_outstanding = max(self.max_outstanding, self.outstanding)
+        if self.complete:
+            threading.Timer(self.delay, self._finish, args=(future, self.errors.get(request))).start()
+        return future
+
+    def _finish(self, future, error):
+        with self.lock:
+            self.outstanding -= 1
+        future._finish(error)
+
+
+def run(target, *args, **kwargs):
+    """Run target in a thread, (result, exception); fails rather than hang"""
+    outcome = [None, None]
+
+    def call():
+        try:
+            outcome[0] = target(*args, **kwargs)
+        except BaseException as e:
+            outcome[1] = e
+
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(10)
+    if thread.is_alive():
+        raise AssertionError("pipeline did not return")
+    return outcome
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_in_flight_bound(self):
+        rpc = MultiCallable()
+        result = pipeline(rpc, ((i, i) for i in range(300)), max_in_flight=8)
+        self.assertEqual(sorted(result.succeeded), list(range(300)))
+        self.assertTrue(result.ok)
+        self.assertEqual(rpc.max_outstanding, 8)
+        self.assertEqual(rpc.outstanding, 0)
+        self.assertGreater(result.rate, 0)
+
+    def test_errors_per_key(self):
+        failure = RuntimeError("peer failed")
+        rejected = ValueError("invalid request")
+        rpc = MultiCallable(errors={3: failure, 7: failure}, issue_errors={5: rejected})
+        result = pipeline(rpc, [("k{}".format(i), i) for i in range(10)], max_in_flight=4)
+        self.assertEqual(result.errors, {"k3": failure, "k7": failure, "k5": rejected})
+        self.assertEqual(sorted(result.succeeded), ["k{}".format(i) for i in (0, 1, 2, 4, 6, 8, 9)])
+        self.assertEqual(result.total, 10)
+        self.assertFalse(result.ok)
+
+    def test_result_accumulates(self):
+        result = BulkResult()
+        pipeline(MultiCallable(), [(1, 1)], result=result)
+        pipeline(MultiCallable(), [(2, 2)], result=result)
+        self.assertEqual(sorted(result.succeeded), [1, 2])
+
+    def test_requests_raise(self):
+        rpc = MultiCallable(complete=False)
+        result = BulkResult()
+
+        def requests():
+            for i in range(5):
+                yield i, i
+            raise RuntimeError("request generation failed")
+
+        _, error = run(pipeline, rpc, requests(), max_in_flight=10, result=result)
+        self.assertIsInstance(error, RuntimeError)
+        self.assertTrue(all(future._cancelled for future in rpc.futures))
+        self.assertEqual(sorted(result.errors), list(range(5)))
+        self.assertTrue(all(isinstance(e, CancelledError) for e in result.errors.values()))
+
+    def test_issue_interrupted(self):
+        # A BaseException when issuing a request gives its slot back: the drain does not hang
+        rpc = MultiCallable(issue_errors={2: KeyboardInterrupt()})
+        _, error = run(pipeline, rpc, [(i, i) for i in range(5)], max_in_flight=2)
+        self.assertIsInstance(error, KeyboardInterrupt)
+
+    def test_duplicate_key(self):
+        rpc = MultiCallable(complete=False)
+        result = BulkResult()
+        _, error = run(pipeline, rpc, [("a", 1), ("b", 2), ("a", 3)], result=result)
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(len(rpc.futures), 2)
+        self.assertEqual(sorted(result.errors), ["a", "b"])
+
+    def test_max_in_flight(self):
+        with self.assertRaises(ValueError):
+            pipeline(MultiCallable(), [], max_in_flight=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import os
+import random
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import encode_nlri
+from pygobgp.journal import JournalError
+from pygobgp.journal import SEGMENT_MAGIC
+from pygobgp.journal import RibJournal
+from pygobgp.mrt import encode_attribute
+
+
+def attributes(origin_as):
+    return (encode_attribute(0x40, 1, b"\x00") +
+            encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65001, origin_as)) +
+            encode_attribute(0x40, 3, socket.inet_aton("10.0.0.1")))
+
+
+def random_prefix(rng, ipv6=False):
+    bits = 128 if ipv6 else 32
+    length = rng.randint(8, 48 if ipv6 else 24)
+    network = rng.getrandbits(bits) >> (bits - length) << (bits - length)
+    return str(ipaddress.ip_network((network, length)))
+
+
+def origins(snapshot):
+    return {route["prefix"]: route["as_path"][-1] for route in snapshot}
+
+
+class RibJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rng = random.Random(47)
+        # Reference model: timestamp -> table (prefix -> origin AS) after the changes at that time
+        self.history = []
+        self.table = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, journal, start, count):
+        """Append count random changes at times start, start + 1, ..."""
+        for timestamp in range(start, start + count):
+            ipv6 = self.rng.random() < 0.1
+            if self.table and self.rng.random() < 0.3:
+                prefix = self.rng.choice(sorted(self.table))
+                del self.table[prefix]
+                journal.append(IPV6_UNICAST if ":" in prefix else IPV4_UNICAST, encode_nlri(prefix), None,
+                               timestamp=timestamp)
+            else:
+                prefix = random_prefix(self.rng, ipv6)
+                self.table[prefix] = self.rng.randint(1, 300)
+                journal.append(IPV6_UNICAST if ipv6 else IPV4_UNICAST, encode_nlri(prefix),
+                               attributes(self.table[prefix]), timestamp=timestamp)
+            self.history.append((timestamp, dict(self.table)))
+
+    def test_rotation(self):
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1000, 500)
+            segments = journal.segments()
+            self.assertGreater(len(segments), 5)
+            # Full segments are started again once segment_size is reached
+            for sequence in segments[:-1]:
+                size = os.path.getsize(journal._path(sequence, ".seg")) - len(SEGMENT_MAGIC)
+                self.assertTrue(2000 <= size < 2100, size)
+            self.assertEqual([sequence for sequence, _ in journal.checkpoints()], segments)
+        # Checkpoints hold the table of the last record before them
+        for sequence, timestamp in RibJournal(self.directory).checkpoints()[1:]:
+            self.assertIn(timestamp, [t for t, _ in self.history])
+
+    def test_checkpoint_interval(self):
+        with RibJournal(self.directory, checkpoint_interval=100) as journal:
+            self.write(journal, 1000, 450)
+            self.assertEqual(len(journal.segments()), 5)
+
+    def test_snapshot_at(self):
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1000, 500)
+            for timestamp, table in self.rng.sample(self.history, 40):
+                self.assertEqual(origins(journal.snapshot_at(timestamp)), table, timestamp)
+                self.assertEqual(origins(journal.snapshot_at(timestamp + 0.5)), table, timestamp)
+            self.assertEqual(origins(journal.snapshot_at()), self.table)
+        # Before the first record: the empty table of the first checkpoint
+        self.assertEqual(len(RibJournal(self.directory).snapshot_at(999)), 0)
+
+    def test_reopen(self):
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1000, 200)
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1200, 200)
+            for timestamp, table in self.history[::20]:
+                self.assertEqual(origins(journal.snapshot_at(timestamp)), table, timestamp)
+            self.assertEqual(origins(journal.snapshot_at()), self.table)
+
+    def test_compact(self):
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1000, 500)
+            checkpoints = journal.checkpoints()
+            self.assertEqual(journal.compact(999), 0)
+            before = 1250.5
+            kept = max(sequence for sequence, timestamp in checkpoints if timestamp <= before)
+            removed = journal.compact(before)
+            self.assertEqual(removed, 2 * sum(1 for sequence, _ in checkpoints if sequence < kept))
+            self.assertEqual(journal.segments()[0], kept)
+            # The segments kept are not rewritten: they still start before that time
+            self.assertLess(next(journal.changes(0)).timestamp, before)
+            for timestamp, table in self.history[250:]:
+                self.assertEqual(origins(journal.snapshot_at(timestamp)), table, timestamp)
+            with self.assertRaises(JournalError):
+                journal.snapshot_at(1000)
+
+    def test_max_age(self):
+        with RibJournal(self.directory, checkpoint_interval=100, max_age=150) as journal:
+            self.write(journal, 1000, 450)
+            self.assertEqual([timestamp for _, timestamp in journal.checkpoints()][0], 1199)
+            self.assertEqual(origins(journal.snapshot_at(1300)), dict(self.history[300][1]))
+
+    def test_changes(self):
+        with RibJournal(self.directory, segment_size=2000) as journal:
+            self.write(journal, 1000, 300)
+            records = list(journal.changes(1100, 1199))
+        self.assertEqual([record.timestamp for record in records], list(range(1100, 1200)))
+        previous = self.history[99][1]
+        for record, (_, table) in zip(records, self.history[100:200]):
+            if record.withdraw:
+                self.assertIn(record.prefix, previous)
+                self.assertNotIn(record.prefix, table)
+                self.assertIsNone(record.route())
+            else:
+                self.assertEqual(record.route()["as_path"][-1], table[record.prefix])
+            previous = table
+
+    def test_record(self):
+        with RibJournal(self.directory) as journal:
+            journal.record(gobgp.Destination(prefix="10.0.0.0/8", paths=[
+                gobgp.Path(is_withdraw=True), gobgp.Path(pattrs=[attributes(13335)])]), timestamp=1000)
+            journal.record(gobgp.Destination(prefix="11.0.0.0/8", paths=[gobgp.Path(pattrs=[attributes(3356)])]),
+                           timestamp=1001)
+            # Unknown prefix: not recorded
+            journal.record(gobgp.Destination(prefix="12.0.0.0/8", paths=[gobgp.Path(is_withdraw=True)]),
+                           timestamp=1002)
+            journal.record(gobgp.Destination(prefix="11.0.0.0/8", paths=[gobgp.Path(is_withdraw=True)]),
+                           timestamp=1003)
+            # Out of order timestamps are moved forward
+            journal.record(gobgp.Destination(prefix="12.0.0.0/8", paths=[gobgp.Path(pattrs=[attributes(174)])]),
+                           timestamp=900)
+            self.assertEqual([(record.timestamp, record.prefix, record.withdraw) for record in journal.changes(0)],
+                             [(1000, "10.0.0.0/8", False), (1001, "11.0.0.0/8", False),
+                              (1003, "11.0.0.0/8", True), (1003, "12.0.0.0/8", False)])
+            self.assertEqual(origins(journal.snapshot_at(1001)), {"10.0.0.0/8": 13335, "11.0.0.0/8": 3356})
+            self.assertEqual(origins(journal.snapshot_at()), {"10.0.0.0/8": 13335, "12.0.0.0/8": 174})
+
+    def test_record_without_prefix(self):
+        with RibJournal(self.directory) as journal:
+            # Neither prefix nor NLRI: skipped
+            journal.record(gobgp.Destination(paths=[gobgp.Path(is_withdraw=True)]), timestamp=1000)
+            journal.record(gobgp.Destination(paths=[gobgp.Path(pattrs=[attributes(13335)])]), timestamp=1001)
+            # The NLRI of the paths is used when the prefix is missing
+            journal.record(gobgp.Destination(paths=[gobgp.Path(nlri=encode_nlri("10.0.0.0/8"),
+                                                               pattrs=[attributes(13335)])]), timestamp=1002)
+            journal.record(gobgp.Destination(paths=[gobgp.Path(nlri=encode_nlri("10.0.0.0/8"), is_withdraw=True)]),
+                           timestamp=1003)
+            self.assertEqual([(record.timestamp, record.prefix, record.withdraw) for record in journal.changes(0)],
+                             [(1002, "10.0.0.0/8", False), (1003, "10.0.0.0/8", True)])
+
+    def test_truncated_segment(self):
+        with RibJournal(self.directory) as journal:
+            self.write(journal, 1000, 10)
+            path = journal._path(journal.segments()[-1], ".seg")
+        with open(path, "ab") as f:
+            f.write(b"\x00" * 5)
+        self.assertEqual(origins(RibJournal(self.directory).snapshot_at()), self.table)
+
+
+if __name__ == "__main__":
+    unittest.main()
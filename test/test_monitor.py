@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.decoder import encode_nlri
+from pygobgp.monitor import BLOCK
+from pygobgp.monitor import DROP
+from pygobgp.monitor import CoalescingQueue
+from pygobgp.monitor import RibConsumer
+
+
+def counters(queue):
+    return queue.received, queue.coalesced, queue.dropped, queue.delivered, queue.max_depth
+
+
+class CoalescingQueueTest(unittest.TestCase):
+
+    def test_coalescing(self):
+        queue = CoalescingQueue()
+        for key, item in [("a", 1), ("b", 1), ("a", 2), ("c", 1), ("a", 3), ("b", 2)]:
+            self.assertTrue(queue.put(key, (key, item)))
+        self.assertEqual(len(queue), 3)
+        # Latest item of each key, at the position of its first pending item
+        self.assertEqual(queue.get_batch(), [("a", 3), ("b", 2), ("c", 1)])
+        self.assertEqual(counters(queue), (6, 3, 0, 3, 3))
+        # Once consumed a key is queued again at the end
+        queue.put("c", ("c", 2))
+        queue.put("a", ("a", 4))
+        self.assertEqual(queue.get_batch(max_items=1), [("c", 2)])
+        self.assertEqual(queue.get_batch(), [("a", 4)])
+
+    def test_get_batch_timeout(self):
+        queue = CoalescingQueue()
+        self.assertEqual(queue.get_batch(timeout=0.01), [])
+        queue.put("a", 1)
+        queue.close()
+        self.assertEqual(queue.get_batch(timeout=0.01), [1])
+        self.assertEqual(queue.get_batch(), [])
+        self.assertFalse(queue.put("b", 1))
+
+    def test_drop(self):
+        queue = CoalescingQueue(max_size=2, overflow=DROP)
+        self.assertTrue(queue.put("a", 1))
+        self.assertTrue(queue.put("b", 1))
+        self.assertFalse(queue.put("c", 1))
+        # Full: pending keys are still replaced, forced items are queued beyond max_size
+        self.assertTrue(queue.put("a", 2))
+        self.assertTrue(queue.put("d", 1, force=True))
+        self.assertEqual(counters(queue), (5, 1, 1, 0, 3))
+        self.assertEqual(queue.get_batch(), [2, 1, 1])
+        self.assertTrue(queue.put("c", 2))
+        self.assertEqual(counters(queue), (6, 1, 1, 3, 3))
+
+    def test_block(self):
+        queue = CoalescingQueue(max_size=2, overflow=BLOCK)
+        queue.put("a", 1)
+        queue.put("b", 1)
+        self.assertFalse(queue.put("c", 1, timeout=0.01))
+        self.assertTrue(queue.put("a", 2, timeout=0.01))
+        # The producer waits for room rather than dropping
+        done = threading.Event()
+        producer = threading.Thread(target=lambda: queue.put("c", 2) and done.set())
+        producer.start()
+        self.assertFalse(done.wait(0.05))
+        self.assertEqual(queue.get_batch(max_items=1), [2])
+        self.assertTrue(done.wait(5))
+        producer.join()
+        self.assertEqual(queue.get_batch(), [1, 2])
+        self.assertEqual(counters(queue), (5, 1, 1, 3, 2))
+
+    def test_close_wakes_producer(self):
+        queue = CoalescingQueue(max_size=1)
+        queue.put("a", 1)
+        result = []
+        producer = threading.Thread(target=lambda: result.append(queue.put("b", 1)))
+        producer.start()
+        queue.close()
+        producer.join(5)
+        self.assertEqual(result, [False])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            CoalescingQueue(overflow="ignore")
+        with self.assertRaises(ValueError):
+            CoalescingQueue(max_size=0)
+
+
+class Stream:
+    """MonitorRib stream of a list of destinations, raising error at the end if any"""
+
+    def __init__(self, destinations, error=None):
+        self.destinations = destinations
+        self.error = error
+        self.cancelled = False
+
+    def __iter__(self):
+        for destination in self.destinations:
+            yield destination
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Client:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.requests = []
+
+    def monitor_rib(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.stream
+
+
+def announce(prefix, nexthop):
+    return gobgp.Destination(prefix=prefix, paths=[gobgp.Path(pattrs=[nexthop])])
+
+
+def withdraw(prefix):
+    return gobgp.Destination(prefix=prefix, paths=[gobgp.Path(is_withdraw=True)])
+
+
+class RibConsumerTest(unittest.TestCase):
+
+    def consume(self, consumer):
+        destinations = []
+        for batch in consumer.start():
+            destinations.extend(batch)
+        return destinations
+
+    def test_coalescing(self):
+        stream = Stream([announce("10.0.0.0/8", b"1"), announce("11.0.0.0/8", b"1"), announce("10.0.0.0/8", b"2"),
+                         gobgp.Destination(paths=[gobgp.Path(nlri=encode_nlri("12.0.0.0/8"), is_withdraw=True)]),
+                         withdraw("11.0.0.0/8")])
+        client = Client(stream)
+        consumer = RibConsumer(client, current=False, name="peer")
+        # Read everything before consuming
+        consumer.start()._thread.join(5)
+        self.assertEqual(consumer.get_batch(), [stream.destinations[i] for i in (2, 4, 3)])
+        self.assertEqual(consumer.get_batch(), [])
+        self.assertTrue(consumer.closed)
+        self.assertIsNone(consumer.error)
+        self.assertEqual(client.requests, [{"family": 65537, "current": False, "name": "peer"}])
+
+    def test_drop_keeps_withdrawals(self):
+        stream = Stream([announce("10.0.0.0/8", b"1"), announce("11.0.0.0/8", b"1"), announce("12.0.0.0/8", b"1"),
+                         withdraw("13.0.0.0/8"), announce("10.0.0.0/8", b"2"), withdraw("11.0.0.0/8")])
+        consumer = RibConsumer(Client(stream), max_pending=1, overflow=DROP)
+        consumer.start()._thread.join(5)
+        self.assertEqual(consumer.get_batch(), [stream.destinations[i] for i in (4, 3, 5)])
+        queue = consumer.queue
+        self.assertEqual((queue.dropped, queue.max_depth), (2, 3))
+
+    def test_block(self):
+        stream = Stream([announce("{}.0.0.0/8".format(i % 50), str(i).encode()) for i in range(500)])
+        consumer = RibConsumer(Client(stream), max_pending=10)
+        destinations = self.consume(consumer)
+        latest = {}
+        for destination in stream.destinations:
+            latest[destination.prefix] = destination
+        # Nothing lost: the last change of each prefix is delivered after its earlier ones
+        for prefix, destination in latest.items():
+            self.assertEqual([d for d in destinations if d.prefix == prefix][-1], destination)
+        self.assertEqual(consumer.queue.dropped, 0)
+        self.assertLessEqual(consumer.queue.max_depth, 10)
+
+    def test_error(self):
+        error = RuntimeError("stream failed")
+        consumer = RibConsumer(Client(Stream([withdraw("10.0.0.0/8")], error)))
+        self.assertEqual(len(self.consume(consumer)), 1)
+        self.assertIs(consumer.error, error)
+
+    def test_stop(self):
+        stream = Stream([])
+        consumer = RibConsumer(Client(stream)).start()
+        consumer.stop()
+        self.assertTrue(stream.cancelled)
+        self.assertEqual(consumer.get_batch(timeout=1), [])
+        self.assertTrue(consumer.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
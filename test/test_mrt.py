@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+import bz2
+import gzip
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+from pygobgp import MrtReader
+from pygobgp import PyGoBGP
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.decoder import decode_nlri
+from pygobgp.decoder import decode_pattrs
+from pygobgp.decoder import encode_nlri
+from pygobgp.mrt import BGP4MP
+from pygobgp.mrt import BGP4MP_ET
+from pygobgp.mrt import BGP4MP_MESSAGE
+from pygobgp.mrt import BGP4MP_MESSAGE_AS4
+from pygobgp.mrt import HEADER
+from pygobgp.mrt import PEER_INDEX_TABLE
+from pygobgp.mrt import RIB_IPV4_UNICAST
+from pygobgp.mrt import RIB_IPV4_UNICAST_ADDPATH
+from pygobgp.mrt import RIB_IPV6_UNICAST
+from pygobgp.mrt import TABLE_DUMP_V2
+from pygobgp.mrt import MrtError
+from pygobgp.mrt import PATHS
+from pygobgp.mrt import MrtWriter
+from pygobgp.mrt import Peer
+from pygobgp.mrt import encode_attribute
+from pygobgp.mrt import encode_path
+from pygobgp.mrt import iter_updates
+from pygobgp.mrt import parse_bgp4mp
+from pygobgp.mrt import RouteBatch
+from pygobgp.mrt import parse_parallel
+from pygobgp.mrt import parse_peer_index_table
+from pygobgp.mrt import parse_range
+from pygobgp.mrt import parse_rib
+from pygobgp.mrt import parse_update
+from pygobgp.mrt import split_records
+
+
+def as_path(*asns, **kwargs):
+    size = kwargs.get("size", 4)
+    fmt = ">BB" + ("L" if size == 4 else "H") * len(asns)
+    return encode_attribute(0x40, 2, struct.pack(fmt, 2, len(asns), *asns))
+
+
+def attributes(origin_as, next_hop="10.0.0.1", med=None):
+    attrs = [encode_attribute(0x40, 1, b"\x00"), as_path(65001, origin_as),
+             encode_attribute(0x40, 3, socket.inet_aton(next_hop))]
+    if med is not None:
+        attrs.append(encode_attribute(0x80, 4, struct.pack(">L", med)))
+    return b"".join(attrs)
+
+
+def attributes6(origin_as, next_hop="2001:db8::1"):
+    # TABLE_DUMP_V2 MP_REACH_NLRI: next hop length and next hop only
+    mp_reach = bytes([16]) + socket.inet_pton(socket.AF_INET6, next_hop)
+    return b"".join([encode_attribute(0x40, 1, b"\x00"), as_path(65001, origin_as),
+                     encode_attribute(0x80, 14, mp_reach)])
+
+
+def record(mrt_type, subtype, body, timestamp=1538352000):
+    return HEADER.pack(timestamp, mrt_type, subtype, len(body)) + body
+
+
+def peer_index_table(peers):
+    """peers: list of (bgp_id, address, asn, 4 byte asn)"""
+    parts = [socket.inet_aton("10.0.255.2"), struct.pack(">H", 4), b"view", struct.pack(">H", len(peers))]
+    for bgp_id, address, asn, as4 in peers:
+        ipv6 = ":" in address
+        parts.append(struct.pack(">B", (0x01 if ipv6 else 0) | (0x02 if as4 else 0)))
+        parts.append(socket.inet_aton(bgp_id))
+        parts.append(socket.inet_pton(socket.AF_INET6, address) if ipv6 else socket.inet_aton(address))
+        parts.append(struct.pack(">L" if as4 else ">H", asn))
+    return record(TABLE_DUMP_V2, PEER_INDEX_TABLE, b"".join(parts))
+
+
+def rib(sequence, prefix, entries, add_path=False):
+    """entries: list of (peer index, originated, path identifier, attributes)"""
+    ipv6 = ":" in prefix
+    parts = [struct.pack(">L", sequence), encode_nlri(prefix), struct.pack(">H", len(entries))]
+    for peer_index, originated, identifier, attrs in entries:
+        if add_path:
+            parts.append(struct.pack(">HLLH", peer_index, originated, identifier, len(attrs)))
+        else:
+            parts.append(struct.pack(">HLH", peer_index, originated, len(attrs)))
+        parts.append(attrs)
+    subtype = RIB_IPV4_UNICAST_ADDPATH if add_path else RIB_IPV6_UNICAST if ipv6 else RIB_IPV4_UNICAST
+    return record(TABLE_DUMP_V2, subtype, b"".join(parts))
+
+
+PEERS = [("10.0.0.1", "10.0.0.1", 65001, False), ("10.0.0.3", "2001:db8::2", 4200000000, True)]
+DUMP = b"".join([
+    peer_index_table(PEERS),
+    rib(0, "1.0.0.0/24", [(0, 1538300000, 0, attributes(3156, med=10)), (1, 1538300001, 0, attributes(9))]),
+    rib(1, "10.1.0.0/16", [(0, 1538300002, 0, attributes(64500))]),
+    # Other record types are skipped
+    record(16, 4, b"\x00" * 8),
+    rib(2, "2001:db8:bb7::/48", [(1, 1538300003, 0, attributes6(64501))]),
+    rib(3, "192.0.2.0/24", [(0, 1538300004, 7, attributes(64502)), (0, 1538300005, 8, attributes(64503))],
+        add_path=True),
+])
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_peer_index_table(self):
+        body = memoryview(peer_index_table(PEERS))[HEADER.size:]
+        self.assertEqual(parse_peer_index_table(body),
+                         [Peer("10.0.0.1", "10.0.0.1", 65001), Peer("10.0.0.3", "2001:db8::2", 4200000000)])
+
+    def test_parse_rib(self):
+        attrs = attributes(3156)
+        body = memoryview(rib(5, "10.1.0.0/16", [(0, 100, 0, attrs), (1, 200, 0, b"")]))[HEADER.size:]
+        nlri, entries = parse_rib(body)
+        self.assertEqual(decode_nlri(nlri), "10.1.0.0/16")
+        self.assertEqual([(index, originated, identifier, bytes(value)) for index, originated, identifier, value
+                          in entries], [(0, 100, 0, attrs), (1, 200, 0, b"")])
+
+    def test_parse_rib_add_path(self):
+        attrs = attributes(3156)
+        body = memoryview(rib(5, "10.1.0.0/16", [(1, 100, 9, attrs)], add_path=True))[HEADER.size:]
+        _, entries = parse_rib(body, add_path=True)
+        self.assertEqual([(index, identifier, bytes(value)) for index, _, identifier, value in entries],
+                         [(1, 9, attrs)])
+
+    def test_encode_path(self):
+        pattrs = [encode_attribute(0x40, 1, b"\x00"), as_path(65001, 3156)]
+        nlri = encode_nlri("1.0.0.0/24")
+        expected = gobgp.Path(nlri=nlri, pattrs=pattrs, family=IPV4_UNICAST, age=1538300000, source_asn=65001,
+                              source_id="10.0.0.1", neighbor_ip="10.0.0.1", identifier=7)
+        serialized = encode_path(nlri, pattrs, IPV4_UNICAST, age=1538300000, source_asn=65001,
+                                 source_id="10.0.0.1", neighbor_ip="10.0.0.1", identifier=7)
+        self.assertEqual(gobgp.Path.FromString(serialized), expected)
+        self.assertEqual(gobgp.Path.FromString(encode_path(nlri, pattrs, IPV4_UNICAST)),
+                         gobgp.Path(nlri=nlri, pattrs=pattrs, family=IPV4_UNICAST))
+
+
+class MrtReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        opener = bz2.open if name.endswith(".bz2") else gzip.open if name.endswith(".gz") else open
+        with opener(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_paths(self):
+        for name in ("rib.mrt", "rib.mrt.gz", "rib.mrt.bz2"):
+            with MrtReader(self.write(name, DUMP)) as reader:
+                paths = list(reader.paths())
+                self.assertEqual(reader.peers[1].address, "2001:db8::2")
+            routes = [(path.family, decode_nlri(path.nlri, ipv6=path.family == IPV6_UNICAST), path.neighbor_ip,
+                       path.source_asn, path.age, path.identifier, decode_pattrs(path.pattrs)[0])
+                      for path in paths]
+            self.assertEqual(routes, [
+                (IPV4_UNICAST, "1.0.0.0/24", "10.0.0.1", 65001, 1538300000, 0, [65001, 3156]),
+                (IPV4_UNICAST, "1.0.0.0/24", "2001:db8::2", 4200000000, 1538300001, 0, [65001, 9]),
+                (IPV4_UNICAST, "10.1.0.0/16", "10.0.0.1", 65001, 1538300002, 0, [65001, 64500]),
+                (IPV6_UNICAST, "2001:db8:bb7::/48", "2001:db8::2", 4200000000, 1538300003, 0, [65001, 64501]),
+                (IPV4_UNICAST, "192.0.2.0/24", "10.0.0.1", 65001, 1538300004, 7, [65001, 64502]),
+                (IPV4_UNICAST, "192.0.2.0/24", "10.0.0.1", 65001, 1538300005, 8, [65001, 64503]),
+            ], name)
+
+    def test_serialized_paths(self):
+        path = self.write("rib.mrt", DUMP)
+        with MrtReader(path) as reader:
+            expected = list(reader.paths())
+        with MrtReader(path) as reader:
+            serialized = list(reader.paths(serialized=True))
+        self.assertEqual([gobgp.Path.FromString(buf) for buf in serialized], expected)
+
+    def test_ipv6_mp_reach(self):
+        with MrtReader(self.write("rib.mrt", DUMP)) as reader:
+            path = [path for path in reader.paths() if path.family == IPV6_UNICAST][0]
+        mp_reach = [attr for attr in path.pattrs if attr[1] == 14][0]
+        # Full attribute: AFI, SAFI, next hop, reserved byte and the prefix of the record
+        next_hop = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+        self.assertEqual(mp_reach[3:],
+                         struct.pack(">HBB", 2, 1, 16) + next_hop + b"\x00" + encode_nlri("2001:db8:bb7::/48"))
+        self.assertEqual(decode_pattrs(path.pattrs)[1], "2001:db8::1")
+
+    def test_unknown_peer(self):
+        data = peer_index_table(PEERS[:1]) + rib(0, "1.0.0.0/24", [(3, 0, 0, attributes(1))])
+        with MrtReader(self.write("rib.mrt", data)) as reader:
+            with self.assertRaises(MrtError):
+                list(reader.paths())
+
+    def test_truncated(self):
+        with MrtReader(self.write("rib.mrt.gz", DUMP[:-3])) as reader:
+            with self.assertRaises(MrtError):
+                list(reader.paths())
+
+    def test_empty(self):
+        with MrtReader(self.write("rib.mrt", b"")) as reader:
+            self.assertEqual(list(reader.paths()), [])
+
+
+class GoBGP:
+    """GetServer and GetNeighbor of a GoBGP with two neighbors"""
+
+    def GetServer(self, request):
+        response = gobgp.GetServerResponse()
+        server = getattr(response, "global")
+        server.router_id = "10.0.255.2"
+        setattr(server, "as", 65000)
+        return response
+
+    def GetNeighbor(self, request):
+        return gobgp.GetNeighborResponse(peers=[
+            gobgp.Peer(conf=gobgp.PeerConf(neighbor_address="10.0.0.1", peer_as=65001, id="10.0.0.1")),
+            gobgp.Peer(conf=gobgp.PeerConf(neighbor_address="2001:db8::2", peer_as=4200000000, id="10.0.0.3")),
+        ])
+
+
+class MrtWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "source.mrt")
+        with open(path, "wb") as f:
+            f.write(DUMP)
+        with MrtReader(path) as reader:
+            # ADD-PATH entries are written without their path identifier
+            self.paths = [path for path in reader.paths() if not path.identifier]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        peers = [Peer(bgp_id, address, asn) for bgp_id, address, asn, _ in PEERS]
+        for name in ("rib.mrt", "rib.mrt.gz", "rib.mrt.bz2"):
+            path = os.path.join(self.directory, name)
+            with MrtWriter(path) as writer:
+                writer.write_peer_index_table("10.0.255.2", peers)
+                with MrtReader(os.path.join(self.directory, "source.mrt")) as reader:
+                    for ipv6, nlri, entries in reader.rib_entries():
+                        if ipv6:
+                            continue
+                        writer.write_rib(nlri, [(index, originated, bytes(attrs))
+                                                for index, originated, identifier, attrs in entries if not identifier])
+            with MrtReader(path) as reader:
+                self.assertEqual(list(reader.paths()), [p for p in self.paths if p.family == IPV4_UNICAST], name)
+                self.assertEqual(reader.peers, peers)
+
+    def test_dump_mrt(self):
+        client = PyGoBGP("127.0.0.1", coalesce=False)
+        client.stub = GoBGP()
+        client._get_path_raw = lambda request: (path.SerializeToString() for path in self.paths
+                                                if path.family == request.family)
+        path = os.path.join(self.directory, "dump.mrt.gz")
+        self.assertEqual(client.dump_mrt(path), len(self.paths))
+        with MrtReader(path) as reader:
+            paths = list(reader.paths())
+            self.assertEqual(reader.peers, [Peer("10.0.255.2", "0.0.0.0", 65000), Peer("10.0.0.1", "10.0.0.1", 65001),
+                                            Peer("10.0.0.3", "2001:db8::2", 4200000000)])
+        # Paths are written per family, IPv4 first, and keep their attributes, age and neighbor
+        expected = sorted(self.paths, key=lambda path: path.family)
+        self.assertEqual([(p.family, p.nlri, list(p.pattrs), p.age, p.neighbor_ip, p.source_asn) for p in paths],
+                         [(p.family, p.nlri, list(p.pattrs), p.age, p.neighbor_ip, p.source_asn) for p in expected])
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        records = [peer_index_table(PEERS)]
+        for index in range(200):
+            prefix = "10.{}.{}.0/24".format(index // 256, index % 256)
+            records.append(rib(index, prefix, [(index % 2, index, 0, attributes(index + 1))]))
+        self.path = os.path.join(self.directory, "rib.mrt")
+        with open(self.path, "wb") as f:
+            f.write(b"".join(records))
+        with MrtReader(self.path) as reader:
+            self.expected = [(decode_nlri(path.nlri), path.neighbor_ip, decode_pattrs(path.pattrs)[0])
+                             for path in reader.paths()]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def routes(self, batches):
+        return [(route["prefix"], route["neighbor"], route["as_path"])
+                for route in RouteBatch.concat(batches).routes()]
+
+    def test_split_records(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for chunks in (1, 4, 7, 1000):
+            ranges = split_records(data, chunks)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], len(data))
+            self.assertTrue(all(end == start for (_, end, _), (start, _, _) in zip(ranges, ranges[1:])))
+            batches = [parse_range(self.path, start, end, peers) for start, end, peers in ranges]
+            self.assertEqual(self.routes(batches), self.expected, chunks)
+
+    def test_parse_parallel(self):
+        batches = list(parse_parallel(self.path, workers=2, chunks=9))
+        self.assertEqual(self.routes(batches), self.expected)
+        self.assertEqual([batch.start for batch in batches], sorted(batch.start for batch in batches))
+
+    def test_parse_parallel_paths(self):
+        batches = list(parse_parallel(self.path, workers=1, chunks=3, output=PATHS))
+        with MrtReader(self.path) as reader:
+            expected = list(reader.paths(serialized=True))
+        self.assertEqual([path for batch in batches for path in batch.paths], expected)
+
+    def test_compressed(self):
+        path = self.path + ".gz"
+        with open(self.path, "rb") as source, gzip.open(path, "wb") as f:
+            f.write(source.read())
+        batches = list(parse_parallel(path, batch_records=50))
+        # batch_records counts records, the PEER_INDEX_TABLE included
+        self.assertEqual([len(batch) for batch in batches], [49, 50, 50, 50, 1])
+        self.assertEqual(self.routes(batches), self.expected)
+
+
+def update(nlri=(), withdrawn=(), attrs=b""):
+    """UPDATE message body (no BGP header)"""
+    withdrawn = b"".join(encode_nlri(prefix) for prefix in withdrawn)
+    nlri = b"".join(encode_nlri(prefix) for prefix in nlri)
+    return struct.pack(">H", len(withdrawn)) + withdrawn + struct.pack(">H", len(attrs)) + attrs + nlri
+
+
+def bgp4mp(subtype, message, peer_asn=65001, peer="10.0.0.1", local="10.0.0.2", microseconds=None):
+    ipv6 = ":" in peer
+    family = socket.AF_INET6 if ipv6 else socket.AF_INET
+    asn = ">LLHH" if subtype == BGP4MP_MESSAGE_AS4 else ">HHHH"
+    body = struct.pack(asn, peer_asn, 65000, 0, 2 if ipv6 else 1)
+    body += socket.inet_pton(family, peer) + socket.inet_pton(family, local)
+    body += b"\xff" * 16 + struct.pack(">HB", 19 + len(message), 2) + message
+    if microseconds is None:
+        return record(BGP4MP, subtype, body, timestamp=1538352000)
+    return record(BGP4MP_ET, subtype, struct.pack(">L", microseconds) + body, timestamp=1538352000)
+
+
+class UpdateTest(unittest.TestCase):
+
+    def test_ipv4(self):
+        attrs = attributes(3156, med=5)
+        announced, withdrawn = parse_update(update(["1.0.0.0/24", "10.0.0.0/8"], ["192.0.2.0/24"], attrs))
+        self.assertEqual([(family, decode_nlri(nlri)) for family, nlri, _ in announced],
+                         [(IPV4_UNICAST, "1.0.0.0/24"), (IPV4_UNICAST, "10.0.0.0/8")])
+        self.assertEqual(b"".join(announced[0][2]), attrs)
+        self.assertEqual(decode_pattrs(announced[0][2]), ([65001, 3156], "10.0.0.1", None, 5))
+        self.assertEqual([(family, decode_nlri(nlri)) for family, nlri in withdrawn],
+                         [(IPV4_UNICAST, "192.0.2.0/24")])
+
+    def test_ipv6(self):
+        next_hop = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+        nlri = encode_nlri("2001:db8:1::/48") + encode_nlri("2001:db8:2::/48")
+        mp_reach = struct.pack(">HBB", 2, 1, 16) + next_hop + b"\x00" + nlri
+        mp_unreach = struct.pack(">HB", 2, 1) + encode_nlri("2001:db8:3::/48")
+        attrs = b"".join([encode_attribute(0x40, 1, b"\x00"), as_path(65001, 64500),
+                          encode_attribute(0x80, 14, mp_reach), encode_attribute(0x80, 15, mp_unreach)])
+        announced, withdrawn = parse_update(update(attrs=attrs))
+        self.assertEqual([(family, decode_nlri(nlri, ipv6=True)) for family, nlri, _ in announced],
+                         [(IPV6_UNICAST, "2001:db8:1::/48"), (IPV6_UNICAST, "2001:db8:2::/48")])
+        # Each prefix gets an MP_REACH_NLRI of its own, MP_UNREACH_NLRI is not an attribute of the paths
+        pattrs = announced[1][2]
+        self.assertEqual([attr[1] for attr in pattrs], [1, 2, 14])
+        self.assertEqual(pattrs[2][3:], struct.pack(">HBB", 2, 1, 16) + next_hop + b"\x00" +
+                         encode_nlri("2001:db8:2::/48"))
+        self.assertEqual(decode_pattrs(pattrs)[:2], ([65001, 64500], "2001:db8::1"))
+        self.assertEqual([(family, decode_nlri(nlri, ipv6=True)) for family, nlri in withdrawn],
+                         [(IPV6_UNICAST, "2001:db8:3::/48")])
+
+    def test_other_families_ignored(self):
+        mp_reach = struct.pack(">HBB", 1, 128, 4) + socket.inet_aton("10.0.0.1") + b"\x00" + b"\x58" + b"\x00" * 11
+        attrs = encode_attribute(0x40, 1, b"\x00") + encode_attribute(0x80, 14, mp_reach)
+        self.assertEqual(parse_update(update(attrs=attrs)), ([], []))
+
+    def test_as4_merge(self):
+        # 2 byte speaker: AS_TRANS (23456) in AS_PATH, the real ASNs in AS4_PATH
+        attrs = b"".join([encode_attribute(0x40, 1, b"\x00"), as_path(65010, 65001, 23456, 23456, size=2),
+                          encode_attribute(0xc0, 17, struct.pack(">BBLL", 2, 2, 4200000001, 4200000002)),
+                          encode_attribute(0x40, 3, socket.inet_aton("10.0.0.1"))])
+        announced, _ = parse_update(update(["1.0.0.0/24"], attrs=attrs), as4=False)
+        pattrs = announced[0][2]
+        self.assertEqual(decode_pattrs(pattrs)[0], [65010, 65001, 4200000001, 4200000002])
+        self.assertNotIn(17, [attr[1] for attr in pattrs])
+
+    def test_as4_path_longer_than_as_path(self):
+        # Invalid AS4_PATH (RFC 6793 4.2.3): ignored
+        attrs = b"".join([as_path(65010, size=2),
+                          encode_attribute(0xc0, 17, struct.pack(">BBLL", 2, 2, 4200000001, 4200000002))])
+        announced, _ = parse_update(update(["1.0.0.0/24"], attrs=attrs), as4=False)
+        self.assertEqual(decode_pattrs(announced[0][2])[0], [65010])
+
+    def test_2_byte_as_path_without_as4_path(self):
+        announced, _ = parse_update(update(["1.0.0.0/24"], attrs=as_path(65010, 3156, size=2)), as4=False)
+        self.assertEqual(decode_pattrs(announced[0][2])[0], [65010, 3156])
+
+    def test_parse_bgp4mp(self):
+        message = update(["1.0.0.0/24"], attrs=attributes(3156))
+        body = memoryview(bgp4mp(BGP4MP_MESSAGE_AS4, message, peer_asn=4200000000))[HEADER.size:]
+        peer_asn, peer, bgp = parse_bgp4mp(body, BGP4MP_MESSAGE_AS4)
+        self.assertEqual((peer_asn, peer, bytes(bgp[19:])), (4200000000, "10.0.0.1", message))
+        body = memoryview(bgp4mp(BGP4MP_MESSAGE, message, peer="2001:db8::2", local="2001:db8::1"))[HEADER.size:]
+        self.assertEqual(parse_bgp4mp(body, BGP4MP_MESSAGE)[:2], (65001, "2001:db8::2"))
+        body = memoryview(bgp4mp(BGP4MP_MESSAGE, message, microseconds=250000))[HEADER.size:]
+        self.assertEqual(parse_bgp4mp(body, BGP4MP_MESSAGE, extended=True)[:2], (65001, "10.0.0.1"))
+
+    def test_iter_updates(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "updates.mrt")
+            as2 = as_path(65010, 23456, size=2) + encode_attribute(0xc0, 17, struct.pack(">BBL", 2, 1, 4200000001))
+            with open(path, "wb") as f:
+                f.write(peer_index_table(PEERS))
+                f.write(bgp4mp(BGP4MP_MESSAGE_AS4, update(["1.0.0.0/24"], attrs=attributes(3156))))
+                f.write(bgp4mp(BGP4MP_MESSAGE, update(["10.0.0.0/8"], attrs=as2), peer_asn=65010,
+                               microseconds=500000))
+                # KEEPALIVE
+                f.write(record(BGP4MP, BGP4MP_MESSAGE_AS4, struct.pack(">LLHH", 65001, 65000, 0, 1) + b"\x00" * 8 +
+                               b"\xff" * 16 + struct.pack(">HB", 19, 4)))
+                f.write(bgp4mp(BGP4MP_MESSAGE_AS4, update(withdrawn=["1.0.0.0/24"])))
+            with MrtReader(path) as reader:
+                updates = list(iter_updates(reader))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([(u.timestamp, u.peer_asn, u.peer_address, len(u.announced), len(u.withdrawn))
+                          for u in updates],
+                         [(1538352000, 65001, "10.0.0.1", 1, 0), (1538352000.5, 65010, "10.0.0.1", 1, 0),
+                          (1538352000, 65001, "10.0.0.1", 0, 1)])
+        self.assertEqual(decode_pattrs(updates[1].announced[0][2])[0], [65010, 4200000001])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.errors import InvalidNeighborConfig
+from pygobgp.pygobgp import Neighbor
+
+
+# Parameters covering every optional Peer sub-message
+FULL = dict(
+    local_address="10.0.255.1", neighbor_address="10.0.255.2", local_as=65001, peer_as=65001,
+    transport_address="10.0.255.3", router_id="10.0.255.1", auth_password="secret", description="core",
+    families=["ipv4-unicast", IPV6_UNICAST], passive_mode=True, remote_port=1179, hold_time=9,
+    keepalive_interval=3, connect_retry=5, minimum_advertisement_interval=1, graceful_restart=True,
+    graceful_restart_time=120, graceful_restart_helper_only=True, graceful_restart_deferral_time=60,
+    long_lived_graceful_restart=True, route_reflector_client=True, route_reflector_cluster_id="10.0.0.1",
+    route_server_client=True, add_paths_receive=True, add_paths_send_max=4,
+    prefix_limits={IPV4_UNICAST: (1000, 80), IPV6_UNICAST: 500},
+)
+
+
+def expected_request(neighbor):
+    return gobgp.AddNeighborRequest(peer=neighbor._create_peer()).SerializeToString()
+
+
+class NeighborTest(unittest.TestCase):
+
+    def test_serialized_request(self):
+        for params in (dict(local_address="10.0.255.1", neighbor_address="10.0.255.2", local_as=65001,
+                            peer_as=65002), FULL):
+            neighbor = Neighbor(**params)
+            self.assertEqual(neighbor.serialized_request, expected_request(neighbor))
+            self.assertEqual(gobgp.AddNeighborRequest.FromString(neighbor.serialized_request).peer, neighbor.peer)
+            # Cached
+            self.assertIs(neighbor.serialized_request, neighbor.serialized_request)
+
+    def test_peer(self):
+        neighbor = Neighbor(**FULL)
+        peer = neighbor.peer
+        self.assertIs(neighbor.peer, peer)
+        self.assertEqual(peer.conf.neighbor_address, "10.0.255.2")
+        self.assertEqual(list(peer.families), [IPV4_UNICAST, IPV6_UNICAST])
+        self.assertEqual(neighbor.neighbor_address, "10.0.255.2")
+
+    def test_derive(self):
+        template = Neighbor(**FULL)
+        before = template.serialized_request
+        changes = [dict(neighbor_address="10.0.255.4"), dict(peer_as=65001, hold_time=30, keepalive_interval=10),
+                   dict(families=[IPV4_UNICAST], prefix_limits={}), dict(local_address="10.0.255.5"),
+                   dict(graceful_restart=False, graceful_restart_helper_only=False, long_lived_graceful_restart=False),
+                   dict(route_server_client=False, add_paths_send_max=0, description="edge")]
+        for change in changes:
+            derived = template.derive(**change)
+            params = dict(FULL, **change)
+            if "local_address" in change:
+                params.update(router_id=change["local_address"])
+            self.assertEqual(derived.serialized_request, expected_request(Neighbor(**params)), change)
+        # The template is not changed
+        self.assertEqual(template.serialized_request, before)
+        self.assertEqual(template.serialized_request, expected_request(Neighbor(**FULL)))
+
+    def test_derive_from_derived(self):
+        template = Neighbor(**FULL)
+        derived = template.derive(neighbor_address="10.0.255.4").derive(peer_as=65001, description="edge")
+        self.assertEqual(derived.serialized_request, expected_request(
+            Neighbor(**dict(FULL, neighbor_address="10.0.255.4", description="edge"))))
+        self.assertEqual(template.serialized_request, expected_request(Neighbor(**FULL)))
+
+    def test_derive_follows_local_address(self):
+        neighbor = Neighbor(local_address="10.0.255.1", neighbor_address="10.0.255.2", local_as=65001, peer_as=65002)
+        derived = neighbor.derive(local_address="10.0.255.5")
+        self.assertEqual(derived.peer.transport.local_address, "10.0.255.5")
+        self.assertEqual(neighbor.peer.transport.local_address, "10.0.255.1")
+
+    def test_derive_invalid(self):
+        template = Neighbor(**FULL)
+        with self.assertRaises(InvalidNeighborConfig):
+            template.derive(unknown=1)
+        with self.assertRaises(InvalidNeighborConfig):
+            template.derive(hold_time=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
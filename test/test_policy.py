@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import random
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.policy import PrefixSetManager
+from pygobgp.policy import compact_prefixes
+from pygobgp.policy import prefix_entry
+
+
+class Client:
+    """GoBGP holding prefix DefinedSets, name -> set of entries"""
+
+    def __init__(self, sets=None):
+        self.sets = sets or {}
+        self.calls = []
+
+    @staticmethod
+    def entries(defined_set):
+        return set(prefix_entry(prefix) for prefix in defined_set.prefixes)
+
+    def get_defined_sets(self, defined_type=gobgp.PREFIX, name=""):
+        self.calls.append(("get", name, 0))
+        return [gobgp.DefinedSet(type=defined_type, name=set_name, prefixes=[
+            gobgp.Prefix(ip_prefix=ip_prefix, mask_length_min=low, mask_length_max=high)
+            for ip_prefix, low, high in entries]) for set_name, entries in self.sets.items() if set_name == name]
+
+    def add_defined_set(self, defined_set):
+        self.calls.append(("add", defined_set.name, len(defined_set.prefixes)))
+        self.sets.setdefault(defined_set.name, set()).update(self.entries(defined_set))
+
+    def delete_defined_set(self, defined_set, all=False):
+        self.calls.append(("delete_all" if all else "delete", defined_set.name, len(defined_set.prefixes)))
+        if all:
+            del self.sets[defined_set.name]
+        else:
+            self.sets[defined_set.name].difference_update(self.entries(defined_set))
+
+    def replace_defined_set(self, defined_set):
+        self.calls.append(("replace", defined_set.name, len(defined_set.prefixes)))
+        self.sets[defined_set.name] = self.entries(defined_set)
+
+
+def prefixes(start, count):
+    return ["10.{}.{}.0/24".format(i // 256, i % 256) for i in range(start, start + count)]
+
+
+class PrefixSetManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client({"customers": set(prefix_entry(prefix) for prefix in prefixes(0, 100)),
+                              "other": {("192.168.0.0/16", 16, 24)}})
+        self.manager = PrefixSetManager(self.client, "customers", batch_size=30)
+
+    def test_prefix_entry(self):
+        self.assertEqual(prefix_entry("10.0.0.0/8"), ("10.0.0.0/8", 8, 8))
+        self.assertEqual(prefix_entry(("10.0.0.0/8", 16, 24)), ("10.0.0.0/8", 16, 24))
+        self.assertEqual(prefix_entry(gobgp.Prefix(ip_prefix="2001:db8::/32")), ("2001:db8::/32", 32, 32))
+        for entry in (("10.0.0.0/8", 4, 8), ("10.0.0.0/8", 24, 16), ("10.0.0.0/8", 8, 33), "10.0.0.1/8"):
+            with self.assertRaises(ValueError):
+                prefix_entry(entry)
+
+    def test_diff(self):
+        delta, desired = self.manager.diff(prefixes(10, 100))
+        self.assertEqual(delta.added, set(prefix_entry(prefix) for prefix in prefixes(100, 10)))
+        self.assertEqual(delta.removed, set(prefix_entry(prefix) for prefix in prefixes(0, 10)))
+        self.assertFalse(delta.created)
+        self.assertEqual(len(desired), 100)
+        # Fetched once, nothing applied
+        self.manager.diff(prefixes(0, 5))
+        self.assertEqual(self.client.calls, [("get", "customers", 0)])
+
+    def test_sync_batches(self):
+        self.manager.batch_size = 15
+        delta = self.manager.sync(prefixes(20, 100))
+        self.assertEqual((len(delta.added), len(delta.removed), delta.replaced, delta.requests), (20, 20, False, 4))
+        # Added before removed, batch_size entries at most per request
+        self.assertEqual(self.client.calls[1:], [("add", "customers", 15), ("add", "customers", 5),
+                                                 ("delete", "customers", 15), ("delete", "customers", 5)])
+        self.assertEqual(self.client.sets["customers"], set(prefix_entry(prefix) for prefix in prefixes(20, 100)))
+        # Tracked: nothing to do, nothing sent
+        delta = self.manager.sync(prefixes(20, 100))
+        self.assertTrue(delta.empty)
+        self.assertEqual(delta.requests, 0)
+        self.assertEqual(len(self.client.calls), 5)
+
+    def test_replace_ratio(self):
+        # 60 changes for 100 entries is over the 0.5 default ratio
+        delta = self.manager.sync(prefixes(30, 100))
+        self.assertTrue(delta.replaced)
+        self.assertEqual(self.client.calls[1:], [("replace", "customers", 100)])
+        self.assertEqual(self.client.sets["customers"], set(prefix_entry(prefix) for prefix in prefixes(30, 100)))
+        manager = PrefixSetManager(Client(dict(self.client.sets)), "customers", replace_ratio=0.7)
+        self.assertFalse(manager.sync(prefixes(0, 100)).replaced)
+        self.assertEqual(manager.client.sets["customers"], set(prefix_entry(prefix) for prefix in prefixes(0, 100)))
+
+    def test_create(self):
+        manager = PrefixSetManager(self.client, "new", batch_size=30)
+        delta = manager.sync(prefixes(0, 50))
+        self.assertTrue(delta.created)
+        self.assertFalse(delta.replaced)
+        self.assertEqual(self.client.calls[1:], [("add", "new", 30), ("add", "new", 20)])
+        self.assertEqual(len(self.client.sets["new"]), 50)
+
+    def test_empty(self):
+        delta = self.manager.sync([])
+        self.assertEqual(len(delta.removed), 100)
+        self.assertEqual(self.client.calls[1:], [("delete_all", "customers", 0)])
+        self.assertNotIn("customers", self.client.sets)
+        self.assertIn("other", self.client.sets)
+
+    def test_dry_run(self):
+        delta = self.manager.sync(prefixes(50, 10), dry_run=True)
+        self.assertEqual((len(delta.added), len(delta.removed)), (0, 90))
+        self.assertEqual(len(self.client.sets["customers"]), 100)
+        self.assertEqual(self.client.calls, [("get", "customers", 0)])
+
+    def test_compact(self):
+        delta = self.manager.sync(prefixes(0, 256), compact=True)
+        self.assertEqual(delta.added, {("10.0.0.0/16", 24, 24)})
+        self.assertEqual(self.client.sets["customers"], {("10.0.0.0/16", 24, 24)})
+
+
+def matched(entries):
+    """Every route (as ip_network) matched by a prefix set of entries"""
+    routes = set()
+    for ip_prefix, low, high in map(prefix_entry, entries):
+        network = ipaddress.ip_network(ip_prefix)
+        for length in range(low, high + 1):
+            routes.update(network.subnets(new_prefix=length))
+    return routes
+
+
+class CompactPrefixesTest(unittest.TestCase):
+
+    def random_entry(self, rng, base):
+        network = ipaddress.ip_network(base)
+        length = rng.randint(network.prefixlen, network.prefixlen + 6)
+        value = int(network.network_address) | rng.getrandbits(length - network.prefixlen) << (
+            network.max_prefixlen - length)
+        low = rng.randint(length, network.prefixlen + 8)
+        high = rng.randint(low, network.prefixlen + 8)
+        return str(ipaddress.ip_network((value, length))), low, high
+
+    def test_brute_force(self):
+        rng = random.Random(36)
+        for _ in range(200):
+            entries = [self.random_entry(rng, rng.choice(["10.0.0.0/16", "10.0.0.0/16", "2001:db8::/32"]))
+                       for _ in range(rng.randint(1, 40))]
+            compacted = compact_prefixes(entries)
+            self.assertEqual(matched(compacted), matched(entries), entries)
+            self.assertLessEqual(len(compacted), len(set(entries)))
+            self.assertEqual(compact_prefixes(compacted), compacted)
+            self.assertEqual(compacted, sorted(compacted, key=lambda entry: (
+                ipaddress.ip_network(entry[0]).version, ipaddress.ip_network(entry[0]).network_address,
+                ipaddress.ip_network(entry[0]).prefixlen, entry[1], entry[2])))
+
+    def test_siblings(self):
+        self.assertEqual(compact_prefixes(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.0/24"]), [("10.0.0.0/24", 24, 25)])
+        self.assertEqual(compact_prefixes(["10.0.{}.0/24".format(i) for i in range(256)]), [("10.0.0.0/16", 24, 24)])
+        # Not siblings: 10.0.1.0/24 and 10.0.2.0/24 have different parents
+        self.assertEqual(compact_prefixes(["10.0.1.0/24", "10.0.2.0/24"]),
+                         [("10.0.1.0/24", 24, 24), ("10.0.2.0/24", 24, 24)])
+
+    def test_covered(self):
+        self.assertEqual(compact_prefixes([("10.0.0.0/8", 8, 24), ("10.1.0.0/16", 16, 20), "10.1.0.0/16"]),
+                         [("10.0.0.0/8", 8, 24)])
+        # Ranges not consecutive stay apart
+        self.assertEqual(compact_prefixes([("10.0.0.0/8", 8, 10), ("10.0.0.0/8", 12, 14)]),
+                         [("10.0.0.0/8", 8, 10), ("10.0.0.0/8", 12, 14)])
+
+    def test_split_ranges(self):
+        # Per length collapsing gives 3 entries: 10.0.0.0/17 17..19 and 23..24, 10.0.0.0/16 20..22
+        entries = [("10.0.128.0/17", 20, 22), ("10.0.0.0/17", 17, 24)]
+        self.assertEqual(compact_prefixes(entries), sorted(entries))
+
+    def test_empty(self):
+        self.assertEqual(compact_prefixes([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import random
+import socket
+import struct
+import unittest
+
+from pygobgp import LOOKUP_EXACT
+from pygobgp import LOOKUP_LONGER
+from pygobgp import LOOKUP_SHORTER
+from pygobgp import PyGoBGP
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.decoder import encode_nlri
+from pygobgp.mrt import encode_attribute
+
+
+def attributes(origin_as):
+    return [encode_attribute(0x40, 1, b"\x00"),
+            encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65001, origin_as)),
+            encode_attribute(0x40, 3, socket.inet_aton("10.0.0.1"))]
+
+
+def random_prefix(rng):
+    length = rng.randint(4, 28)
+    network = rng.getrandbits(32) >> (32 - length) << (32 - length)
+    return str(ipaddress.ip_network((network, length)))
+
+
+def matches(prefix, destination):
+    """Whether GoBGP returns prefix when looking up destination"""
+    network, wanted = ipaddress.ip_network(prefix), ipaddress.ip_network(destination.prefix)
+    if destination.longer_prefixes:
+        return network.subnet_of(wanted)
+    if destination.shorter_prefixes:
+        return wanted.subnet_of(network)
+    return network == wanted
+
+
+class Stub:
+    """GobgpApi stub of a GoBGP global table, prefix -> origin AS"""
+
+    def __init__(self, table):
+        self.table = table
+        self.requests = []
+
+    def GetRib(self, request):
+        self.requests.append(request)
+        destinations = request.table.destinations
+        table = gobgp.Table(type=gobgp.GLOBAL, family=request.table.family)
+        for prefix, asn in self.table.items():
+            if not destinations or any(matches(prefix, destination) for destination in destinations):
+                table.destinations.add(prefix=prefix, paths=[gobgp.Path(pattrs=attributes(asn), best=True)])
+        return gobgp.GetRibResponse(table=table)
+
+    def GetPath(self, request):
+        self.requests.append(request)
+        lookups = [gobgp.Destination(prefix=lookup.prefix,
+                                     longer_prefixes=lookup.lookup_option == LOOKUP_LONGER,
+                                     shorter_prefixes=lookup.lookup_option == LOOKUP_SHORTER)
+                   for lookup in request.prefixes]
+        for prefix, asn in self.table.items():
+            if not lookups or any(matches(prefix, lookup) for lookup in lookups):
+                yield gobgp.Path(nlri=encode_nlri(prefix), pattrs=attributes(asn), best=True, neighbor_ip="10.0.0.2")
+
+
+def origins(routes):
+    return {route["prefix"]: route["as_path"][-1] for route in routes}
+
+
+class PyGoBGPTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(31)
+        self.table = {prefix: rng.randint(1, 100) for prefix in (random_prefix(rng) for _ in range(300))
+                      if not ipaddress.ip_network(prefix).overlaps(ipaddress.ip_network("10.0.0.0/8"))}
+        self.table.update({"0.0.0.0/0": 1, "10.0.0.0/8": 2, "10.1.0.0/16": 3, "10.1.2.0/24": 4, "10.2.0.0/16": 5})
+        self.gobgp = PyGoBGP("127.0.0.1")
+        self.stub = self.gobgp.stub = Stub(self.table)
+
+    def tearDown(self):
+        self.gobgp.close()
+
+    def expected(self, prefixes, lookup):
+        destinations = [gobgp.Destination(prefix=prefix, longer_prefixes=lookup == LOOKUP_LONGER,
+                                          shorter_prefixes=lookup == LOOKUP_SHORTER) for prefix in prefixes]
+        return {prefix: asn for prefix, asn in self.table.items()
+                if any(matches(prefix, destination) for destination in destinations)}
+
+
+class LookupTest(PyGoBGPTestCase):
+
+    def test_get_rib_request(self):
+        for lookup, flags in ((LOOKUP_EXACT, (False, False)), (LOOKUP_LONGER, (True, False)),
+                              (LOOKUP_SHORTER, (False, True))):
+            request = PyGoBGP._get_rib_request(["10.0.0.0/8", "11.0.0.0/8"], lookup)
+            self.assertEqual(request.table.family, 65537)
+            self.assertEqual([(destination.prefix, destination.longer_prefixes, destination.shorter_prefixes)
+                              for destination in request.table.destinations],
+                             [("10.0.0.0/8",) + flags, ("11.0.0.0/8",) + flags])
+        self.assertEqual(len(PyGoBGP._get_rib_request().table.destinations), 0)
+
+    def test_get_rib(self):
+        self.assertEqual(origins(self.gobgp.get_rib()), self.table)
+        for lookup in (LOOKUP_EXACT, LOOKUP_LONGER, LOOKUP_SHORTER):
+            routes = self.gobgp.get_rib(prefixes=["10.1.0.0/16", "10.2.0.0/16"], lookup=lookup)
+            self.assertEqual(origins(routes), self.expected(["10.1.0.0/16", "10.2.0.0/16"], lookup), lookup)
+        self.assertEqual(origins(self.gobgp.get_rib(prefixes=["10.1.0.0/16"], lookup=LOOKUP_LONGER)),
+                         {"10.1.0.0/16": 3, "10.1.2.0/24": 4})
+        self.assertEqual(origins(self.gobgp.get_rib(prefixes=["10.1.2.0/24"], lookup=LOOKUP_SHORTER)),
+                         {"0.0.0.0/0": 1, "10.0.0.0/8": 2, "10.1.0.0/16": 3, "10.1.2.0/24": 4})
+
+    def test_lookup_prefixes(self):
+        prefixes = sorted(self.table)[::3] + ["10.1.0.0/16", "10.0.0.0/8"]
+        for lookup in (LOOKUP_EXACT, LOOKUP_LONGER, LOOKUP_SHORTER):
+            routes = self.gobgp.lookup_prefixes(prefixes, lookup=lookup, batch_size=10)
+            # Routes matching several batches are returned once
+            self.assertEqual(len(routes), len(origins(routes)))
+            self.assertEqual(origins(routes), self.expected(prefixes, lookup), lookup)
+            self.assertEqual(len(self.stub.requests), (len(prefixes) + 9) // 10)
+            self.assertTrue(all(len(request.table.destinations) <= 10 for request in self.stub.requests))
+            del self.stub.requests[:]
+        self.assertEqual(self.gobgp.lookup_prefixes([]), [])
+
+    def test_iter_paths(self):
+        for lookup in (LOOKUP_EXACT, LOOKUP_LONGER, LOOKUP_SHORTER):
+            paths = list(self.gobgp.iter_paths(prefixes=["10.1.0.0/16"], lookup=lookup))
+            self.assertEqual(origins(paths), self.expected(["10.1.0.0/16"], lookup), lookup)
+            request = self.stub.requests[-1]
+            self.assertEqual([(prefix.prefix, prefix.lookup_option) for prefix in request.prefixes],
+                             [("10.1.0.0/16", lookup)])
+        paths = list(self.gobgp.iter_paths())
+        self.assertEqual(origins(paths), self.table)
+        self.assertTrue(all(path["best"] and path["neighbor"] == "10.0.0.2" for path in paths))
+
+
+class PartitionTest(PyGoBGPTestCase):
+
+    def check(self, routes, partitions):
+        # In prefix order: network address, then prefix length
+        self.assertEqual([route["prefix"] for route in routes], sorted(self.table, key=lambda prefix: (
+            ipaddress.ip_network(prefix).network_address, ipaddress.ip_network(prefix).prefixlen)))
+        self.assertEqual(origins(routes), self.table)
+        # One LOOKUP_LONGER request per partition, one LOOKUP_SHORTER request for all of them
+        self.assertEqual(len(self.stub.requests), partitions + 1)
+
+    def test_partitions(self):
+        for partitions in (2, 4, 16, 64):
+            self.check(self.gobgp.get_rib(partitions=partitions), partitions)
+            del self.stub.requests[:]
+        self.check(self.gobgp.get_rib(partitions=8, max_workers=2), 8)
+
+    def test_raw(self):
+        self.gobgp._get_rib_raw = lambda request: self.stub.GetRib(request).SerializeToString()
+        self.check(self.gobgp.get_rib(partitions=16, raw=True), 16)
+
+    def test_requests(self):
+        self.gobgp.get_rib(partitions=4)
+        lookups = sorted((destination.prefix, destination.longer_prefixes, destination.shorter_prefixes)
+                         for request in self.stub.requests for destination in request.table.destinations)
+        self.assertEqual(lookups, sorted([(cover, True, False) for cover in
+                                          ("0.0.0.0/2", "64.0.0.0/2", "128.0.0.0/2", "192.0.0.0/2")] +
+                                         [(cover, False, True) for cover in
+                                          ("0.0.0.0/2", "64.0.0.0/2", "128.0.0.0/2", "192.0.0.0/2")]))
+
+    def test_prefixes(self):
+        # Partitions are ignored with prefixes
+        self.assertEqual(origins(self.gobgp.get_rib(prefixes=["10.1.0.0/16"], partitions=4)), {"10.1.0.0/16": 3})
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_invalid(self):
+        for partitions in (3, 12, 1 << 17):
+            with self.assertRaises(ValueError):
+                self.gobgp.get_rib(partitions=partitions)
+
+
+if __name__ == "__main__":
+    unittest.main()
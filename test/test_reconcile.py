@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pygobgp import Neighbor
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.errors import InvalidNeighborConfig
+from pygobgp.reconcile import diff_peer
+from pygobgp.reconcile import plan
+
+
+def neighbor(**kwargs):
+    params = dict(local_address="10.0.255.1", neighbor_address="10.0.255.2", local_as=65000, peer_as=65001)
+    params.update(kwargs)
+    return Neighbor(**params)
+
+
+def current_peer(desired, **changes):
+    """Peer as GoBGP would report it: a copy of desired with changes applied"""
+    peer = gobgp.Peer()
+    peer.CopyFrom(desired.peer)
+    for path, value in changes.items():
+        message, field = path.rsplit(".", 1)
+        target = peer
+        for name in message.split("."):
+            target = getattr(target, name)
+        setattr(target, field, value)
+    return peer
+
+
+class DiffPeerTest(unittest.TestCase):
+
+    def test_identical(self):
+        desired = neighbor(families=["ipv4-unicast", "ipv6-unicast"], prefix_limits={"ipv4-unicast": 100})
+        self.assertEqual(diff_peer(current_peer(desired), desired.peer), {})
+
+    def test_required_field(self):
+        desired = neighbor()
+        changes = diff_peer(current_peer(desired, **{"conf.peer_as": 65002}), desired.peer)
+        self.assertEqual(changes, {"conf.peer_as": (65002, 65001)})
+
+    def test_flag_turned_off(self):
+        desired = neighbor()
+        for path in ("transport.passive_mode", "route_server.route_server_client",
+                     "graceful_restart.enabled", "add_paths.config.receive"):
+            changes = diff_peer(current_peer(desired, **{path: True}), desired.peer)
+            self.assertEqual(changes, {path: (True, False)})
+
+    def test_route_reflector_client_turned_off(self):
+        desired = neighbor(peer_as=65000)
+        changes = diff_peer(current_peer(desired, **{"route_reflector.route_reflector_client": True}), desired.peer)
+        self.assertEqual(changes, {"route_reflector.route_reflector_client": (True, False)})
+
+    def test_optional_field_left_to_default(self):
+        desired = neighbor()
+        current = current_peer(desired, **{"timers.config.hold_time": 90, "transport.remote_port": 179})
+        self.assertEqual(diff_peer(current, desired.peer), {})
+
+    def test_optional_field_set(self):
+        desired = neighbor(hold_time=30)
+        changes = diff_peer(current_peer(desired, **{"timers.config.hold_time": 90}), desired.peer)
+        self.assertEqual(changes, {"timers.config.hold_time": (90, 30)})
+
+    def test_families(self):
+        desired = neighbor(families=["ipv4-unicast", "ipv6-unicast"])
+        current = current_peer(neighbor(families=["ipv6-unicast", "ipv4-unicast"]))
+        self.assertEqual(diff_peer(current, desired.peer), {})
+        current = current_peer(neighbor())
+        self.assertEqual(diff_peer(current, desired.peer), {"afi_safis": ((65537,), (65537, 131073))})
+
+    def test_prefix_limits(self):
+        families = ["ipv4-unicast", "ipv6-unicast"]
+        desired = neighbor(families=families, prefix_limits={"ipv4-unicast": 100, "ipv6-unicast": (50, 80)})
+        current = current_peer(desired)
+        del current.conf.prefix_limits[:]
+        current.conf.prefix_limits.extend(reversed(desired.peer.conf.prefix_limits))
+        self.assertEqual(diff_peer(current, desired.peer), {})
+        current = current_peer(neighbor(families=families))
+        self.assertEqual(diff_peer(current, desired.peer),
+                         {"conf.prefix_limits": ((), ((65537, 100, 0), (131073, 50, 80)))})
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_plan(self):
+        unchanged = neighbor()
+        changed = neighbor(neighbor_address="10.0.255.3")
+        added = neighbor(neighbor_address="10.0.255.4")
+        current = [current_peer(unchanged), current_peer(changed, **{"conf.peer_as": 65009}),
+                   current_peer(neighbor(neighbor_address="10.0.255.5"))]
+        result = plan(current, [unchanged, changed, added])
+        self.assertEqual(result.add, [added])
+        self.assertEqual(result.delete, ["10.0.255.5"])
+        self.assertEqual([(n, list(c)) for n, c in result.update], [(changed, ["conf.peer_as"])])
+        self.assertEqual(result.unchanged, ["10.0.255.2"])
+        self.assertIsNone(added._peer)
+
+    def test_duplicate(self):
+        with self.assertRaises(ValueError):
+            plan([], [neighbor(), neighbor()])
+
+
+class PrefixLimitsValidationTest(unittest.TestCase):
+
+    def test_normalized(self):
+        limits = neighbor(prefix_limits={"ipv4-unicast": (100, 50)})._prefix_limits
+        self.assertEqual(limits, ((65537, 100, 50),))
+
+    def test_malformed(self):
+        for prefix_limits in ({"ipv4-unicast": (100, 50, 3)}, {"ipv4-unicast": "100"}, {"ipv4-unicast": None},
+                              [("ipv4-unicast",)], [100], 100, {"ipv6-unicast": 100}):
+            with self.assertRaises(InvalidNeighborConfig):
+                neighbor(prefix_limits=prefix_limits)
+
+
+if __name__ == "__main__":
+    unittest.main()
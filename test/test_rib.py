@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import random
+import socket
+import struct
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.decoder import encode_nlri
+from pygobgp.mrt import encode_attribute
+from pygobgp.rib import COMMUNITY
+from pygobgp.rib import NEXT_HOP
+from pygobgp.rib import ORIGIN
+from pygobgp.rib import RibSnapshot
+
+
+def attributes(as_path, next_hop, communities=()):
+    pattrs = [encode_attribute(0x40, 1, b"\x00"),
+              encode_attribute(0x40, 2, struct.pack(">BB", 2, len(as_path)) +
+                               struct.pack(">" + "L" * len(as_path), *as_path)),
+              encode_attribute(0x40, 3, socket.inet_aton(next_hop))]
+    if communities:
+        words = [int(word) for community in communities for word in community.split(":")]
+        pattrs.append(encode_attribute(0xc0, 8, struct.pack(">" + "H" * len(words), *words)))
+    return pattrs
+
+
+class RibSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(39)
+        self.prefixes = ["10.{}.0.0/16".format(i) for i in range(60)]
+
+    def random_path(self):
+        rng = self.rng
+        as_path = [rng.randint(1, 5) for _ in range(rng.randint(1, 3))]
+        communities = rng.sample(["65000:1", "65000:2", "65000:666", "65001:1"], rng.randint(0, 3))
+        return gobgp.Path(pattrs=attributes(as_path, "10.255.0.{}".format(rng.randint(1, 4)), communities))
+
+    def random_destination(self):
+        prefix = self.rng.choice(self.prefixes)
+        if self.rng.random() < 0.3:
+            paths = [gobgp.Path(is_withdraw=True)]
+        else:
+            paths = [self.random_path()]
+            # Withdrawn paths before the new one are skipped
+            if self.rng.random() < 0.2:
+                paths.insert(0, gobgp.Path(is_withdraw=True))
+        if self.rng.random() < 0.2:
+            for path in paths:
+                path.nlri = encode_nlri(prefix)
+            return gobgp.Destination(paths=paths)
+        return gobgp.Destination(prefix=prefix, paths=paths)
+
+    def check(self, snapshot):
+        rebuilt = RibSnapshot(list(snapshot))
+        scan = RibSnapshot(list(snapshot), indexes=())
+        self.assertEqual(snapshot.indexes, rebuilt.indexes)
+        # No empty entries left behind by removals
+        self.assertTrue(all(prefixes for entries in snapshot.indexes.values() for prefixes in entries.values()))
+        key = lambda route: route["prefix"]
+        for community in ("65000:1", "65000:2", "65000:666", "65001:1", "65002:1"):
+            self.assertEqual(sorted(snapshot.by_community(community), key=key),
+                             sorted(scan.by_community(community), key=key))
+        for asn in range(7):
+            self.assertEqual(sorted(snapshot.by_origin(asn), key=key), sorted(scan.by_origin(asn), key=key))
+        for i in range(6):
+            next_hop = "10.255.0.{}".format(i)
+            self.assertEqual(sorted(snapshot.by_next_hop(next_hop), key=key),
+                             sorted(scan.by_next_hop(next_hop), key=key))
+
+    def test_apply(self):
+        snapshot = RibSnapshot()
+        # Reference: prefix -> last path announced
+        table = {}
+        for _ in range(30):
+            for _ in range(50):
+                destination = self.random_destination()
+                prefix = destination.prefix or [p for p in self.prefixes if encode_nlri(p) ==
+                                                destination.paths[0].nlri][0]
+                announced = [path for path in destination.paths if not path.is_withdraw]
+                if announced:
+                    table[prefix] = announced[0]
+                else:
+                    table.pop(prefix, None)
+                snapshot.apply(destination)
+            self.assertEqual(sorted(route["prefix"] for route in snapshot), sorted(table))
+            for prefix, path in table.items():
+                expected = RibSnapshot()
+                expected.apply(gobgp.Destination(prefix=prefix, paths=[path]))
+                self.assertEqual(snapshot.get(prefix), expected.get(prefix))
+            self.check(snapshot)
+
+    def test_replace(self):
+        snapshot = RibSnapshot()
+        snapshot.apply(gobgp.Destination(prefix="10.0.0.0/16", paths=[
+            gobgp.Path(pattrs=attributes([1, 2], "10.255.0.1", ["65000:1", "65000:666"]))]))
+        snapshot.apply(gobgp.Destination(prefix="10.0.0.0/16", paths=[
+            gobgp.Path(pattrs=attributes([1, 3], "10.255.0.2", ["65000:1"]))]))
+        self.assertEqual(snapshot.indexes, {COMMUNITY: {"65000:1": {"10.0.0.0/16"}}, ORIGIN: {3: {"10.0.0.0/16"}},
+                                            NEXT_HOP: {"10.255.0.2": {"10.0.0.0/16"}}})
+        snapshot.apply(gobgp.Destination(prefix="10.0.0.0/16", paths=[gobgp.Path(is_withdraw=True)]))
+        self.assertEqual(snapshot.indexes, {COMMUNITY: {}, ORIGIN: {}, NEXT_HOP: {}})
+        self.assertEqual(len(snapshot), 0)
+        # Withdrawal of a missing prefix
+        snapshot.apply(gobgp.Destination(prefix="10.1.0.0/16", paths=[gobgp.Path(is_withdraw=True)]))
+        self.assertEqual(len(snapshot), 0)
+
+    def test_ipv6_nlri(self):
+        snapshot = RibSnapshot(ipv6=True)
+        snapshot.apply(gobgp.Destination(paths=[gobgp.Path(nlri=encode_nlri("2001:db8::/32"),
+                                                           pattrs=attributes([1], "10.255.0.1"))]))
+        self.assertIn("2001:db8::/32", snapshot)
+        self.assertEqual([route["prefix"] for route in snapshot.by_origin(1)], ["2001:db8::/32"])
+
+    def test_some_indexes(self):
+        routes = [{"prefix": "10.0.0.0/16", "as_path": [1, 2], "next_hop": "10.255.0.1", "community": ["65000:1"]},
+                  {"prefix": "10.1.0.0/16", "as_path": None, "next_hop": None, "community": None}]
+        snapshot = RibSnapshot(routes, indexes=(ORIGIN,))
+        self.assertEqual(sorted(snapshot.indexes), [ORIGIN])
+        self.assertEqual(snapshot.by_origin(2), routes[:1])
+        self.assertEqual(snapshot.by_community("65000:1"), routes[:1])
+        self.assertEqual(snapshot.by_next_hop("10.255.0.1"), routes[:1])
+        self.assertEqual(snapshot.filter_as_path("_1_"), routes[:1])
+        with self.assertRaises(ValueError):
+            RibSnapshot(indexes=("med",))
+
+
+if __name__ == "__main__":
+    unittest.main()
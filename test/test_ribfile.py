@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import os
+import random
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.mrt import encode_attribute
+from pygobgp.ribfile import MappedRib
+from pygobgp.ribfile import RibFileError
+from pygobgp.ribfile import RibTable
+from pygobgp.ribfile import build_rib_table
+from pygobgp.ribfile import write_rib_file
+
+
+def attributes(origin_as):
+    return (encode_attribute(0x40, 1, b"\x00") +
+            encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65001, origin_as)) +
+            encode_attribute(0x40, 3, socket.inet_aton("10.0.0.1")))
+
+
+def random_prefix(rng, ipv6=False):
+    """Prefix of 10.0.0.0/8 or 2001:db8::/32, so that many of them are nested"""
+    if ipv6:
+        length = rng.randint(32, 64)
+        network = (0x20010db8 << 96 | rng.getrandbits(96)) >> (128 - length) << (128 - length)
+    else:
+        length = rng.randint(8, 28)
+        network = (10 << 24 | rng.getrandbits(24)) >> (32 - length) << (32 - length)
+    return str(ipaddress.ip_network((network, length)))
+
+
+def random_address(rng):
+    if rng.random() < 0.2:
+        return str(ipaddress.IPv6Address(0x20010db8 << 96 | rng.getrandbits(96)))
+    return str(ipaddress.IPv4Address(rng.choice([10 << 24, 11 << 24]) | rng.getrandbits(24)))
+
+
+def brute_force(table, address):
+    """(prefix, origin AS) of the longest prefix of table covering address, None if none"""
+    address = ipaddress.ip_network(address)
+    bits = address.max_prefixlen
+    best = None
+    for prefix, origin_as in table.items():
+        network = ipaddress.ip_network(prefix)
+        length = network.prefixlen
+        if (address.version == network.version and length <= address.prefixlen and
+                int(address.network_address) >> (bits - length) == int(network.network_address) >> (bits - length)):
+            if best is None or length > best[0].prefixlen:
+                best = (network, origin_as)
+    return None if best is None else (str(best[0]), best[1])
+
+
+def origin(route):
+    return None if route is None else (route["prefix"], route["as_path"][-1])
+
+
+class RibTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(48)
+        self.truth = {}
+        for _ in range(1000):
+            self.truth[random_prefix(self.rng)] = self.rng.randint(1, 50)
+        for _ in range(200):
+            self.truth[random_prefix(self.rng, ipv6=True)] = self.rng.randint(1, 50)
+        self.table = RibTable(build_rib_table((prefix, attributes(asn)) for prefix, asn in self.truth.items()))
+
+    def test_lookup(self):
+        for _ in range(500):
+            address = random_address(self.rng)
+            self.assertEqual(origin(self.table.lookup(address)), brute_force(self.truth, address), address)
+
+    def test_lookup_prefix(self):
+        for _ in range(200):
+            prefix = random_prefix(self.rng, ipv6=self.rng.random() < 0.2)
+            self.assertEqual(origin(self.table.lookup(prefix)), brute_force(self.truth, prefix), prefix)
+
+    def test_exact(self):
+        for prefix, asn in self.truth.items():
+            self.assertEqual(origin(self.table.route(prefix)), (prefix, asn))
+        missing = [prefix for prefix in (random_prefix(self.rng) for _ in range(200)) if prefix not in self.truth]
+        self.assertTrue(missing)
+        for prefix in missing:
+            self.assertIsNone(self.table.get(prefix))
+
+    def test_covering(self):
+        for _ in range(50):
+            address = random_address(self.rng)
+            network = ipaddress.ip_network(address)
+            expected = sorted((covering for covering in map(ipaddress.ip_network, self.truth)
+                               if covering.version == network.version and network.subnet_of(covering)),
+                              key=lambda covering: -covering.prefixlen)
+            covering = self.table.covering(network.version, int(network.network_address))
+            self.assertEqual([ipaddress.ip_network((entry, length)) for entry, length, _ in covering], expected)
+
+    def test_iteration(self):
+        self.assertEqual(len(self.table), len(self.truth))
+        self.assertEqual({route["prefix"]: route["as_path"][-1] for route in self.table}, self.truth)
+
+    def test_interned_attributes(self):
+        self.assertEqual(self.table.blocks, len(set(self.truth.values())))
+
+    def test_invalid(self):
+        with self.assertRaises(RibFileError):
+            RibTable(b"\x00" * 64)
+
+    def test_last_route_wins(self):
+        table = RibTable(build_rib_table([("10.0.0.0/8", attributes(1)), ("10.0.0.0/8", [attributes(2)])]))
+        self.assertEqual([origin(route) for route in table], [("10.0.0.0/8", 2)])
+
+
+class Stream:
+    """MonitorRib stream of a list of destinations"""
+
+    def __init__(self, destinations):
+        self.destinations = destinations
+        self.cancelled = False
+
+    def __iter__(self):
+        return iter(self.destinations)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TableInfo:
+
+    def __init__(self, num_destination):
+        self.num_destination = num_destination
+
+
+class Client:
+    """GoBGP whose table is prefix -> origin AS, changes sent after the current table"""
+
+    def __init__(self, table, changes=()):
+        self.table = table
+        self.changes = list(changes)
+        self.requests = []
+
+    def family(self, prefix):
+        return IPV6_UNICAST if ":" in prefix else IPV4_UNICAST
+
+    def get_rib_info(self, family=IPV4_UNICAST, **kwargs):
+        return TableInfo(sum(1 for prefix in self.table if self.family(prefix) == family))
+
+    def monitor_rib(self, family=IPV4_UNICAST, current=True, **kwargs):
+        self.requests.append((family, current))
+        destinations = []
+        if current:
+            destinations = [gobgp.Destination(prefix=prefix, paths=[gobgp.Path(pattrs=[attributes(asn)])])
+                            for prefix, asn in self.table.items() if self.family(prefix) == family]
+        destinations.extend(destination for destination in self.changes
+                            if self.family(destination.prefix) == family)
+        return Stream(destinations)
+
+
+class MappedRibTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rib.pgb")
+        self.rng = random.Random(480)
+        self.truth = {}
+        for _ in range(500):
+            self.truth[random_prefix(self.rng, ipv6=self.rng.random() < 0.2)] = self.rng.randint(1, 50)
+        write_rib_file(self.path, ((prefix, attributes(asn)) for prefix, asn in self.truth.items()), timestamp=1000)
+        self.rib = MappedRib(self.path)
+
+    def tearDown(self):
+        self.rib.close()
+        shutil.rmtree(self.directory)
+
+    def change(self, count):
+        for _ in range(count):
+            if self.rng.random() < 0.4:
+                prefix = self.rng.choice(sorted(self.truth))
+                del self.truth[prefix]
+                self.rib.apply(gobgp.Destination(prefix=prefix, paths=[gobgp.Path(is_withdraw=True)]))
+            else:
+                prefix = random_prefix(self.rng, ipv6=self.rng.random() < 0.2)
+                self.truth[prefix] = self.rng.randint(1, 50)
+                self.rib.apply(gobgp.Destination(prefix=prefix, paths=[gobgp.Path(
+                    pattrs=[attributes(self.truth[prefix])])]))
+
+    def check(self, rib):
+        for _ in range(300):
+            address = random_address(self.rng)
+            self.assertEqual(origin(rib.lookup(address)), brute_force(self.truth, address), address)
+        self.assertEqual({route["prefix"]: route["as_path"][-1] for route in rib}, self.truth)
+        self.assertEqual(len(rib), len(self.truth))
+
+    def test_lookup(self):
+        self.assertEqual(self.rib.timestamp, 1000)
+        self.check(self.rib)
+
+    def test_overlay(self):
+        self.change(300)
+        self.check(self.rib)
+        for prefix, asn in self.truth.items():
+            self.assertEqual(origin(self.rib.route(prefix)), (prefix, asn))
+
+    def test_save(self):
+        self.change(300)
+        self.rib.save()
+        self.rib.close()
+        self.rib = MappedRib(self.path)
+        self.assertEqual(self.rib.overlay, {})
+        self.check(self.rib)
+
+    def follow(self, client):
+        self.rib.follow(client)
+        self.assertTrue(self.rib.synced.wait(10))
+
+    def test_follow(self):
+        # While the service was down: prefixes withdrawn, changed and added
+        withdrawn = self.rng.sample(sorted(self.truth), 50)
+        for prefix in withdrawn:
+            del self.truth[prefix]
+        for prefix in self.rng.sample(sorted(self.truth), 50):
+            self.truth[prefix] += 100
+        for _ in range(50):
+            prefix = random_prefix(self.rng, ipv6=self.rng.random() < 0.2)
+            if prefix not in withdrawn:
+                self.truth[prefix] = self.rng.randint(1, 50)
+        client = Client(dict(self.truth))
+        self.follow(client)
+        self.assertEqual(sorted(client.requests), [(IPV4_UNICAST, True), (IPV6_UNICAST, True)])
+        for prefix in withdrawn:
+            self.assertIsNone(self.rib.route(prefix))
+        self.check(self.rib)
+
+    def test_follow_changes(self):
+        # Changes after the current table are applied, prefixes withdrawn by them are not sent again
+        table = dict(self.truth)
+        prefix = self.rng.choice(sorted(self.truth))
+        del self.truth[prefix]
+        self.follow(Client(table, [gobgp.Destination(prefix=prefix, paths=[gobgp.Path(is_withdraw=True)])]))
+        self.check(self.rib)
+
+    def test_follow_empty_table(self):
+        self.truth = {}
+        self.follow(Client({}))
+        self.check(self.rib)
+
+    def test_follow_ipv4_only(self):
+        ipv6 = {prefix: asn for prefix, asn in self.truth.items() if ":" in prefix}
+        self.truth = {prefix: asn for prefix, asn in self.truth.items() if ":" not in prefix}
+        self.rib.update("10.0.0.0/8", attributes(1))
+        self.truth = dict(self.rng.sample(sorted(self.truth.items()), 100))
+        self.rib.follow(Client(dict(self.truth)), families=(IPV4_UNICAST,))
+        self.assertTrue(self.rib.synced.wait(10))
+        self.truth.update(ipv6)
+        self.check(self.rib)
+
+    def test_close_with_attributes_referenced(self):
+        pattrs = self.rib.get(next(iter(self.truth)))
+        self.rib.close()
+        self.assertEqual(bytes(pattrs[:3]), b"\x40\x01\x01")
+
+
+if __name__ == "__main__":
+    unittest.main()
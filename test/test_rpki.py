@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pygobgp import PyGoBGP
+from pygobgp import RoaTable
+from pygobgp import RpkiMonitor
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.address import parse_prefix
+from pygobgp.decoder import encode_nlri
+from pygobgp.rpki import INVALID
+from pygobgp.rpki import NOT_FOUND
+from pygobgp.rpki import VALID
+
+
+def roa(asn, prefix, maxlen):
+    address, length = prefix.split("/")
+    message = gobgp.Roa(prefix=address, prefixlen=int(length), maxlen=maxlen)
+    setattr(message, "as", asn)
+    return message
+
+
+def covers(prefix, route):
+    version, network, length = parse_prefix(prefix)
+    route_version, route_network, route_length = parse_prefix(route)
+    bits = 32 if version == 4 else 128
+    return (version == route_version and length <= route_length and
+            network >> (bits - length) == route_network >> (bits - length))
+
+
+class RoaTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = RoaTable([roa(65001, "10.0.0.0/8", 16), (65002, "10.1.0.0/16", 24), (0, "192.0.2.0/24", 24),
+                               (65003, "2001:db8::/32", 48)])
+
+    def test_valid(self):
+        self.assertEqual(self.table.validate_prefix("10.0.0.0/8", 65001), VALID)
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/16", 65001), VALID)
+        self.assertEqual(self.table.validate_prefix("2001:db8:1::/48", 65003), VALID)
+
+    def test_not_found(self):
+        self.assertEqual(self.table.validate_prefix("11.0.0.0/8", 65001), NOT_FOUND)
+        # Less specific than every ROA: not covered
+        self.assertEqual(self.table.validate_prefix("10.0.0.0/7", 65001), NOT_FOUND)
+        self.assertEqual(self.table.validate_prefix("2001:db9::/32", 65003), NOT_FOUND)
+
+    def test_over_maxlen(self):
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/24", 65001), INVALID)
+        self.assertEqual(self.table.validate_prefix("2001:db8:1:1::/64", 65003), INVALID)
+
+    def test_wrong_origin(self):
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/16", 65002), INVALID)
+        self.assertEqual(self.table.validate_prefix("2001:db8::/32", 65001), INVALID)
+
+    def test_any_covering_roa(self):
+        # 10.1.0.0/24 is over the maxlen of the 65001 ROA but matches the 65002 one
+        self.assertEqual(self.table.validate_prefix("10.1.0.0/24", 65002), VALID)
+        self.assertEqual(self.table.validate_prefix("10.1.0.0/24", 65001), INVALID)
+
+    def test_as0(self):
+        # AS 0 ROAs (RFC 7607) make every route of the prefix invalid, even one "originated" by AS 0
+        self.assertEqual(self.table.validate_prefix("192.0.2.0/24", 65001), INVALID)
+        self.assertEqual(self.table.validate_prefix("192.0.2.0/24", 0), INVALID)
+
+    def test_no_origin(self):
+        self.assertEqual(self.table.validate_prefix("10.0.0.0/8", None), INVALID)
+        self.assertEqual(self.table.validate_prefix("11.0.0.0/8", None), NOT_FOUND)
+
+    def test_validate(self):
+        routes = [{"prefix": "10.0.0.0/8", "as_path": [3356, 65001]}, {"prefix": "10.0.0.0/8", "as_path": []},
+                  {"prefix": "11.0.0.0/8", "as_path": [65001]}]
+        self.assertEqual(self.table.validate(routes, annotate=True), [VALID, INVALID, NOT_FOUND])
+        self.assertEqual([route["validation"] for route in routes], [VALID, INVALID, NOT_FOUND])
+
+    def test_covering(self):
+        self.assertEqual(sorted(self.table.covering("10.1.2.0/24")), [(65001, "10.0.0.0/8", 16),
+                                                                       (65002, "10.1.0.0/16", 24)])
+        self.assertEqual(self.table.covering("10.0.0.0/7"), [])
+
+    def test_update_invalidates_cache(self):
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/24", 65004), INVALID)
+        generation = self.table.generation
+        self.assertEqual(self.table.update(added=[(65004, "10.2.0.0/24", 24)]), 1)
+        self.assertEqual(self.table.generation, generation + 1)
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/24", 65004), VALID)
+        self.assertEqual(self.table.remove((65004, "10.2.0.0/24", 24)), 1)
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/24", 65004), INVALID)
+        self.assertEqual(self.table.remove(roa(65001, "10.0.0.0/8", 16)), 1)
+        self.assertEqual(self.table.validate_prefix("10.2.0.0/24", 65004), NOT_FOUND)
+        # Nothing changed: same generation
+        self.assertEqual(self.table.update(added=[(65002, "10.1.0.0/16", 24)], removed=[(1, "12.0.0.0/8", 8)]), 0)
+        self.assertEqual(self.table.generation, generation + 3)
+        self.assertEqual(len(self.table), 3)
+        self.assertNotIn((65001, "10.0.0.0/8", 16), self.table)
+
+
+class Stub:
+    """GoBGP serving a fixed RIB and a ROA set which can be changed between polls"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.serial = 1
+        self.roas = []
+        self.validated = []
+        self.path_requests = 0
+
+    def GetRpki(self, request):
+        server = gobgp.Rpki(conf=gobgp.RPKIConf(address="10.0.255.10"), state=gobgp.RPKIState(serial=self.serial))
+        return gobgp.GetRpkiResponse(servers=[server])
+
+    def GetRoa(self, request):
+        ipv6 = request.family == IPV6_UNICAST
+        return gobgp.GetRoaResponse(roas=[r for r in self.roas if (":" in r.prefix) == ipv6])
+
+    def GetPath(self, request):
+        self.path_requests += 1
+        for route in self.routes:
+            if (":" in route) != (request.family == IPV6_UNICAST):
+                continue
+            if any(lookup.lookup_option == gobgp.LOOKUP_LONGER and covers(lookup.prefix, route)
+                   for lookup in request.prefixes):
+                yield gobgp.Path(nlri=encode_nlri(route), best=True)
+
+    def ValidateRib(self, request):
+        self.validated.append((request.family, request.prefix))
+        return gobgp.ValidateRibResponse()
+
+
+class RpkiMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = Stub(["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "10.1.2.128/25", "11.0.0.0/8",
+                          "2001:db8::/32", "2001:db8:1::/48"])
+        client = PyGoBGP("127.0.0.1", coalesce=False)
+        client.stub = self.stub
+        self.monitor = RpkiMonitor(client)
+        self.monitor.poll()
+
+    def test_first_poll(self):
+        self.assertIsNotNone(self.monitor.table)
+        self.assertEqual(self.stub.validated, [])
+
+    def test_covered_routes(self):
+        self.stub.serial = 2
+        self.stub.roas = [roa(65001, "10.1.0.0/16", 24), roa(65002, "2001:db8::/32", 32)]
+        update = self.monitor.poll()
+        expected = [(IPV4_UNICAST, "10.1.0.0/16"), (IPV4_UNICAST, "10.1.2.0/24"), (IPV4_UNICAST, "10.1.2.128/25"),
+                    (IPV6_UNICAST, "2001:db8:1::/48"), (IPV6_UNICAST, "2001:db8::/32")]
+        self.assertEqual(sorted(self.stub.validated), expected)
+        self.assertEqual(sorted(update.revalidated), sorted(prefix for _, prefix in expected))
+
+    def test_removed_roa(self):
+        self.stub.serial = 2
+        self.stub.roas = [roa(65001, "11.0.0.0/8", 8)]
+        self.monitor.poll()
+        self.stub.serial = 3
+        self.stub.roas = []
+        self.stub.validated = []
+        update = self.monitor.poll()
+        self.assertEqual(update.removed, {(65001, "11.0.0.0/8", 8)})
+        self.assertEqual(self.stub.validated, [(IPV4_UNICAST, "11.0.0.0/8")])
+
+    def test_too_many_routes(self):
+        self.monitor.max_targeted = 2
+        self.stub.serial = 2
+        self.stub.roas = [roa(65001, "10.0.0.0/8", 24), roa(65002, "2001:db8::/32", 48)]
+        update = self.monitor.poll()
+        self.assertEqual(sorted(self.stub.validated), [(IPV4_UNICAST, ""), (IPV6_UNICAST, "2001:db8:1::/48"),
+                                                       (IPV6_UNICAST, "2001:db8::/32")])
+        self.assertIn("", update.revalidated)
+
+    def test_too_many_roas(self):
+        self.monitor.max_targeted = 1
+        self.stub.serial = 2
+        self.stub.roas = [roa(65001, "10.0.0.0/8", 24), roa(65002, "11.0.0.0/8", 8)]
+        update = self.monitor.poll()
+        self.assertEqual(update.revalidated, [""])
+        self.assertEqual(self.stub.path_requests, 0)
+        self.assertEqual(sorted(self.stub.validated), [(IPV4_UNICAST, ""), (IPV6_UNICAST, "")])
+
+
+if __name__ == "__main__":
+    unittest.main()
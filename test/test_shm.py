@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import os
+import random
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp import shm
+from pygobgp.address import IPV4_UNICAST
+from pygobgp.address import IPV6_UNICAST
+from pygobgp.mrt import encode_attribute
+from pygobgp.shm import SharedRib
+from pygobgp.shm import SharedRibError
+from pygobgp.shm import SharedRibWriter
+
+
+def attributes(origin_as):
+    return (encode_attribute(0x40, 1, b"\x00") +
+            encode_attribute(0x40, 2, struct.pack(">BBLL", 2, 2, 65001, origin_as)) +
+            encode_attribute(0x40, 3, socket.inet_aton("10.0.0.1")))
+
+
+def random_prefix(rng, ipv6=False):
+    bits = 128 if ipv6 else 32
+    length = rng.randint(8, 48 if ipv6 else 24)
+    network = rng.getrandbits(bits) >> (bits - length) << (bits - length)
+    return str(ipaddress.ip_network((network, length)))
+
+
+class Client:
+    """iter_rib_attributes of a fixed table, prefix -> origin AS"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def iter_rib_attributes(self, family=IPV4_UNICAST, **kwargs):
+        for prefix, origin_as in self.table.items():
+            if (":" in prefix) == (family == IPV6_UNICAST):
+                yield prefix, attributes(origin_as)
+
+
+def brute_force(table, address):
+    address = ipaddress.ip_address(address)
+    best = None
+    for prefix, origin_as in table.items():
+        network = ipaddress.ip_network(prefix)
+        if address.version == network.version and address in network:
+            if best is None or network.prefixlen > best[0].prefixlen:
+                best = (network, origin_as)
+    return best
+
+
+class SharedRibTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rng = random.Random(7)
+        self.truth = {}
+        for _ in range(500):
+            self.truth[random_prefix(self.rng)] = self.rng.randint(1, 300)
+        for _ in range(50):
+            self.truth[random_prefix(self.rng, ipv6=True)] = self.rng.randint(1, 300)
+        self.writer = SharedRibWriter(Client(dict(self.truth)), name="test", directory=self.directory, max_delta=200)
+        self.writer.load()
+        self.reader = SharedRib("test", self.directory)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.directory)
+
+    def check(self):
+        for _ in range(300):
+            if self.rng.random() < 0.2:
+                address = str(ipaddress.IPv6Address(0x20010db8 << 96 | self.rng.getrandbits(96)))
+                address = self.rng.choice([address, str(ipaddress.IPv6Address(self.rng.getrandbits(128)))])
+            else:
+                address = str(ipaddress.IPv4Address(self.rng.getrandbits(32)))
+            expected = brute_force(self.truth, address)
+            route = self.reader.lookup(address)
+            if expected is None:
+                self.assertIsNone(route, address)
+            else:
+                self.assertEqual((route["prefix"], route["as_path"][-1]), (str(expected[0]), expected[1]), address)
+        for prefix in self.rng.sample(sorted(self.truth), 50):
+            self.assertEqual(self.reader.route(prefix)["as_path"][-1], self.truth[prefix])
+
+    def change(self, count):
+        for _ in range(count):
+            if self.rng.random() < 0.4:
+                prefix = self.rng.choice(sorted(self.truth))
+                del self.truth[prefix]
+                self.writer.apply(gobgp.Destination(prefix=prefix, paths=[gobgp.Path(is_withdraw=True)]))
+            else:
+                prefix = random_prefix(self.rng)
+                self.truth[prefix] = self.rng.randint(1, 300)
+                self.writer.apply(gobgp.Destination(prefix=prefix, paths=[gobgp.Path(
+                    pattrs=[attributes(self.truth[prefix])])]))
+
+    def test_load(self):
+        self.check()
+        self.assertFalse(self.reader.refresh())
+
+    def test_publish(self):
+        self.check()
+        for _ in range(5):
+            self.change(100)
+            self.writer.publish()
+            self.assertTrue(self.reader.refresh())
+            self.check()
+        # Delta tables were merged into a new base table more than once, old tables are removed
+        self.assertEqual(len(os.listdir(self.directory)), 3 if self.writer._published else 2)
+
+    def test_missing(self):
+        prefix = next(prefix for prefix in (random_prefix(self.rng) for _ in range(100)) if prefix not in self.truth)
+        self.assertIsNone(self.reader.route(prefix))
+        with self.assertRaises(SharedRibError):
+            SharedRib("other", self.directory).refresh()
+
+    def test_publishing(self):
+        self.assertTrue(self.reader.refresh())
+        # Odd sequence: the writer is updating the control file
+        control = self.writer._control
+        sequence, = struct.unpack_from(">Q", control, 8)
+        struct.pack_into(">Q", control, 8, sequence + 1)
+        with self.assertRaises(SharedRibError):
+            SharedRib("test", self.directory, retries=3).refresh()
+        struct.pack_into(">Q", control, 8, sequence)
+        self.assertFalse(self.reader.refresh())
+
+    def test_tables_replaced_while_mapping(self):
+        self.change(100)
+        self.writer.max_delta = 50
+        self.writer.publish()
+        self.change(10)
+        self.writer.publish()
+        self.assertTrue(self.writer._published)
+        os.remove(os.path.join(self.directory, "test.{}".format(self.writer._published)))
+
+        mapped = []
+
+        class MappedTable(shm._MappedTable):
+            def __init__(self, path):
+                super().__init__(path)
+                self.closed = False
+                mapped.append(self)
+
+            def close(self):
+                self.closed = True
+                super().close()
+
+        reader = SharedRib("test", self.directory, retries=3)
+        with mock.patch.object(shm, "_MappedTable", MappedTable):
+            with self.assertRaises(SharedRibError):
+                reader.refresh()
+        self.assertEqual(len(mapped), 3)
+        self.assertTrue(all(table.closed for table in mapped))
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp.simulator import ACCEPT
+from pygobgp.simulator import REJECT
+from pygobgp.simulator import PolicySimulator
+from pygobgp.simulator import community_matcher
+
+DEFINED_SETS = [
+    gobgp.DefinedSet(type=gobgp.PREFIX, name="customers", prefixes=[
+        gobgp.Prefix(ip_prefix="10.0.0.0/8", mask_length_min=16, mask_length_max=24),
+        gobgp.Prefix(ip_prefix="192.0.2.0/24"),
+        gobgp.Prefix(ip_prefix="2001:db8::/32", mask_length_min=32, mask_length_max=48)]),
+    gobgp.DefinedSet(type=gobgp.NEIGHBOR, name="peers", list=["10.0.255.2", "172.16.0.0/12"]),
+    gobgp.DefinedSet(type=gobgp.AS_PATH, name="from-65001", list=["^65001_"]),
+    gobgp.DefinedSet(type=gobgp.AS_PATH, name="transit", list=["_174_", "_3356_"]),
+    gobgp.DefinedSet(type=gobgp.COMMUNITY, name="blackhole", list=["65535:666", "no-export"]),
+    gobgp.DefinedSet(type=gobgp.COMMUNITY, name="internal", list=["^65000:1..$"]),
+]
+
+
+def route(prefix="10.1.0.0/16", as_path=(65001, 65002), community=None, **kwargs):
+    route = {"prefix": prefix, "as_path": list(as_path), "next_hop": "10.0.255.2", "community": community, "med": 10}
+    route.update(kwargs)
+    return route
+
+
+def statement(route_action=gobgp.NONE, conditions=None, actions=None, name="s"):
+    actions = actions or gobgp.Actions()
+    actions.route_action = route_action
+    return gobgp.Statement(name=name, conditions=conditions or gobgp.Conditions(), actions=actions)
+
+
+def match_set(name, match_type=gobgp.ANY):
+    return gobgp.MatchSet(type=match_type, name=name)
+
+
+class PolicySimulatorTest(unittest.TestCase):
+
+    def verdict(self, conditions, route, default=ACCEPT):
+        simulator = PolicySimulator([gobgp.Policy(name="p", statements=[statement(REJECT, conditions)])], DEFINED_SETS)
+        return simulator.evaluate(route, ["p"], default=default)[0]
+
+    def check(self, conditions, matching, not_matching):
+        for r in matching:
+            self.assertEqual(self.verdict(conditions, r), REJECT, r)
+        for r in not_matching:
+            self.assertEqual(self.verdict(conditions, r), ACCEPT, r)
+
+    def test_prefix_set(self):
+        matching = [route("10.1.0.0/16"), route("10.1.2.0/24"), route("192.0.2.0/24"), route("2001:db8:1::/48")]
+        not_matching = [route("10.0.0.0/8"), route("10.1.2.128/25"), route("192.0.2.0/25"), route("11.1.0.0/16"),
+                        route("2001:db8::/64"), route("2001:db9::/32")]
+        self.check(gobgp.Conditions(prefix_set=match_set("customers")), matching, not_matching)
+        self.check(gobgp.Conditions(prefix_set=match_set("customers", gobgp.INVERT)), not_matching, matching)
+
+    def test_neighbor_set(self):
+        matching = [route(neighbor="10.0.255.2"), route(neighbor="172.20.1.1")]
+        not_matching = [route(neighbor="10.0.255.3"), route(neighbor="192.168.0.1"), route()]
+        self.check(gobgp.Conditions(neighbor_set=match_set("peers")), matching, not_matching)
+
+    def test_as_path_set(self):
+        self.check(gobgp.Conditions(as_path_set=match_set("from-65001")),
+                   [route(as_path=[65001]), route(as_path=[65001, 174])],
+                   [route(as_path=[650011]), route(as_path=[65002, 65001]), route(as_path=[])])
+        self.check(gobgp.Conditions(as_path_set=match_set("transit")),
+                   [route(as_path=[65001, 174, 1]), route(as_path=[3356])], [route(as_path=[65001, 1174])])
+        self.check(gobgp.Conditions(as_path_set=match_set("transit", gobgp.ALL)),
+                   [route(as_path=[174, 3356])], [route(as_path=[65001, 174, 1])])
+        self.check(gobgp.Conditions(as_path_set=match_set("transit", gobgp.INVERT)),
+                   [route(as_path=[65001, 1174])], [route(as_path=[3356])])
+
+    def test_as_path_length(self):
+        for length_type, matching, not_matching in ((gobgp.EQ, [2], [1, 3]), (gobgp.GE, [2, 3], [0, 1]),
+                                                     (gobgp.LE, [0, 2], [3])):
+            self.check(gobgp.Conditions(as_path_length=gobgp.AsPathLength(type=length_type, length=2)),
+                       [route(as_path=[1] * n) for n in matching], [route(as_path=[1] * n) for n in not_matching])
+
+    def test_community_set(self):
+        self.check(gobgp.Conditions(community_set=match_set("blackhole")),
+                   [route(community=["65535:666"]), route(community=["1:1", "65535:65281"])],
+                   [route(community=["65535:667"]), route(community=[]), route()])
+        self.check(gobgp.Conditions(community_set=match_set("internal")),
+                   [route(community=["65000:100"])], [route(community=["65000:1000"]), route(community=["65000:10"])])
+        self.check(gobgp.Conditions(community_set=match_set("blackhole", gobgp.ALL)),
+                   [route(community=["65535:65281", "65535:666"])], [route(community=["65535:666"])])
+        self.check(gobgp.Conditions(community_set=match_set("blackhole", gobgp.INVERT)),
+                   [route(community=["65535:667"])], [route(community=["65535:666"])])
+
+    def test_rpki_result(self):
+        self.check(gobgp.Conditions(rpki_result=gobgp.RPKIValidation.STATE_INVALID),
+                   [route(validation=gobgp.RPKIValidation.STATE_INVALID)],
+                   [route(validation=gobgp.RPKIValidation.STATE_VALID), route()])
+
+    def test_conditions_and(self):
+        self.check(gobgp.Conditions(prefix_set=match_set("customers"), as_path_set=match_set("from-65001")),
+                   [route("10.1.0.0/16", [65001])], [route("10.1.0.0/16", [65002]), route("11.0.0.0/16", [65001])])
+
+    def test_actions(self):
+        actions = gobgp.Actions(
+            community=gobgp.CommunityAction(type=gobgp.COMMUNITY_ADD, communities=["65000:1", "no-export"]),
+            med=gobgp.MedAction(type=gobgp.MED_MOD, value=-20),
+            as_prepend=gobgp.AsPrependAction(asn=65000, repeat=2),
+            local_pref=gobgp.LocalPrefAction(value=200))
+        # "self" is a keyword argument of the message constructor
+        setattr(actions.nexthop, "self", True)
+        simulator = PolicySimulator([gobgp.Policy(name="p", statements=[statement(ACCEPT, actions=actions)])],
+                                    next_hop_self="10.0.255.1")
+        original = route(community=["65000:1"])
+        action, modified = simulator.evaluate(original, ["p"])
+        self.assertEqual(action, ACCEPT)
+        self.assertEqual(modified, dict(original, community=["65000:1", "65535:65281"], med=0,
+                                        as_path=[65000, 65000, 65001, 65002], next_hop="10.0.255.1", local_pref=200))
+        # The route given is not changed
+        self.assertEqual(original, route(community=["65000:1"]))
+
+    def test_community_actions(self):
+        for action, expected in ((gobgp.COMMUNITY_REPLACE, ["65000:1"]), (gobgp.COMMUNITY_REMOVE, ["1:1", "65000:2"]),
+                                 (gobgp.COMMUNITY_ADD, ["1:1", "65000:1", "65000:2"])):
+            actions = gobgp.Actions(community=gobgp.CommunityAction(type=action, communities=["65000:1"]))
+            simulator = PolicySimulator([gobgp.Policy(name="p", statements=[statement(actions=actions)])])
+            self.assertEqual(simulator.evaluate(route(community=["1:1", "65000:1", "65000:2"]), ["p"])[1]["community"],
+                             expected, action)
+
+    def test_as_prepend_left_most(self):
+        actions = gobgp.Actions(as_prepend=gobgp.AsPrependAction(repeat=2, use_left_most=True))
+        simulator = PolicySimulator([gobgp.Policy(name="p", statements=[statement(actions=actions)])])
+        self.assertEqual(simulator.evaluate(route(as_path=[65001, 65002]), ["p"])[1]["as_path"],
+                         [65001, 65001, 65001, 65002])
+        self.assertEqual(simulator.evaluate(route(as_path=[]), ["p"])[1]["as_path"], [])
+
+    def test_statement_order(self):
+        # Actions of every matching statement apply, the first ACCEPT or REJECT is final
+        policies = [
+            gobgp.Policy(name="import", statements=[
+                statement(actions=gobgp.Actions(local_pref=gobgp.LocalPrefAction(value=50)), name="all"),
+                statement(REJECT, gobgp.Conditions(community_set=match_set("blackhole")), name="blackhole"),
+                statement(ACCEPT, gobgp.Conditions(prefix_set=match_set("customers")), gobgp.Actions(
+                    med=gobgp.MedAction(type=gobgp.MED_REPLACE, value=0)), name="customers")]),
+            gobgp.Policy(name="last", statements=[
+                statement(actions=gobgp.Actions(local_pref=gobgp.LocalPrefAction(value=10)))]),
+        ]
+        simulator = PolicySimulator(policies, DEFINED_SETS)
+        routes = [route("10.1.0.0/16"), route("10.1.0.0/16", community=["65535:666"]), route("11.0.0.0/16")]
+        result = simulator.run(routes, ["import", "last"], default=REJECT)
+        self.assertEqual(result.accepted, [dict(routes[0], local_pref=50, med=0)])
+        self.assertEqual(result.rejected, routes[1:])
+        self.assertEqual(result.modified, 1)
+        result = simulator.run(routes, ["import", "last"])
+        self.assertEqual(result.accepted[1], dict(routes[2], local_pref=10))
+        self.assertEqual(result.modified, 2)
+
+    def test_unchanged_route(self):
+        simulator = PolicySimulator([gobgp.Policy(name="p", statements=[
+            statement(ACCEPT, gobgp.Conditions(prefix_set=match_set("customers")))])], DEFINED_SETS)
+        original = route()
+        result = simulator.run([original], ["p"])
+        self.assertIs(result.accepted[0], original)
+        self.assertEqual(result.modified, 0)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            PolicySimulator([gobgp.Policy(name="p", statements=[statement(conditions=gobgp.Conditions(
+                prefix_set=match_set("customers", gobgp.ALL)))])], DEFINED_SETS)
+        with self.assertRaises(ValueError):
+            PolicySimulator([gobgp.Policy(name="p", statements=[statement(conditions=gobgp.Conditions(
+                prefix_set=match_set("unknown")))])], DEFINED_SETS)
+        with self.assertRaises(ValueError):
+            PolicySimulator([gobgp.Policy(name="p", statements=[statement(conditions=gobgp.Conditions(
+                ext_community_set=match_set("ext")))])], DEFINED_SETS)
+        with self.assertRaises(ValueError):
+            PolicySimulator([]).run([route()], ["unknown"])
+
+    def test_community_matcher(self):
+        self.assertTrue(community_matcher("65000:0100")("65000:100"))
+        self.assertTrue(community_matcher("NO-EXPORT")("65535:65281"))
+        self.assertFalse(community_matcher("65000:1")("65000:10"))
+        self.assertTrue(community_matcher("^65000:.*")("65000:10"))
+
+
+if __name__ == "__main__":
+    unittest.main()
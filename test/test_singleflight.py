@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+from pygobgp.singleflight import SingleFlight
+
+
+class WaitCounter:
+    """Event counting the threads waiting for it"""
+
+    def __init__(self, event):
+        self.event = event
+        self.waiters = 0
+        self.condition = threading.Condition()
+
+    def wait(self, timeout=None):
+        with self.condition:
+            self.waiters += 1
+            self.condition.notify_all()
+        return self.event.wait(timeout)
+
+    def set(self):
+        self.event.set()
+
+    def wait_for_waiters(self, count):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.waiters == count, 5)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def call(self, value, error=None):
+        self.calls.append(value)
+        self.started.set()
+        self.release.wait(5)
+        if error is not None:
+            raise error
+        return [value]
+
+    def run_waiters(self, count, key, *args):
+        """Start the leader then count - 1 waiters for key, outcomes (result, exception) in start order"""
+        outcomes = [None] * count
+
+        def wait(i):
+            try:
+                outcomes[i] = (self.flight.do(key, self.call, *args), None)
+            except Exception as e:
+                outcomes[i] = (None, e)
+
+        threads = [threading.Thread(target=wait, args=(i,)) for i in range(count)]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+        done = WaitCounter(self.flight._calls[key].done)
+        self.flight._calls[key].done = done
+        for thread in threads[1:]:
+            thread.start()
+        # Waiters are blocked until the call completes
+        self.assertTrue(done.wait_for_waiters(count - 1))
+        self.assertEqual(self.flight.in_flight(), 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_one_call(self):
+        outcomes = self.run_waiters(10, "rib", 1)
+        self.assertEqual(self.calls, [1])
+        result = outcomes[0][0]
+        self.assertEqual(result, [1])
+        # The very same object is shared
+        self.assertTrue(all(outcome[0] is result for outcome in outcomes))
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_error(self):
+        error = RuntimeError("GoBGP unavailable")
+        outcomes = self.run_waiters(10, "rib", 1, error)
+        self.assertEqual(self.calls, [1])
+        self.assertTrue(all(outcome[1] is error for outcome in outcomes))
+        # The key is forgotten once the call failed
+        self.assertEqual(self.flight.do("rib", lambda: 2), 2)
+
+    def test_not_cached(self):
+        self.release.set()
+        self.assertEqual(self.flight.do("rib", self.call, 1), [1])
+        self.assertEqual(self.flight.do("rib", self.call, 2), [2])
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_distinct_keys(self):
+        self.release.set()
+        self.assertEqual(self.flight.do("a", self.call, 1), [1])
+        self.assertEqual(self.flight.do("b", self.call, 2), [2])
+        self.assertEqual(self.calls, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import random
+import socket
+import struct
+import threading
+import unittest
+from unittest import mock
+
+from pygobgp import PyGoBGP
+from pygobgp import gobgp_pb2 as gobgp
+from pygobgp import pygobgp as client
+from pygobgp import wire
+from pygobgp.decoder import decode_rib_response
+from pygobgp.decoder import decode_table_range
+from pygobgp.decoder import route_from_record
+from pygobgp.mrt import encode_attribute
+
+
+def random_path(rng):
+    as_path = [rng.randint(1, 4200000000) for _ in range(rng.randint(1, 6))]
+    pattrs = [encode_attribute(0x40, 1, b"\x00"),
+              encode_attribute(0x40, 2, struct.pack(">BB", 2, len(as_path)) + struct.pack(">" + "L" * len(as_path),
+                                                                                          *as_path)),
+              encode_attribute(0x40, 3, struct.pack(">L", rng.getrandbits(32)))]
+    if rng.random() < 0.5:
+        pattrs.append(encode_attribute(0x80, 4, struct.pack(">L", rng.getrandbits(32))))
+    if rng.random() < 0.5:
+        communities = [rng.getrandbits(32) for _ in range(rng.randint(1, 40))]
+        pattrs.append(encode_attribute(0xc0, 8, struct.pack(">" + "L" * len(communities), *communities)))
+    return gobgp.Path(pattrs=pattrs, best=rng.random() < 0.5, age=rng.randint(-2 ** 40, 2 ** 40))
+
+
+def random_response(rng, count):
+    table = gobgp.Table(type=gobgp.GLOBAL, family=65537)
+    for _ in range(count):
+        length = rng.randint(8, 32)
+        network = rng.getrandbits(32) >> (32 - length) << (32 - length)
+        prefix = "{}/{}".format(socket.inet_ntoa(struct.pack(">L", network)), length)
+        table.destinations.add(prefix=prefix, paths=[random_path(rng) for _ in range(rng.randint(1, 3))])
+    return gobgp.GetRibResponse(table=table)
+
+
+class WireTest(unittest.TestCase):
+
+    def setUp(self):
+        self.response = random_response(random.Random(34), 300)
+        self.buf = self.response.SerializeToString()
+        self.expected = PyGoBGP("127.0.0.1")._extract_routes(self.response)
+
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 32, 2 ** 64 - 1):
+            encoded = wire.encode_varint(value)
+            self.assertEqual(wire.read_varint(encoded, 0), (value, len(encoded)))
+
+    def test_decode_rib_response(self):
+        routes = [route_from_record(record) for record in decode_rib_response(self.buf)]
+        self.assertEqual(routes, self.expected)
+
+    def test_memoryview(self):
+        routes = [route_from_record(record) for record in decode_rib_response(memoryview(self.buf))]
+        self.assertEqual(routes, self.expected)
+
+    def test_all_paths(self):
+        start, end = wire.table_span(self.buf)
+        destinations = list(wire.iter_destinations(self.buf, start, end, first_path_only=False))
+        self.assertEqual([prefix for prefix, _ in destinations],
+                         [destination.prefix for destination in self.response.table.destinations])
+        for (_, paths), destination in zip(destinations, self.response.table.destinations):
+            self.assertEqual([([bytes(pattr) for pattr in pattrs], best, age) for pattrs, best, age in paths],
+                             [(list(path.pattrs), path.best, path.age) for path in destination.paths])
+
+    def test_split_destinations(self):
+        for chunks in (1, 3, 16, 1000):
+            ranges = wire.split_destinations(self.buf, chunks)
+            self.assertLessEqual(len(ranges), max(chunks, 1) + 1)
+            records = [record for start, end in ranges for record in decode_table_range(self.buf, start, end)]
+            self.assertEqual([route_from_record(record) for record in records], self.expected)
+
+    def test_empty_response(self):
+        buf = gobgp.GetRibResponse().SerializeToString()
+        self.assertEqual(decode_rib_response(buf), [])
+        self.assertEqual(wire.split_destinations(buf, 4), [])
+        self.assertEqual(list(wire.iter_rib(buf)), [])
+
+    def test_truncated(self):
+        with self.assertRaises(wire.WireError):
+            decode_rib_response(self.buf[:-1])
+
+
+class ProcessPoolExecutor(client.ProcessPoolExecutor):
+    """Process pool recording its shutdown"""
+
+    pools = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+        self.pools.append(self)
+
+    def shutdown(self, *args, **kwargs):
+        self.closed = True
+        super().shutdown(*args, **kwargs)
+
+
+class DecodePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.response = random_response(random.Random(33), 300)
+        self.buf = self.response.SerializeToString()
+        self.gobgp = PyGoBGP("127.0.0.1", coalesce=False)
+        self.gobgp._get_rib_raw = lambda request: self.buf
+        self.expected = self.gobgp._extract_routes(self.response)
+        ProcessPoolExecutor.pools = []
+        patcher = mock.patch.object(client, "ProcessPoolExecutor", ProcessPoolExecutor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.gobgp.close()
+
+    def test_shared_memory(self):
+        if client.shared_memory is None:
+            self.skipTest("multiprocessing.shared_memory is not available")
+        self.assertEqual(self.gobgp.get_rib(decode_workers=2), self.expected)
+        # Pool kept for the next call
+        self.assertEqual(self.gobgp.get_rib(decode_workers=2), self.expected)
+        self.assertEqual(len(ProcessPoolExecutor.pools), 1)
+
+    def test_pickled_chunks(self):
+        with mock.patch.object(client, "shared_memory", None):
+            self.assertEqual(self.gobgp.get_rib(decode_workers=2), self.expected)
+
+    def test_concurrent_sizes(self):
+        results = []
+
+        def decode(workers):
+            results.append(self.gobgp.get_rib(decode_workers=workers))
+
+        threads = [threading.Thread(target=decode, args=(1 + i % 2,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(routes == self.expected for routes in results))
+        # Every pool but the current one was shut down, once its decodes were done
+        current = self.gobgp._decode_pool
+        self.assertEqual([pool for pool in ProcessPoolExecutor.pools if not pool.closed], [current])
+        self.assertEqual(self.gobgp._decode_pool_users, {current: 0})
+        self.gobgp.close()
+        self.assertTrue(all(pool.closed for pool in ProcessPoolExecutor.pools))
+
+
+if __name__ == "__main__":
+    unittest.main()